@@ -0,0 +1,23 @@
+"""
+Адреса для запуска под ASGI: те же, что в Elkisamara/urls.py, но каталог, корзина и JSON API
+обслуживаются async-версиями view из main.async_views. Подключается в Elkisamara/asgi.py.
+"""
+from django.urls import URLPattern
+
+from Elkisamara import urls
+from main.async_views import ASYNC_VIEW_CLASSES, ASYNC_VIEW_FUNCTIONS
+
+
+def _async_pattern(pattern):
+    callback = getattr(pattern, "callback", None)
+    view_class = getattr(callback, "view_class", None)
+    if view_class in ASYNC_VIEW_CLASSES:
+        callback = ASYNC_VIEW_CLASSES[view_class].as_view(**callback.view_initkwargs)
+    elif callback in ASYNC_VIEW_FUNCTIONS:
+        callback = ASYNC_VIEW_FUNCTIONS[callback]
+    else:
+        return pattern
+    return URLPattern(pattern.pattern, callback, pattern.default_args, pattern.name)
+
+
+urlpatterns = [_async_pattern(pattern) for pattern in urls.urlpatterns]
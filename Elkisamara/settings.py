@@ -41,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.middleware.RequestMetricsMiddleware',
+    'main.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,7 +52,18 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'Elkisamara.urls'
+# Метрики запросов (main.middleware.RequestMetricsMiddleware). Выключено - middleware не участвует в обработке.
+REQUEST_METRICS_ENABLED = os.environ.get('REQUEST_METRICS_ENABLED') == '1'
+# Доля запросов с замером SQL, заголовком Server-Timing и строкой в логе main.request_metrics
+REQUEST_METRICS_SAMPLE_RATE = float(os.environ.get('REQUEST_METRICS_SAMPLE_RATE', '0'))
+# Куда процессы сохраняют гистограммы для manage.py request_metrics
+REQUEST_METRICS_DUMP_DIR = os.path.join(BASE_DIR, 'request_metrics')
+REQUEST_METRICS_FLUSH_EVERY = 100
+
+# Elkisamara/asgi.py подставляет Elkisamara.async_urls (async-версии каталога, корзины и API)
+ROOT_URLCONF = os.environ.get('DJANGO_ROOT_URLCONF', 'Elkisamara.urls')
+# Размер пула потоков, в котором async view выполняют запросы к БД (main.async_views)
+ASYNC_ORM_WORKERS = int(os.environ.get('ASYNC_ORM_WORKERS', '8'))
 
 TEMPLATES = [
     {
@@ -75,13 +88,60 @@ WSGI_APPLICATION = 'Elkisamara.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Постоянные соединения: секунды жизни соединения, 0 - закрывать после каждого запроса
+CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', '60'))
+
+# Профиль SQLite (main.sqlite): PRAGMA на каждом соединении, BEGIN IMMEDIATE для пишущих транзакций
+# корзины и заказа (main.sqlite.immediate_atomic) и повтор этих запросов при блокировке БД
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', '1') == '1'
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение - в КиБ, т.е. 64 МБ на соединение
+    'cache_size': -64000,
+}
+SQLITE_LOCK_RETRIES = 3
+SQLITE_LOCK_RETRY_DELAY = 0.05
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME':  str(os.path.join(BASE_DIR, "db.sqlite3"))
+        'ENGINE': 'main.backends.sqlite3',
+        'NAME': os.environ.get('DATABASE_NAME', str(os.path.join(BASE_DIR, "db.sqlite3"))),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
     }
 }
 
+# Реплика для чтения каталога (main.routers). Локально - второй файл SQLite, копия default
+# из команды sync_replica. В тестах реплика - зеркало default.
+READ_REPLICA_ALIAS = 'replica'
+if os.environ.get('DATABASE_REPLICA_NAME'):
+    DATABASES[READ_REPLICA_ALIAS] = {
+        **DATABASES['default'],
+        'NAME': os.environ['DATABASE_REPLICA_NAME'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['main.routers.ReplicaRouter']
+# После записи посетитель читает с default столько секунд (запас на отставание реплики)
+REPLICA_PIN_SECONDS = 15
+REPLICA_PIN_COOKIE = 'db_primary'
+
+
+# Кэш каталога сбрасывается сменой версии (main.cache), поэтому кэш должен быть общим для всех процессов
+# сервера: кэш в памяти процесса не увидит сохранения, сделанные в другом воркере. По умолчанию - файловый
+# (все воркеры на одной машине), для нескольких машин - memcached: CACHE_BACKEND и CACHE_LOCATION.
+# Проверка main.W001 (manage.py check --deploy) предупреждает о кэше в памяти процесса.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
+        # Файловый кэш при переполнении удаляет случайные записи; запас, чтобы это было редкостью
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }
+}
+# Тесты подменяют кэш на кэш в памяти сами (main/tests/base.py)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -120,6 +180,7 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.2/howto/static-files/
 
 STATIC_URL = '/static/'
+LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = '/'
 X_FRAME_OPTIONS = 'SAMEORIGIN'
 # Default primary key field type
@@ -135,5 +196,8 @@ REST_FRAMEWORK = {
     ]
 }
 
+CATALOG_PAGE_SIZE = 24
+CATALOG_MAX_PAGE_SIZE = 96
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
@@ -3,11 +3,15 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
+from main import api
+
 from main.views import (
     BaseView,
     ProductDetailView,
     CategoryDetailView,
+    SearchView,
     CartView,
+    CartWidgetView,
     AddToCartView,
     DeleteFromCartView,
     ChangeQTYView,
@@ -22,7 +26,9 @@ urlpatterns = [
                   path('products/<str:ct_model>/<str:slug>/', ProductDetailView.as_view(), name='product_detail'),
                   path('category/<str:ct_model>/<str:slug>/', CategoryDetailView.as_view(), name='category_detail'),
                   path('category/<str:ct_model>/', CategoryDetailView.as_view(), name='category_detail'),
+                  path('search/', SearchView.as_view(), name='search'),
                   path('cart/', CartView.as_view(), name='cart'),
+                  path('cart/widget/', CartWidgetView.as_view(), name='cart_widget'),
                   path('add-to-cart/<str:ct_model>/<str:slug>/', AddToCartView.as_view(), name='add_to_cart'),
                   path('remove-from-cart/<str:ct_model>/<str:slug>/', DeleteFromCartView.as_view(),
                        name='delete_from_cart'),
@@ -31,5 +37,9 @@ urlpatterns = [
                   path('login/', LoginUserView.as_view(), name='login'),
                   path('register/', RegisterUserView.as_view(), name='register'),
                   path('orders/', OrderListView.as_view(), name='list_orders'),
-                  path('order/<int:pk>', OrderDetailView.as_view(), name='list_orders')
+                  path('order/<int:pk>', OrderDetailView.as_view(), name='list_orders'),
+                  path('api/sidebar/', api.sidebar, name='api_sidebar'),
+                  path('api/categories/', api.categories, name='api_categories'),
+                  path('api/products/<str:ct_model>/', api.product_list, name='api_product_list'),
+                  path('api/products/<str:ct_model>/<str:slug>/', api.product_detail, name='api_product_detail'),
               ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,18 +1,46 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.exceptions import ValidationError
+from django.db.models import Q
 
 # редактирование товаров
 from main.models import ChristmasTree, Category, Customer, Cart, CartProduct, Order, ChristmasTreeHeight, \
     ChristmasTreeChoices
+from main.pagination import EstimatedCountPaginator
+from main.search import search_index
+from main.utils import apply_percent, recalc_cart, reprice_heights
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Списки больших таблиц: приблизительное общее число строк и без второго COUNT(*) при фильтрации."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class ProductAdmin(admin.ModelAdmin):
+    """Поиск идет по полнотекстовому индексу (main.search), плюс точное совпадение slug."""
+
     search_fields = ("title", "slug", "description")
+    search_results_limit = 1000
     readonly_fields = ("image_tag",)
 
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        ids = [
+            object_id
+            for _, object_id in search_index.search(search_term, self.model._meta.model_name,
+                                                    limit=self.search_results_limit)
+        ]
+        return queryset.filter(Q(pk__in=ids) | Q(slug=search_term)), False
+
 
 @admin.register(ChristmasTree)
 class ChristmasTreeAdmin(ProductAdmin):
-    list_display = ("title", "product_type")
+    list_display = ("title", "product_type", "min_price", "max_price")
     list_filter = ("product_type",)
     exclude = ['price']
 
@@ -23,47 +51,101 @@ class CategoryAdmin(admin.ModelAdmin):
 
 
 @admin.register(Customer)
-class CustomerAdmin(admin.ModelAdmin):
+class CustomerAdmin(LargeTableAdmin):
     search_fields = ("user__username", "user__first_name", "user__last_name", "phone")
+    list_select_related = ("user",)
+    raw_id_fields = ("user", "orders")
 
 
 @admin.register(Cart)
-class CartAdmin(admin.ModelAdmin):
-    filter_horizontal = ("products",)
+class CartAdmin(LargeTableAdmin):
+    list_display = ("__str__", "owner", "total_products", "final_price", "in_order")
+    list_filter = ("in_order",)
+    list_select_related = ("owner__user",)
+    # filter_horizontal подгружал в виджет все CartProduct из БД
+    raw_id_fields = ("owner", "products")
     readonly_fields = ("final_price", "total_products")
+    actions = ("recalc_totals",)
+
+    @admin.action(description="Пересчитать итоги корзин")
+    def recalc_totals(self, request, queryset):
+        for cart in queryset:
+            recalc_cart(cart)
+        self.message_user(request, f"Пересчитано корзин: {len(queryset)}")
 
 
 @admin.register(CartProduct)
-class CartProductAdmin(admin.ModelAdmin):
+class CartProductAdmin(LargeTableAdmin):
     search_fields = ("object_id",)
+    list_display = ("__str__", "cart", "final_price", "get_tree_height")
     readonly_fields = ('get_tree_height',)
+    raw_id_fields = ("user", "cart")
+
+    def get_queryset(self, request):
+        # Товары (через GenericForeignKey), их категории и размеры елок - пакетно, а не на каждую строку.
+        # ChangeList не применяет list_select_related, если select_related уже задан, поэтому cart - здесь же
+        return super().get_queryset(request).with_details().select_related("cart")
 
+    @admin.display(description="Размер елки")
     def get_tree_height(self, obj):
-        tree_height = obj.get_tree_height_object()
-        if tree_height:
-            return f"Высота дерева: {tree_height.tree_height.tree_height} м., цена за штуку: {tree_height.tree_height.tree_price} руб."
+        tree_choices = obj.tree_in_cart.all()
+        if tree_choices:
+            tree_height = tree_choices[0].tree_height
+            return f"Высота дерева: {tree_height.tree_height} м., цена за штуку: {tree_height.tree_price} руб."
         else:
             return None
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeTableAdmin):
     search_fields = (
-        "customer",
-        "pk",
+        "=id",
+        "customer__user__username",
+        "phone",
     )
     list_display = ("__str__", "created_at", "customer")
     list_filter = ("created_at", "status")
+    list_select_related = ("customer__user",)
+    raw_id_fields = ("customer", "cart")
     readonly_fields = ("order_content_description",)
 
 
+class RepriceActionForm(ActionForm):
+    percent = forms.DecimalField(label="Изменение цены, %", required=False, max_digits=5, decimal_places=2)
+
+
 @admin.register(ChristmasTreeHeight)
 class ChristmasTreeHeightAdmin(admin.ModelAdmin):
-    pass
+    """Смена цены размера (формой или действием) сразу пересчитывает открытые корзины (main.utils.reprice_heights)."""
+
+    list_display = ("__str__", "tree_height", "tree_price")
+    action_form = RepriceActionForm
+    actions = ("reprice",)
     # search_fields = ("object_id",)
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and "tree_price" in form.changed_data:
+            lines, carts = reprice_heights({obj.pk: obj.tree_price})
+            self.message_user(request, f"Пересчитано строк корзин: {lines}, корзин: {carts}")
+
+    @admin.action(description="Изменить цены на %% и пересчитать открытые корзины")
+    def reprice(self, request, queryset):
+        try:
+            percent = RepriceActionForm.base_fields["percent"].clean(request.POST.get("percent"))
+        except ValidationError:
+            percent = None
+        if percent is None:
+            self.message_user(request, "Укажите изменение цены в процентах", messages.ERROR)
+            return
+        lines, carts = reprice_heights({
+            pk: apply_percent(price, percent) for pk, price in queryset.values_list("pk", "tree_price")
+        })
+        self.message_user(request, f"Цены изменены на {percent}%. Пересчитано строк корзин: {lines}, корзин: {carts}")
+
 
 @admin.register(ChristmasTreeChoices)
-class ChristmasTreeHeightAdmin(admin.ModelAdmin):
-    pass
-    # search_fields = ("object_id",)
+class ChristmasTreeChoicesAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "tree", "tree_height")
+    list_select_related = ("tree__category", "tree_height")
+    raw_id_fields = ("tree", "cart_product")
@@ -0,0 +1,165 @@
+"""
+JSON API каталога только для чтения. DRF в зависимостях нет, поэтому это обычные view с JsonResponse.
+
+Все ответы получают сильный ETag из версии каталога (main.cache) и полного адреса запроса.
+Версия хранится в кэше, поэтому на If-None-Match с актуальным ETag отвечаем 304 без запросов в БД.
+
+GET /api/sidebar/                              - дерево левого меню (как в html-страницах)
+GET /api/categories/                           - подкатегории
+GET /api/products/<ct_model>/                  - товары, страницами по курсору (как CategoryDetailView)
+    category=<slug>                            - только товары подкатегории
+    slugs=a,b,c                                - пакетная выборка по slug (не больше API_MAX_BATCH),
+                                                 порядок ответа - порядок slugs, ненайденные - в missing
+    fields=id,title,heights                    - только перечисленные поля (по умолчанию DEFAULT_PRODUCT_FIELDS)
+    cursor, page_size                          - см. CategoryDetailView
+GET /api/products/<ct_model>/<slug>/           - один товар, параметр fields тот же
+"""
+import hashlib
+
+from django.db.models import Prefetch
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import condition, require_GET
+
+from .cache import CATALOG_NAMESPACE, get_version
+from .mixins import get_product_model_or_404
+from .models import Category, ChristmasTreeHeight
+from .pagination import InvalidCursor, KeysetPaginator, get_catalog_page_size
+
+API_MAX_BATCH = 100
+
+
+def _decimal(value):
+    return str(value) if value is not None else None
+
+
+IMAGE_COLUMNS = ("image", "image_renditions_ready")
+
+# Поле ответа -> (колонки для only(), функция значения). Поля, которых нет у модели товара, пропускаются
+PRODUCT_FIELDS = {
+    "id": (("id",), lambda product: product.pk),
+    "title": (("title",), lambda product: product.title),
+    "slug": (("slug",), lambda product: product.slug),
+    "url": (("slug",), lambda product: product.get_absolute_url()),
+    "category": (("category__slug",), lambda product: product.category.slug),
+    "description": (("description",), lambda product: product.description),
+    "product_type": (("product_type",), lambda product: product.product_type),
+    "from_place": (("from_place",), lambda product: product.from_place),
+    "min_price": (("min_price",), lambda product: _decimal(product.min_price)),
+    "max_price": (("max_price",), lambda product: _decimal(product.max_price)),
+    "image_url": (IMAGE_COLUMNS, lambda product: product.get_image_url()),
+    "image_webp_url": (IMAGE_COLUMNS, lambda product: product.get_image_url(webp=True)),
+    "image_width": (("image_width",), lambda product: product.image_width),
+    "image_height": (("image_height",), lambda product: product.image_height),
+    "heights": ((), lambda product: [
+        {"id": height.pk, "tree_height": height.tree_height, "tree_price": _decimal(height.tree_price)}
+        for height in product.choose_height.all()
+    ]),
+}
+DEFAULT_PRODUCT_FIELDS = ("id", "title", "slug", "url", "category", "min_price", "max_price", "image_url", "heights")
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def catalog_etag(request, *args, **kwargs):
+    return hashlib.md5(f"{get_version(CATALOG_NAMESPACE)}:{request.get_full_path()}".encode()).hexdigest()
+
+
+def catalog_endpoint(view):
+    return require_GET(condition(etag_func=catalog_etag)(view))
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params={"ensure_ascii": False})
+
+
+def _has_field(model, name):
+    if name == "heights":
+        return hasattr(model, "choose_height")
+    return all(hasattr(model, column.split("__")[0]) for column in PRODUCT_FIELDS[name][0])
+
+
+def get_fields(request, model):
+    requested = request.GET.get("fields")
+    if not requested:
+        return [name for name in DEFAULT_PRODUCT_FIELDS if _has_field(model, name)]
+    fields = [name.strip() for name in requested.split(",") if name.strip()]
+    unknown = [name for name in fields if name not in PRODUCT_FIELDS or not _has_field(model, name)]
+    if unknown:
+        raise FieldsError(f"Неизвестные поля: {', '.join(unknown)}")
+    return fields
+
+
+def get_product_queryset(model, fields):
+    """Только нужные колонки; категория - join, размеры - один prefetch, и только если их запросили."""
+    columns = {"id", "slug"}
+    for name in fields:
+        columns.update(PRODUCT_FIELDS[name][0])
+    queryset = model.objects.only(*columns)
+    if "category" in fields:
+        queryset = queryset.select_related("category")
+    if "heights" in fields:
+        queryset = queryset.prefetch_related(
+            Prefetch("choose_height", queryset=ChristmasTreeHeight.objects.order_by("tree_price")))
+    return queryset
+
+
+def serialize_product(product, fields):
+    return {name: PRODUCT_FIELDS[name][1](product) for name in fields}
+
+
+@catalog_endpoint
+def sidebar(request):
+    return _json({"results": Category.objects.get_categories_for_left_sidebar()})
+
+
+@catalog_endpoint
+def categories(request):
+    return _json({"results": list(Category.objects.order_by("name").values("id", "name", "slug"))})
+
+
+@catalog_endpoint
+def product_list(request, ct_model):
+    model = get_product_model_or_404(ct_model)
+    try:
+        fields = get_fields(request, model)
+    except FieldsError as error:
+        return _json({"error": str(error)}, status=400)
+    queryset = get_product_queryset(model, fields)
+
+    if request.GET.get("slugs"):
+        slugs = list(dict.fromkeys(slug.strip() for slug in request.GET["slugs"].split(",") if slug.strip()))
+        if len(slugs) > API_MAX_BATCH:
+            return _json({"error": f"Не больше {API_MAX_BATCH} slug за запрос"}, status=400)
+        products = queryset.in_bulk(slugs, field_name="slug")
+        return _json({
+            "results": [serialize_product(products[slug], fields) for slug in slugs if slug in products],
+            "missing": [slug for slug in slugs if slug not in products],
+        })
+
+    if request.GET.get("category"):
+        queryset = queryset.filter(category__slug=request.GET["category"])
+    paginator = KeysetPaginator(queryset, "-id", get_catalog_page_size(request))
+    try:
+        page = paginator.get_page(request.GET.get("cursor"))
+    except InvalidCursor:
+        return _json({"error": "Некорректный курсор страницы"}, status=400)
+    return _json({
+        "results": [serialize_product(product, fields) for product in page],
+        "next_cursor": page.next_cursor,
+        "prev_cursor": page.prev_cursor,
+    })
+
+
+@catalog_endpoint
+def product_detail(request, ct_model, slug):
+    model = get_product_model_or_404(ct_model)
+    try:
+        fields = get_fields(request, model)
+    except FieldsError as error:
+        return _json({"error": str(error)}, status=400)
+    product = get_product_queryset(model, fields).filter(slug=slug).first()
+    if product is None:
+        raise Http404("Товар не найден")
+    return _json(serialize_product(product, fields))
@@ -0,0 +1,127 @@
+"""
+Async-версии страниц каталога, корзины и JSON API для запуска под ASGI (Elkisamara/asgi.py подключает их
+через Elkisamara/async_urls.py, адреса и имена те же, что в Elkisamara/urls.py).
+
+ORM в Django 3.2 синхронный, а sync view под ASGI выполняются по одному в общем потоке
+(sync_to_async с thread_sensitive=True). Поэтому тело view целиком - сессия, пользователь, транзакция,
+запросы в БД и шаблон - выполняется одним вызовом в ограниченном пуле потоков ASYNC_ORM_WORKERS.
+Event loop при этом занят только чтением запроса и отправкой ответа: медленные клиенты не держат поток,
+а число одновременных обращений к БД не больше размера пула (остальные запросы ждут в очереди пула).
+
+Это работает, только если все middleware из settings.MIDDLEWARE поддерживают async (async_capable):
+одно sync middleware Django оборачивает в sync_to_async, и цепочка снова идет через один поток.
+Собственные middleware (main.middleware) поддерживают оба режима; RequestMetricsMiddleware считает SQL
+в потоках пула через collect_queries в _call_view.
+"""
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import api, views
+from .middleware import collect_queries
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        # Первые запросы приходят одновременно: без блокировки каждый создал бы свой пул
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "ASYNC_ORM_WORKERS", 8), thread_name_prefix="orm"
+                )
+    return _executor
+
+
+def _call_view(view, request, *args, **kwargs):
+    close_old_connections()
+    try:
+        # Контекст запроса копируется в поток пула, SQL считается в метрики запроса (RequestMetricsMiddleware)
+        with collect_queries():
+            response = view(request, *args, **kwargs)
+            # TemplateResponse рендерим здесь же: шаблон может обращаться к БД (ленивые связи, корзина)
+            if hasattr(response, "render") and callable(response.render):
+                response = response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+async def run_in_orm_pool(view, request, *args, **kwargs):
+    return await sync_to_async(_call_view, thread_sensitive=False, executor=get_executor())(
+        view, request, *args, **kwargs)
+
+
+def async_view(view):
+    """Async-обертка над sync view-функцией: вызов уходит в пул ORM."""
+    async def wrapper(request, *args, **kwargs):
+        return await run_in_orm_pool(view, request, *args, **kwargs)
+    # Атрибуты view (csrf_exempt, view_class, view_initkwargs) переносятся на обертку
+    return functools.update_wrapper(wrapper, view)
+
+
+class AsyncViewMixin:
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return async_view(super().as_view(**initkwargs))
+
+
+class BaseView(AsyncViewMixin, views.BaseView):
+    pass
+
+
+class ProductDetailView(AsyncViewMixin, views.ProductDetailView):
+    pass
+
+
+class CategoryDetailView(AsyncViewMixin, views.CategoryDetailView):
+    pass
+
+
+class SearchView(AsyncViewMixin, views.SearchView):
+    pass
+
+
+class CartView(AsyncViewMixin, views.CartView):
+    pass
+
+
+class CartWidgetView(AsyncViewMixin, views.CartWidgetView):
+    pass
+
+
+class AddToCartView(AsyncViewMixin, views.AddToCartView):
+    pass
+
+
+class DeleteFromCartView(AsyncViewMixin, views.DeleteFromCartView):
+    pass
+
+
+class ChangeQTYView(AsyncViewMixin, views.ChangeQTYView):
+    pass
+
+
+# sync view -> async-версия; по этой таблице Elkisamara/async_urls.py подменяет адреса
+ASYNC_VIEW_CLASSES = {
+    views.BaseView: BaseView,
+    views.ProductDetailView: ProductDetailView,
+    views.CategoryDetailView: CategoryDetailView,
+    views.SearchView: SearchView,
+    views.CartView: CartView,
+    views.CartWidgetView: CartWidgetView,
+    views.AddToCartView: AddToCartView,
+    views.DeleteFromCartView: DeleteFromCartView,
+    views.ChangeQTYView: ChangeQTYView,
+}
+ASYNC_VIEW_FUNCTIONS = {
+    view: async_view(view)
+    for view in (api.sidebar, api.categories, api.product_list, api.product_detail)
+}
@@ -0,0 +1,31 @@
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ("DEFERRED", "IMMEDIATE", "EXCLUSIVE")
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite с настройкой OPTIONS["transaction_mode"] (в Django она появилась только в 5.1).
+
+    Django 3.2 открывает atomic обычным BEGIN (DEFERRED): блокировка на запись берется при первой записи.
+    Если транзакция перед этим уже читала, а другая успела записать, SQLite не ждет по busy_timeout,
+    а сразу отвечает "database is locked". BEGIN IMMEDIATE берет блокировку на запись в начале
+    транзакции и ждет ее по busy_timeout, так что пишущие транзакции просто выстраиваются в очередь.
+    Для отдельных транзакций режим включает main.sqlite.immediate_atomic.
+    """
+
+    transaction_mode = None
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        transaction_mode = params.pop("transaction_mode", None)
+        if transaction_mode is not None and transaction_mode.upper() not in TRANSACTION_MODES:
+            raise ValueError(f"transaction_mode должен быть одним из {', '.join(TRANSACTION_MODES)}")
+        self.transaction_mode = transaction_mode and transaction_mode.upper()
+        return params
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            super()._start_transaction_under_autocommit()
+        else:
+            self.cursor().execute(f"BEGIN {self.transaction_mode}")
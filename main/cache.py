@@ -0,0 +1,91 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG_NAMESPACE = "catalog"
+SIDEBAR_CACHE_TIMEOUT = 60 * 60 * 24
+HOMEPAGE_FEED_TIMEOUT = 60 * 5
+PAGE_CACHE_TIMEOUT = 60 * 10
+# Блокировка пересборки значения в get_or_build и сколько остальные процессы ждут готовый результат
+REBUILD_LOCK_TIMEOUT = 60
+REBUILD_WAIT = 2
+
+
+def _version_key(namespace):
+    return f"{namespace}:version"
+
+
+def _bumped_key(namespace):
+    return f"{namespace}:bumped_at"
+
+
+def _initial_version():
+    # Версия, потерянная кэшем (вытеснение, перезапуск memcached), начинается с текущего времени в мкс,
+    # а не с 1: иначе снова стали бы видны записи, сохраненные под старыми номерами
+    return time.time_ns() // 1000
+
+
+def get_version(namespace):
+    """
+    Текущая версия пространства имен кэша. Смена версии делает старые ключи недоступными.
+    Версия хранится в общем кэше (settings.CACHES), поэтому смена видна всем процессам сервера.
+    """
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        cache.add(_version_key(namespace), _initial_version(), timeout=None)
+        version = cache.get(_version_key(namespace), 1)
+    return version
+
+
+def bump_version(namespace):
+    try:
+        cache.incr(_version_key(namespace))
+    except ValueError:
+        cache.set(_version_key(namespace), _initial_version(), timeout=None)
+    cache.set(_bumped_key(namespace), time.time(), timeout=None)
+
+
+def bump_version_on_commit(namespace):
+    """
+    Смена версии после коммита текущей транзакции (вне транзакции - сразу). Если сменить версию раньше,
+    параллельный запрос успеет прочитать еще старые данные и сохранить их в кэш под новой версией.
+    """
+    transaction.on_commit(lambda: bump_version(namespace))
+
+
+def bumped_within(namespace, seconds):
+    """Менялась ли версия пространства имен за последние seconds секунд (в любом процессе)."""
+    bumped_at = cache.get(_bumped_key(namespace))
+    return bumped_at is not None and time.time() - bumped_at < seconds
+
+
+def make_key(namespace, *parts):
+    return ":".join([namespace, str(get_version(namespace)), *map(str, parts)])
+
+
+def get_or_build(key, build, timeout):
+    """
+    Значение из кэша, при промахе - build() с сохранением в кэш. После смены версии промахиваются все
+    процессы разом; строит значение только тот, кто взял блокировку (cache.add атомарен в общем кэше),
+    остальные до REBUILD_WAIT секунд ждут его результат и лишь потом строят сами.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+    lock_key = f"{key}:lock"
+    locked = cache.add(lock_key, True, REBUILD_LOCK_TIMEOUT)
+    if not locked:
+        deadline = time.monotonic() + REBUILD_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            value = cache.get(key)
+            if value is not None:
+                return value
+    try:
+        value = build()
+        cache.set(key, value, timeout)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return value
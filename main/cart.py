@@ -0,0 +1,171 @@
+from decimal import Decimal
+
+from .models import Cart, ChristmasTreeHeight, Customer, product_registry
+from .sqlite import immediate_atomic
+
+CART_SESSION_KEY = "cart_id"
+
+
+class CartLine:
+    """Строка корзины, готовая к выводу в шаблоне: все данные уже загружены."""
+
+    def __init__(self, product, qty, height=None, line_total=None):
+        self.product = product
+        self.ct_model = product.get_model_name()
+        self.title = product.title
+        self.category = product.category
+        self.url = product.get_absolute_url()
+        self.qty = qty
+        self.height = height
+        self.unit_price = height.tree_price if height is not None else product.price
+        if line_total is None and self.unit_price is not None:
+            line_total = self.unit_price * qty
+        self.line_total = line_total
+
+    @classmethod
+    def from_cart_product(cls, cart_product):
+        tree_choices = cart_product.tree_in_cart.all()
+        height = tree_choices[0].tree_height if tree_choices else None
+        return cls(cart_product.content_object, cart_product.qty, height, cart_product.final_price)
+
+
+def get_cart_lines(cart):
+    """Строки корзины фиксированным числом запросов, независимо от числа товаров."""
+    if cart is None:
+        return []
+    if isinstance(cart, SessionCart):
+        return cart.get_lines()
+    # Строку удаленного товара (GenericForeignKey не каскадит удаление) пропускаем, как и в SessionCart.get_lines
+    return [
+        CartLine.from_cart_product(cart_product)
+        for cart_product in cart.products.with_details()
+        if cart_product.content_object is not None
+    ]
+
+
+class SessionCart:
+    """
+    Корзина анонимного пользователя. Хранится в сессии и не пишет в БД,
+    пока пользователь не войдет на сайт (см. merge_into).
+    Повторяет интерфейс Cart: add_product, remove_product, change_qty, final_price, total_products.
+    В сессии только товар, размер и количество: цены берутся из БД при чтении строк, поэтому
+    смена цены (main.utils.reprice_heights) сразу видна и в корзинах анонимных посетителей.
+    """
+
+    SESSION_KEY = "anonymous_cart"
+
+    def __init__(self, session):
+        self.session = session
+        self.items = session.get(self.SESSION_KEY, [])
+        self._lines = None
+
+    def __len__(self):
+        return len(self.items)
+
+    def __str__(self):
+        return f"Корзина сессии ({len(self)} поз.)"
+
+    @property
+    def final_price(self):
+        return sum((line.line_total for line in self.get_lines() if line.line_total is not None), Decimal(0))
+
+    @property
+    def total_products(self):
+        return len(self.items)
+
+    def _find(self, product):
+        ct_model = product.get_model_name()
+        for item in self.items:
+            if item["ct_model"] == ct_model and item["object_id"] == product.id:
+                return item
+        return None
+
+    def _save(self):
+        self._lines = None
+        self.session[self.SESSION_KEY] = self.items
+        self.session.modified = True
+
+    def add_product(self, product, tree_height_id=None, qty=1):
+        item = self._find(product)
+        if item is not None:
+            return item, False
+        if tree_height_id is not None:
+            # Несуществующий размер - та же ошибка, что и в Cart.add_product
+            tree_height_id = ChristmasTreeHeight.objects.values_list("pk", flat=True).get(pk=tree_height_id)
+        item = {
+            "ct_model": product.get_model_name(),
+            "object_id": product.id,
+            "tree_height_id": tree_height_id,
+            "qty": qty,
+        }
+        self.items.append(item)
+        self._save()
+        return item, True
+
+    def remove_product(self, product):
+        item = self._find(product)
+        if item is not None:
+            self.items.remove(item)
+            self._save()
+
+    def change_qty(self, product, qty):
+        item = self._find(product)
+        if item is not None:
+            item["qty"] = qty
+            self._save()
+
+    def clear(self):
+        self.items = []
+        self._lines = None
+        self.session.pop(self.SESSION_KEY, None)
+
+    def _load_products(self):
+        object_ids = {}
+        for item in self.items:
+            object_ids.setdefault(item["ct_model"], []).append(item["object_id"])
+        return {
+            ct_model: product_registry.get_model(ct_model).objects.select_related("category").in_bulk(ids)
+            for ct_model, ids in object_ids.items()
+            if ct_model in product_registry
+        }
+
+    def get_lines(self):
+        if self._lines is not None:
+            return self._lines
+        products = self._load_products()
+        heights = ChristmasTreeHeight.objects.in_bulk(
+            [item["tree_height_id"] for item in self.items if item["tree_height_id"] is not None]
+        )
+        lines = []
+        for item in self.items:
+            product = products.get(item["ct_model"], {}).get(item["object_id"])
+            if product is None:
+                continue
+            lines.append(CartLine(product, item["qty"], heights.get(item["tree_height_id"])))
+        self._lines = lines
+        return lines
+
+    def merge_into(self, cart):
+        """Переносит позиции в БД-корзину покупателя. Совпадающие позиции складываются по количеству."""
+        products = self._load_products()
+        for item in self.items:
+            product = products.get(item["ct_model"], {}).get(item["object_id"])
+            if product is None:
+                continue
+            cart_product, created = cart.add_product(product, item["tree_height_id"], qty=item["qty"])
+            if not created:
+                cart.change_qty(product, cart_product.qty + item["qty"])
+        self.clear()
+
+
+def merge_session_cart(request, user):
+    session_cart = SessionCart(request.session)
+    if not len(session_cart):
+        return
+    with immediate_atomic():
+        customer, _ = Customer.objects.get_or_create(user=user)
+        cart = Cart.objects.filter(owner=customer, in_order=False).first()
+        if cart is None:
+            cart = Cart.objects.create(owner=customer)
+        session_cart.merge_into(cart)
+    request.session[CART_SESSION_KEY] = cart.pk
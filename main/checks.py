@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if settings.CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        "Кэш по умолчанию живет в памяти процесса: версия кэша каталога (main.cache) не общая для воркеров, "
+        "и после изменения каталога другие процессы отдают устаревшие страницы до истечения кэша.",
+        hint="Используйте общий кэш (файловый или memcached) или запускайте сервер одним процессом.",
+        id="main.W001",
+    )]
@@ -0,0 +1,197 @@
+from collections import Counter
+
+from django.db import models
+from django.db.models.functions import Coalesce
+
+from .cache import CATALOG_NAMESPACE, SIDEBAR_CACHE_TIMEOUT, get_or_build, make_key
+
+# Фасеты каталога: GET-параметр -> заголовок. Значения параметров можно повторять (?height=1.5&height=2)
+FACETS = (
+    ("product_type", "Тип дерева"),
+    ("height", "Рост, м"),
+    ("price", "Цена, руб"),
+    ("from_place", "Откуда привезена"),
+)
+# Ценовые диапазоны по цене размеров елки: ключ, от (включительно), до (не включительно)
+PRICE_BANDS = (
+    ("0-2000", 0, 2000),
+    ("2000-4000", 2000, 4000),
+    ("4000-7000", 4000, 7000),
+    ("7000-", 7000, None),
+)
+# Позиция фасета в сигнатуре товара (см. build_facet_table); height и price - кортежи значений
+SIGNATURE_INDEX = {"product_type": 0, "from_place": 1, "height": 2, "price": 3}
+MULTI_VALUED = {"height", "price"}
+# Бит на значение в маске build_facet_table: 63-й бит знаковый, роста сверх 62 уходят в следующую маску
+MASK_BITS = 62
+
+
+def get_price_band_label(key):
+    for band_key, low, high in PRICE_BANDS:
+        if band_key == key:
+            return f"от {low}" if high is None else f"{low} - {high}"
+    return key
+
+
+def _price_band_condition(low, high):
+    """Условие на связь товара с размером: цена размера в диапазоне [low, high)."""
+    condition = models.Q(christmastreeheight__tree_price__gte=low)
+    if high is not None:
+        condition &= models.Q(christmastreeheight__tree_price__lt=high)
+    return condition
+
+
+def _bit_mask(links, conditions):
+    """
+    Подзапрос: битовая маска связей товара с размерами, бит i выставлен, если хоть одна связь выполняет
+    conditions[i]. SUM(DISTINCT) по битам - это их ИЛИ.
+    """
+    bits = models.Case(
+        *[models.When(condition, then=models.Value(1 << bit)) for bit, condition in enumerate(conditions)],
+        default=models.Value(0), output_field=models.BigIntegerField(),
+    )
+    mask = links.values("christmastree").annotate(mask=models.Sum(bits, distinct=True)).values("mask")
+    return Coalesce(models.Subquery(mask), models.Value(0), output_field=models.BigIntegerField())
+
+
+def _bits(mask, values):
+    return tuple(value for bit, value in enumerate(values) if mask >> bit & 1)
+
+
+def build_facet_table(model, category_slug=None):
+    """
+    Таблица фасетов подкатегории: [((product_type, from_place, (рост, ...), (ценовой диапазон, ...)), число товаров)].
+    Товары с одинаковой сигнатурой схлопываются в одну строку, поэтому таблица намного меньше каталога,
+    а счетчики для любого набора фильтров считаются по ней в памяти.
+    Сигнатуры группирует БД: роста и ценовые диапазоны товара сворачиваются в битовые маски, и по ним вместе
+    с product_type и from_place идет GROUP BY. Цена вне PRICE_BANDS в диапазоны не попадает.
+    """
+    products = model.objects.all()
+    if category_slug:
+        products = products.filter(category__slug=category_slug)
+    masks, heights = {}, []
+    if hasattr(model, "choose_height"):
+        links = model.choose_height.through.objects.filter(christmastree=models.OuterRef("pk"))
+        heights = sorted(
+            model.choose_height.through.objects.filter(christmastree__in=products)
+            .filter(christmastreeheight__tree_height__gt="")
+            .values_list("christmastreeheight__tree_height", flat=True).distinct().order_by()
+        )
+        for start in range(0, len(heights), MASK_BITS):
+            masks[f"heights_{start}"] = _bit_mask(links, [
+                models.Q(christmastreeheight__tree_height=height) for height in heights[start:start + MASK_BITS]
+            ])
+        masks["price_bands"] = _bit_mask(links, [_price_band_condition(low, high) for _, low, high in PRICE_BANDS])
+
+    rows = (products.annotate(**masks).values("product_type", "from_place", *masks)
+            .annotate(count=models.Count("id")).order_by())
+    table = []
+    for row in rows:
+        row_heights = ()
+        for start in range(0, len(heights), MASK_BITS):
+            row_heights += _bits(row[f"heights_{start}"], heights[start:start + MASK_BITS])
+        bands = _bits(row.get("price_bands", 0), [key for key, _, _ in PRICE_BANDS])
+        table.append(((row["product_type"], row["from_place"], row_heights, bands), row["count"]))
+    return table
+
+
+def get_facet_table(ct_model, model, category_slug=None):
+    """
+    Таблица фасетов из кэша. Ключ включает версию каталога, так что изменения товаров ее сбрасывают;
+    пересобирает таблицу после сброса один процесс (main.cache.get_or_build).
+    """
+    cache_key = make_key(CATALOG_NAMESPACE, "facets", ct_model, category_slug or "")
+    return get_or_build(cache_key, lambda: build_facet_table(model, category_slug), SIDEBAR_CACHE_TIMEOUT)
+
+
+def get_selected_facets(query_dict):
+    """{фасет: множество выбранных значений} из GET-параметров. tree_type - старое имя product_type."""
+    selected = {name: set(filter(None, query_dict.getlist(name))) for name, _ in FACETS}
+    if query_dict.get("tree_type"):
+        selected["product_type"].add(query_dict["tree_type"])
+    return {name: values for name, values in selected.items() if values}
+
+
+def _signature_matches(signature, name, values):
+    value = signature[SIGNATURE_INDEX[name]]
+    if name in MULTI_VALUED:
+        return not values.isdisjoint(value)
+    return value in values
+
+
+def count_facets(table, selected):
+    """
+    Счетчики значений фасетов при выбранных фильтрах. Для каждого фасета учитываются фильтры остальных
+    фасетов, но не его собственный - так видно, сколько товаров добавит выбор еще одного значения.
+    Возвращает ({фасет: Counter(значение -> число товаров)}, число товаров под всеми фильтрами).
+    """
+    counts = {name: Counter() for name, _ in FACETS}
+    total = 0
+    for signature, count in table:
+        failed = [name for name, values in selected.items() if not _signature_matches(signature, name, values)]
+        if len(failed) > 1:
+            continue
+        if not failed:
+            total += count
+        for name in counts:
+            if failed and failed[0] != name:
+                continue
+            value = signature[SIGNATURE_INDEX[name]]
+            for item in (value if name in MULTI_VALUED else (value,)):
+                if item is not None:
+                    counts[name][item] += count
+    return counts, total
+
+
+def _sort_key(name, value):
+    if name == "price":
+        return [key for key, _, _ in PRICE_BANDS].index(value)
+    if name == "height":
+        try:
+            return 0, float(value.replace(",", ".")), value
+        except ValueError:
+            return 1, 0, value
+    return value
+
+
+def get_facets(ct_model, model, category_slug, selected):
+    """Фасеты для шаблона: [{name, title, values: [{value, label, count, selected}]}] и число товаров."""
+    counts, total = count_facets(get_facet_table(ct_model, model, category_slug), selected)
+    facets = []
+    for name, title in FACETS:
+        chosen = selected.get(name, set())
+        values = [
+            {
+                "value": value,
+                "label": get_price_band_label(value) if name == "price" else value,
+                "count": count,
+                "selected": value in chosen,
+            }
+            for value, count in sorted(counts[name].items(), key=lambda item: _sort_key(name, item[0]))
+        ]
+        if values:
+            facets.append({"name": name, "title": title, "values": values})
+    return facets, total
+
+
+def filter_by_facets(queryset, selected):
+    """Фильтр товаров по выбранным фасетам; внутри фасета значения объединяются через ИЛИ."""
+    if "product_type" in selected:
+        queryset = queryset.filter(product_type__in=selected["product_type"])
+    if "from_place" in selected:
+        queryset = queryset.filter(from_place__in=selected["from_place"])
+    if not hasattr(queryset.model, "choose_height"):
+        return queryset
+    heights = queryset.model.choose_height.through.objects.filter(christmastree=models.OuterRef("pk"))
+    if "height" in selected:
+        queryset = queryset.filter(models.Exists(
+            heights.filter(christmastreeheight__tree_height__in=selected["height"])))
+    if "price" in selected:
+        bands = models.Q()
+        for key, low, high in PRICE_BANDS:
+            if key in selected["price"]:
+                bands |= _price_band_condition(low, high)
+        if not bands:
+            return queryset.none()
+        queryset = queryset.filter(models.Exists(heights.filter(bands)))
+    return queryset
@@ -20,6 +20,9 @@ class RegisterUserForm(UserCreationForm):
 
 
 class OrderForm(forms.ModelForm):
+    # Новый на каждый показ формы (CheckoutView.get_initial), при повторной отправке - тот же
+    idempotency_key = forms.UUIDField(widget=forms.HiddenInput)
+
     def clean_first_name(self):
         first_name = self.cleaned_data.get('first_name')
         if not first_name:
@@ -0,0 +1,110 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image
+
+from .cache import CATALOG_NAMESPACE, bump_version
+
+logger = logging.getLogger(__name__)
+
+# Имя рендишена -> максимальный размер стороны
+RENDITIONS = {
+    "thumb": (200, 200),
+    "medium": (600, 600),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        # Как и пул ORM (main.async_views): одновременные первые сохранения не должны создать по пулу каждое
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "IMAGE_RENDITION_WORKERS", 2), thread_name_prefix="renditions"
+                )
+    return _executor
+
+
+def get_rendition_name(name, rendition, webp=False):
+    """products/tree/elka.jpg -> products/tree/renditions/elka_medium.jpg (или .webp)"""
+    directory, filename = os.path.split(name)
+    stem, ext = os.path.splitext(filename)
+    if webp or ext.lower() not in (".jpg", ".jpeg", ".png"):
+        ext = ".webp" if webp else ".jpg"
+    return os.path.join(directory, "renditions", f"{stem}_{rendition}{ext}")
+
+
+def get_image_url(name, renditions_ready, rendition="medium", webp=False, storage=default_storage):
+    """
+    URL превью, а пока превью не построены - URL оригинала (для WebP - None).
+    Файл при этом не открывается.
+    """
+    if not name:
+        return None
+    if renditions_ready:
+        return storage.url(get_rendition_name(name, rendition, webp))
+    return None if webp else storage.url(name)
+
+
+def read_image_size(image):
+    """(ширина, высота) изображения из ImageFieldFile; (None, None), если файл не читается."""
+    try:
+        return image.width, image.height
+    except (OSError, ValueError):
+        logger.warning("Не удалось прочитать размеры изображения %s", image.name)
+        return None, None
+
+
+def generate_renditions(name, storage=default_storage):
+    """Строит превью и возвращает размеры оригинала."""
+    with storage.open(name) as image_file:
+        original = Image.open(image_file)
+        original.load()
+    for rendition, size in RENDITIONS.items():
+        image = original.copy()
+        image.thumbnail(size)
+        for webp in (False, True):
+            rendition_name = get_rendition_name(name, rendition, webp)
+            fmt = "WEBP" if webp else ("PNG" if rendition_name.lower().endswith(".png") else "JPEG")
+            converted = image
+            if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+                converted = image.convert("RGB")
+            elif fmt == "WEBP" and image.mode not in ("RGB", "RGBA"):
+                converted = image.convert("RGBA")
+            buffer = BytesIO()
+            converted.save(buffer, fmt, quality=85)
+            if storage.exists(rendition_name):
+                storage.delete(rendition_name)
+            storage.save(rendition_name, ContentFile(buffer.getvalue()))
+    return original.size
+
+
+def _build_renditions(model, pk, name):
+    close_old_connections()
+    try:
+        width, height = generate_renditions(name)
+        # update() не вызывает сигналы сохранения, поэтому кэш каталога сбрасываем сами
+        if model.objects.filter(pk=pk, image=name).update(
+                image_renditions_ready=True, image_width=width, image_height=height):
+            bump_version(CATALOG_NAMESPACE)
+    except Exception:
+        logger.exception("Не удалось построить превью для %s", name)
+    finally:
+        close_old_connections()
+
+
+def schedule_renditions(instance):
+    """Превью строятся в фоновом потоке после коммита транзакции, в которой сохранили товар."""
+    model, pk, name = instance.__class__, instance.pk, instance.image.name
+    transaction.on_commit(lambda: get_executor().submit(_build_renditions, model, pk, name))
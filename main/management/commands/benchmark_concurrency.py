@@ -0,0 +1,143 @@
+import asyncio
+import io
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+
+class SlowInput(io.BytesIO):
+    """Тело запроса, которое клиент передает delay секунд: поток WSGI-сервера все это время занят."""
+
+    def __init__(self, body, delay):
+        super().__init__(body)
+        self.delay = delay
+
+    def read(self, *args):
+        if self.delay:
+            time.sleep(self.delay)
+            self.delay = 0
+        return super().read(*args)
+
+
+def _report(name, wall, latencies, statuses):
+    latencies = sorted(latencies)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    errors = sum(1 for status in statuses if status >= 500)
+    return (
+        f"{name}: {len(latencies)} запросов за {wall:.2f} с, {len(latencies) / wall:.0f} запр/с, "
+        f"задержка p50 {statistics.median(latencies) * 1000:.0f} мс, p95 {p95 * 1000:.0f} мс, "
+        f"макс {latencies[-1] * 1000:.0f} мс, ошибок {errors}"
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнение пропускной способности и задержек под ASGI (async view из main.async_views, "
+        "пул ORM ASYNC_ORM_WORKERS) и WSGI (sync view, сервер с фиксированным числом потоков). "
+        "Обработчики Django вызываются в процессе, без сети: --clients одновременных клиентов, "
+        "каждый делает --requests запросов, тело запроса передается --client-delay секунд (медленный клиент). "
+        "Работает с текущей БД, каталог должен быть заполнен."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/api/products/christmastree/", help="Адрес с GET-параметрами")
+        parser.add_argument("--clients", type=int, default=100)
+        parser.add_argument("--requests", type=int, default=5, help="Запросов на клиента")
+        parser.add_argument("--client-delay", type=float, default=0.05,
+                            help="Сколько секунд клиент передает тело запроса")
+        parser.add_argument("--wsgi-threads", type=int, default=8, help="Потоков WSGI-сервера")
+        parser.add_argument("--mode", choices=("both", "asgi", "wsgi"), default="both")
+
+    def handle(self, *args, **options):
+        if options["clients"] < 1 or options["requests"] < 1 or options["wsgi_threads"] < 1:
+            raise CommandError("--clients, --requests и --wsgi-threads должны быть положительными")
+        url = urlsplit(options["path"])
+        self.path, self.query = url.path, url.query
+        self.clients, self.requests, self.delay = options["clients"], options["requests"], options["client_delay"]
+
+        if options["mode"] in ("both", "wsgi"):
+            self.stdout.write(self._run_wsgi(options["wsgi_threads"]))
+        if options["mode"] in ("both", "asgi"):
+            with override_settings(ROOT_URLCONF="Elkisamara.async_urls"):
+                self.stdout.write(asyncio.run(self._run_asgi()))
+
+    def _run_wsgi(self, threads):
+        handler = WSGIHandler()
+
+        def request(queued):
+            environ = {
+                "REQUEST_METHOD": "GET", "PATH_INFO": self.path, "QUERY_STRING": self.query,
+                "SERVER_NAME": "testserver", "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1",
+                "REMOTE_ADDR": "127.0.0.1", "CONTENT_LENGTH": "0",
+                "wsgi.url_scheme": "http", "wsgi.input": SlowInput(b"", self.delay), "wsgi.errors": io.StringIO(),
+                "wsgi.version": (1, 0), "wsgi.multithread": True, "wsgi.multiprocess": False,
+                "wsgi.run_once": False,
+            }
+            status = []
+            # Сервер читает тело запроса до вызова приложения
+            environ["wsgi.input"].read()
+            body = handler(environ, lambda status_line, headers: status.append(int(status_line[:3])))
+            b"".join(body)
+            body.close()
+            return time.perf_counter() - queued, status[0]
+
+        latencies, statuses = [], []
+        lock = threading.Lock()
+
+        def client(pool):
+            for _ in range(self.requests):
+                latency, status = pool.submit(request, time.perf_counter()).result()
+                with lock:
+                    latencies.append(latency)
+                    statuses.append(status)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            clients = [threading.Thread(target=client, args=(pool,)) for _ in range(self.clients)]
+            for thread in clients:
+                thread.start()
+            for thread in clients:
+                thread.join()
+        return _report(f"WSGI, {threads} потоков", time.perf_counter() - started, latencies, statuses)
+
+    async def _run_asgi(self):
+        handler = ASGIHandler()
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "scheme": "http",
+            "method": "GET", "path": self.path, "root_path": "", "query_string": self.query.encode(),
+            "headers": [(b"host", b"testserver")], "server": ("testserver", 80), "client": ("127.0.0.1", 0),
+        }
+
+        async def request():
+            async def receive():
+                await asyncio.sleep(self.delay)
+                return {"type": "http.request", "body": b"", "more_body": False}
+
+            status = []
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    status.append(message["status"])
+
+            started = time.perf_counter()
+            await handler(dict(scope), receive, send)
+            return time.perf_counter() - started, status[0]
+
+        async def client():
+            return [await request() for _ in range(self.requests)]
+
+        started = time.perf_counter()
+        results = [result for results in await asyncio.gather(*(client() for _ in range(self.clients)))
+                   for result in results]
+        return _report(
+            f"ASGI, пул ORM {settings.ASYNC_ORM_WORKERS} потоков", time.perf_counter() - started,
+            [latency for latency, _ in results], [status for _, status in results],
+        )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from main.cache import CATALOG_NAMESPACE, bump_version
+from main.images import generate_renditions
+from main.models import product_registry
+
+
+class Command(BaseCommand):
+    help = "Строит превью (thumb, medium, WebP) для товаров, у которых их еще нет"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Перестроить превью у всех товаров")
+
+    def handle(self, *args, **options):
+        built = 0
+        for ct_model, model in product_registry.items():
+            products = model.objects.exclude(image="").exclude(image=None)
+            if not options["force"]:
+                products = products.filter(image_renditions_ready=False)
+            for pk, name in products.values_list("pk", "image").iterator():
+                try:
+                    width, height = generate_renditions(name)
+                except (OSError, ValueError) as error:
+                    self.stderr.write(f"{ct_model} #{pk}: {name}: {error}")
+                    continue
+                model.objects.filter(pk=pk, image=name).update(
+                    image_renditions_ready=True, image_width=width, image_height=height)
+                built += 1
+        bump_version(CATALOG_NAMESPACE)
+        self.stdout.write(self.style.SUCCESS(f"Построено превью: {built}"))
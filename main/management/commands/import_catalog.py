@@ -0,0 +1,236 @@
+import csv
+import io
+import json
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from main.cache import CATALOG_NAMESPACE, bump_version_on_commit
+from main.models import Category, ChristmasTree, ChristmasTreeHeight
+from main.search import search_index
+
+TREE_FIELDS = ("title", "category_id", "product_type", "from_place", "description", "price")
+
+
+class RowError(ValueError):
+    pass
+
+
+def _decimal(value, field):
+    if value in (None, ""):
+        return None
+    try:
+        return Decimal(str(value).replace(",", ".")).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise RowError(f"{field}: некорректное число {value!r}")
+
+
+def _parse_heights(value):
+    """
+    "1.5=2500; 2=3000" (CSV) или [{"tree_height": "1.5", "tree_price": 2500}, ...] (JSON)
+    -> [("1.5", Decimal("2500.00")), ...]
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        pairs = []
+        for item in value.split(";"):
+            if not item.strip():
+                continue
+            height, separator, price = item.partition("=")
+            if not separator:
+                raise RowError(f"heights: ожидается рост=цена, получено {item!r}")
+            pairs.append((height.strip(), price.strip()))
+    else:
+        try:
+            pairs = [(str(item["tree_height"]), item["tree_price"]) for item in value]
+        except (KeyError, TypeError):
+            raise RowError(f"heights: ожидается список объектов tree_height/tree_price, получено {value!r}")
+    heights = [(height, _decimal(price, "heights")) for height, price in pairs]
+    for height, price in heights:
+        if price is None:
+            raise RowError(f"heights: не указана цена для роста {height}")
+    return heights
+
+
+class Command(BaseCommand):
+    help = (
+        "Загрузка каталога елок из CSV или JSON Lines за один проход пачками: товары обновляются по slug, "
+        "категории и размеры (рост + цена) создаются при необходимости, поля и размеры елки заменяются указанными "
+        "(пустые очищаются). "
+        "Колонки: slug, title, category (slug категории), category_name, product_type, from_place, "
+        "description, price, heights (\"1.5=2500;2=3000\" или список объектов tree_height/tree_price в JSON)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл .csv / .jsonl или - для stdin")
+        parser.add_argument("--format", choices=("csv", "jsonl"), help="По умолчанию - по расширению файла")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--delimiter", default=",", help="Разделитель CSV")
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or ("jsonl" if options["path"].endswith((".jsonl", ".json")) else "csv")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть положительным")
+        self.categories = dict(Category.objects.values_list("slug", "id"))
+        self.heights = {
+            (tree_height, tree_price): pk
+            for pk, tree_height, tree_price in ChristmasTreeHeight.objects.values_list("id", "tree_height",
+                                                                                        "tree_price")
+        }
+        self.created = self.updated = self.skipped = 0
+
+        started = time.perf_counter()
+        total = 0
+        try:
+            with self._open(options["path"]) as source:
+                rows = self._read(source, fmt, options["delimiter"])
+                while True:
+                    batch = list(islice(rows, options["batch_size"]))
+                    if not batch:
+                        break
+                    self._import_batch(batch)
+                    total += len(batch)
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(f"{total} строк, {total / elapsed:.0f} строк/с")
+        finally:
+            # Пачки фиксируются по отдельности: при падении на середине загруженные уже в БД,
+            # и кэш каталога должен их увидеть
+            bump_version_on_commit(CATALOG_NAMESPACE)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово за {elapsed:.1f} с ({total / elapsed if elapsed else 0:.0f} строк/с): "
+            f"создано {self.created}, обновлено {self.updated}, пропущено {self.skipped}"
+        ))
+
+    @staticmethod
+    def _open(path):
+        if path == "-":
+            return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig", newline="")
+        try:
+            return open(path, encoding="utf-8-sig", newline="")
+        except OSError as error:
+            raise CommandError(error)
+
+    @staticmethod
+    def _read(source, fmt, delimiter):
+        """Генератор (номер строки, dict) - файл целиком в память не читается."""
+        if fmt == "csv":
+            reader = csv.DictReader(source, delimiter=delimiter)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_num, line in enumerate(source, 1):
+            if line.strip():
+                try:
+                    yield line_num, json.loads(line)
+                except ValueError as error:
+                    yield line_num, error
+
+    def _clean(self, row):
+        if isinstance(row, ValueError):
+            raise RowError(f"некорректный JSON: {row}")
+        if not isinstance(row, dict):
+            raise RowError(f"ожидается объект, получено {type(row).__name__}")
+        slug, title, category = (str(row.get(key) or "").strip() for key in ("slug", "title", "category"))
+        if not slug or not title or not category:
+            raise RowError("обязательны slug, title и category")
+        price = _decimal(row.get("price"), "price")
+        heights = _parse_heights(row.get("heights"))
+        # Категории и размеры создаются только для строки, прошедшей все проверки: отклоненная строка
+        # не оставляет в БД записей, на которые никто не ссылается
+        return {
+            "slug": slug,
+            "title": title,
+            "category_id": self._get_category_id(category, row.get("category_name")),
+            "product_type": row.get("product_type") or None,
+            "from_place": row.get("from_place") or None,
+            "description": row.get("description") or None,
+            "price": price,
+            "heights": [self._get_height_id(*height) for height in heights],
+        }
+
+    def _get_category_id(self, slug, name):
+        if slug not in self.categories:
+            category, _ = Category.objects.get_or_create(slug=slug, defaults={"name": name or slug})
+            self.categories[slug] = category.id
+        return self.categories[slug]
+
+    def _get_height_id(self, tree_height, tree_price):
+        key = (tree_height, tree_price)
+        if key not in self.heights:
+            self.heights[key] = ChristmasTreeHeight.objects.create(tree_height=tree_height, tree_price=tree_price).id
+        return self.heights[key]
+
+    @staticmethod
+    def _update_trees(trees):
+        """
+        UPDATE по первичному ключу через executemany: bulk_update собирает CASE WHEN на каждую строку,
+        и на пачке в тысячу строк сборка выражения в Python стоит дороже самого запроса.
+        """
+        if not trees:
+            return
+        fields = [ChristmasTree._meta.get_field(field) for field in TREE_FIELDS]
+        quote_name = connection.ops.quote_name
+        sql = "UPDATE {} SET {} WHERE {} = %s".format(
+            quote_name(ChristmasTree._meta.db_table),
+            ", ".join(f"{quote_name(field.column)} = %s" for field in fields),
+            quote_name(ChristmasTree._meta.pk.column),
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                [field.get_db_prep_save(getattr(tree, field.attname), connection) for field in fields] + [tree.pk]
+                for tree in trees
+            ])
+
+    def _import_batch(self, batch):
+        cleaned = {}
+        for line_num, row in batch:
+            try:
+                data = self._clean(row)
+            except RowError as error:
+                self.skipped += 1
+                self.stderr.write(f"Строка {line_num}: {error}")
+                continue
+            # Повтор slug в пачке: побеждает последняя строка
+            cleaned[data["slug"]] = data
+        if not cleaned:
+            return
+
+        with transaction.atomic():
+            existing = ChristmasTree.objects.only("id", "slug").in_bulk(list(cleaned), field_name="slug")
+            to_update, to_create = [], []
+            for slug, data in cleaned.items():
+                tree = existing.get(slug) or ChristmasTree(slug=slug)
+                for field in TREE_FIELDS:
+                    setattr(tree, field, data[field])
+                (to_update if tree.pk else to_create).append(tree)
+            self._update_trees(to_update)
+            ChristmasTree.objects.bulk_create(to_create)
+            if to_create:
+                # На SQLite bulk_create не возвращает id
+                ids = dict(ChristmasTree.objects.filter(slug__in=[tree.slug for tree in to_create])
+                           .values_list("slug", "id"))
+                for tree in to_create:
+                    tree.pk = ids[tree.slug]
+
+            trees = to_update + to_create
+            through = ChristmasTree.choose_height.through
+            through.objects.filter(christmastree_id__in=[tree.pk for tree in to_update]).delete()
+            through.objects.bulk_create(
+                [
+                    through(christmastree_id=tree.pk, christmastreeheight_id=height_id)
+                    for tree in trees
+                    for height_id in cleaned[tree.slug]["heights"]
+                ],
+                ignore_conflicts=True,
+            )
+            ChristmasTree.objects.filter(pk__in=[tree.pk for tree in trees]).refresh_price_range()
+            search_index.update(trees)
+        self.created += len(to_create)
+        self.updated += len(to_update)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.search import search_index
+
+
+class Command(BaseCommand):
+    help = "Перестраивает полнотекстовый индекс товаров (после загрузки данных в обход сигналов)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = search_index.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Проиндексировано товаров: {count}"))
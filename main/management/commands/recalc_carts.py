@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.models import Cart
+from main.utils import recalc_cart
+
+
+class Command(BaseCommand):
+    help = "Полная сверка итогов (сумма, число товаров) открытых корзин"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Пересчитать и оформленные корзины")
+        parser.add_argument("--cart", type=int, action="append", dest="cart_ids", help="id корзины (можно несколько)")
+
+    def handle(self, *args, **options):
+        carts = Cart.objects.all()
+        if not options["all"]:
+            carts = carts.filter(in_order=False)
+        if options["cart_ids"]:
+            carts = carts.filter(pk__in=options["cart_ids"])
+        count = 0
+        for cart in carts.iterator():
+            with transaction.atomic():
+                recalc_cart(cart)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано корзин: {count}"))
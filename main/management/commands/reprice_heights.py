@@ -0,0 +1,52 @@
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.models import ChristmasTreeHeight
+from main.utils import apply_percent, reprice_heights
+
+
+class Command(BaseCommand):
+    help = (
+        "Массовая смена цен размеров елок с пересчетом открытых корзин (оформленные заказы не меняются). "
+        "Либо --percent для выбранных (--height) или всех размеров, либо точные цены --set ID=ЦЕНА"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--percent", help="Изменение цены в процентах, например 10 или -5.5")
+        parser.add_argument("--height", type=int, action="append", dest="height_ids",
+                            help="id размера для --percent (можно несколько, по умолчанию все)")
+        parser.add_argument("--set", action="append", dest="prices", default=[], metavar="ID=ЦЕНА",
+                            help="Точная цена размера (можно несколько)")
+
+    def handle(self, *args, **options):
+        if bool(options["percent"]) == bool(options["prices"]):
+            raise CommandError("Укажите либо --percent, либо --set")
+        try:
+            if options["percent"]:
+                heights = ChristmasTreeHeight.objects.all()
+                if options["height_ids"]:
+                    heights = heights.filter(pk__in=options["height_ids"])
+                prices = {
+                    pk: apply_percent(price, Decimal(options["percent"]))
+                    for pk, price in heights.values_list("pk", "tree_price")
+                }
+            else:
+                prices = {}
+                for item in options["prices"]:
+                    pk, _, price = item.partition("=")
+                    prices[int(pk)] = Decimal(price).quantize(Decimal("0.01"))
+        except (ValueError, InvalidOperation):
+            raise CommandError("Некорректное значение цены или процента")
+
+        unknown = set(prices) - set(ChristmasTreeHeight.objects.filter(pk__in=prices).values_list("pk", flat=True))
+        if unknown:
+            raise CommandError(f"Нет размеров с id: {', '.join(map(str, sorted(unknown)))}")
+
+        started = time.perf_counter()
+        lines, carts = reprice_heights(prices)
+        self.stdout.write(self.style.SUCCESS(
+            f"Размеров: {len(prices)}, строк корзин: {lines}, корзин: {carts} "
+            f"за {time.perf_counter() - started:.2f} с"
+        ))
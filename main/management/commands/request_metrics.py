@@ -0,0 +1,56 @@
+import glob
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Сводка гистограмм RequestMetricsMiddleware по всем процессам (файлы из REQUEST_METRICS_DUMP_DIR)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dir", default=getattr(settings, "REQUEST_METRICS_DUMP_DIR", None),
+                            help="Каталог с файлами request_metrics.<pid>.json")
+        parser.add_argument("--json", action="store_true", help="Вывести сводку в JSON")
+
+    def handle(self, *args, **options):
+        if not options["dir"]:
+            raise CommandError("Не задан REQUEST_METRICS_DUMP_DIR (или --dir)")
+        buckets_ms, views = [], {}
+        for path in sorted(glob.glob(os.path.join(options["dir"], "request_metrics.*.json"))):
+            with open(path, encoding="utf-8") as dump_file:
+                dump = json.load(dump_file)
+            buckets_ms = dump["buckets_ms"]
+            for view_name, stats in dump["views"].items():
+                merged = views.setdefault(view_name, {
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0, "buckets": [0] * len(stats["buckets"]),
+                    "sampled": 0, "sql_count": 0, "sql_ms": 0.0,
+                })
+                for key in ("count", "total_ms", "sampled", "sql_count", "sql_ms"):
+                    merged[key] += stats[key]
+                merged["max_ms"] = max(merged["max_ms"], stats["max_ms"])
+                merged["buckets"] = [a + b for a, b in zip(merged["buckets"], stats["buckets"])]
+
+        if options["json"]:
+            self.stdout.write(json.dumps({"buckets_ms": buckets_ms, "views": views}, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(f"{'view':40} {'count':>8} {'avg ms':>8} {'p95 ms':>8} {'max ms':>8} {'avg sql':>8}")
+        for view_name, stats in sorted(views.items(), key=lambda item: -item[1]["total_ms"]):
+            avg_sql = stats["sql_count"] / stats["sampled"] if stats["sampled"] else float("nan")
+            self.stdout.write(
+                f"{view_name:40} {stats['count']:>8} {stats['total_ms'] / stats['count']:>8.1f} "
+                f"{self._percentile(stats['buckets'], buckets_ms, 0.95):>8} {stats['max_ms']:>8.1f} {avg_sql:>8.1f}"
+            )
+
+    @staticmethod
+    def _percentile(buckets, bounds, fraction):
+        # Верхняя граница корзины гистограммы, в которую попадает перцентиль
+        target = sum(buckets) * fraction
+        seen = 0
+        for bound, count in zip(list(bounds) + ["inf"], buckets):
+            seen += count
+            if seen >= target:
+                return bound
+        return "inf"
@@ -0,0 +1,168 @@
+import argparse
+import logging
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+
+from main.models import ChristmasTree, Order, User
+from main.sqlite import is_lock_error
+
+STRESS_USER_PREFIX = "stress-"
+CHECKOUT_DATA = {
+    "first_name": "Нагрузка", "last_name": "Тест", "phone": "89270000000", "address": "Самара",
+    "buying_type": Order.BUYING_TYPE_SELF, "comment": "",
+}
+
+
+class RetryCounter(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+        self._lock_count = threading.Lock()
+
+    def emit(self, record):
+        with self._lock_count:
+            self.count += 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест записи в корзину на SQLite: --threads потоков, у каждого свой покупатель, "
+        "выполняют --operations циклов добавить в корзину / изменить количество (каждый --checkout-every "
+        "цикл - оформление заказа) через view AddToCartView, ChangeQTYView и CheckoutView. "
+        "Считает пропускную способность, повторы и ошибки блокировки с профилем SQLite (main.sqlite) и без него. "
+        "Каждый прогон идет на временной копии текущей БД в отдельном процессе: путь к копии и профиль "
+        "передаются через окружение (DATABASE_NAME, SQLITE_PROFILE), как их читает settings. Сама БД не меняется."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--operations", type=int, default=30, help="Циклов на поток")
+        parser.add_argument("--checkout-every", type=int, default=10)
+        parser.add_argument("--mode", choices=("both", "profile", "default"), default="both")
+        # Внутренний: прогон в дочернем процессе, default уже указывает на копию БД
+        parser.add_argument("--on-copy", action="store_true", help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options["threads"] < 1 or options["operations"] < 1 or options["checkout_every"] < 1:
+            raise CommandError("--threads, --operations и --checkout-every должны быть положительными")
+        source = connections[DEFAULT_DB_ALIAS]
+        if source.vendor != "sqlite":
+            raise CommandError("Команда проверяет только SQLite")
+        if not ChristmasTree.objects.filter(cheapest_height__isnull=False).exists():
+            raise CommandError("В БД нет елок с размерами: загрузите каталог (import_catalog)")
+        self.options = options
+        if options["on_copy"]:
+            self.stdout.write(self._run())
+            return
+
+        modes = ("default", "profile") if options["mode"] == "both" else (options["mode"],)
+        with tempfile.TemporaryDirectory() as directory:
+            for mode in modes:
+                path = os.path.join(directory, f"{mode}.sqlite3")
+                self._copy_database(source, path, wal=mode == "profile")
+                self.stdout.write(self._run_on_copy(mode, path))
+
+    @staticmethod
+    def _copy_database(source, path, wal):
+        source.ensure_connection()
+        target = sqlite3.connect(path)
+        try:
+            source.connection.backup(target)
+            # Режим журнала хранится в файле: копия без профиля должна быть в режиме по умолчанию
+            target.execute(f"PRAGMA journal_mode = {'WAL' if wal else 'DELETE'}")
+        finally:
+            target.close()
+
+    def _run_on_copy(self, mode, path):
+        env = {name: value for name, value in os.environ.items() if name != "DATABASE_REPLICA_NAME"}
+        env.update(DATABASE_NAME=path, SQLITE_PROFILE="1" if mode == "profile" else "0")
+        command = [
+            sys.executable, "-m", "django", "stress_cart_writes", "--on-copy",
+            "--threads", str(self.options["threads"]),
+            "--operations", str(self.options["operations"]),
+            "--checkout-every", str(self.options["checkout_every"]),
+        ]
+        result = subprocess.run(command, env=env, cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(f"Прогон {mode} упал:\n{result.stderr.strip()}")
+        return result.stdout.strip()
+
+    def _run(self):
+        self.products = list(
+            ChristmasTree.objects.filter(cheapest_height__isnull=False).values_list("slug", "cheapest_height")[:500]
+        )
+        retries = RetryCounter()
+        logging.getLogger("main.sqlite").addHandler(retries)
+        # Трассировки упавших запросов не печатаем: ошибки считаются в итогах
+        request_logger = logging.getLogger("django.request")
+        request_logger_disabled, request_logger.disabled = request_logger.disabled, True
+        try:
+            users = self._create_users()
+            results = []
+            started = time.perf_counter()
+            threads = [threading.Thread(target=self._worker, args=(user, results)) for user in users]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            connections.close_all()
+            logging.getLogger("main.sqlite").removeHandler(retries)
+            request_logger.disabled = request_logger_disabled
+
+        writes = sum(result["ok"] for result in results)
+        locked = sum(result["locked"] for result in results)
+        errors = sum(result["errors"] for result in results)
+        title = "с профилем SQLite" if settings.SQLITE_PROFILE else "без профиля"
+        return (
+            f"{title}: {writes} успешных записей за {elapsed:.2f} с, {writes / elapsed:.0f} записей/с, "
+            f"ошибок блокировки {locked}, других ошибок {errors}, повторов {retries.count}"
+        )
+
+    def _create_users(self):
+        User.objects.filter(username__startswith=STRESS_USER_PREFIX).delete()
+        users = [User(username=f"{STRESS_USER_PREFIX}{i}") for i in range(self.options["threads"])]
+        for user in users:
+            user.set_unusable_password()
+        User.objects.bulk_create(users)
+        users = list(User.objects.filter(username__startswith=STRESS_USER_PREFIX))
+        connections.close_all()
+        return users
+
+    def _worker(self, user, results):
+        result = {"ok": 0, "locked": 0, "errors": 0}
+        products = random.Random(user.pk).sample(self.products, min(len(self.products), self.options["operations"]))
+        try:
+            client = Client()
+            client.force_login(user)
+            for operation in range(self.options["operations"]):
+                slug, height_id = products[operation % len(products)]
+                steps = [
+                    ("get", f"/add-to-cart/christmastree/{slug}/", {"tree_height_id": height_id}),
+                    ("post", f"/change-qty/christmastree/{slug}/", {"qty": random.randint(1, 5)}),
+                ]
+                if (operation + 1) % self.options["checkout_every"] == 0:
+                    steps.append(("post", "/checkout/", {**CHECKOUT_DATA, "idempotency_key": uuid.uuid4()}))
+                for method, url, data in steps:
+                    try:
+                        response = getattr(client, method)(url, data)
+                    except Exception as error:
+                        result["locked" if is_lock_error(error) else "errors"] += 1
+                        continue
+                    result["ok" if response.status_code < 400 else "errors"] += 1
+        finally:
+            connections.close_all()
+            results.append(result)
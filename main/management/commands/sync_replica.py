@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Копирует БД default в реплику (settings.READ_REPLICA_ALIAS) для локальной проверки чтения с реплики: "
+        "обе базы - файлы SQLite, копия делается через backup API целиком, вместе со схемой. "
+        "Настоящая реплика обновляется репликацией СУБД, эта команда ей не нужна."
+    )
+
+    def handle(self, *args, **options):
+        alias = settings.READ_REPLICA_ALIAS
+        if alias not in connections:
+            raise CommandError("Реплика не настроена: задайте DATABASE_REPLICA_NAME")
+        source, target = connections[DEFAULT_DB_ALIAS], connections[alias]
+        if source.vendor != "sqlite" or target.vendor != "sqlite":
+            raise CommandError("Команда копирует только SQLite")
+
+        started = time.perf_counter()
+        source.ensure_connection()
+        target.ensure_connection()
+        source.connection.backup(target.connection)
+        self.stdout.write(self.style.SUCCESS(
+            f"{source.settings_dict['NAME']} -> {target.settings_dict['NAME']} "
+            f"за {time.perf_counter() - started:.2f} с"
+        ))
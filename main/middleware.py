@@ -0,0 +1,263 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import reverse
+
+from . import routers
+from .cache import CATALOG_NAMESPACE, bumped_within
+
+logger = logging.getLogger("main.request_metrics")
+
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class RequestHistogram:
+    """Гистограмма времени ответа по view в памяти процесса. Периодически сбрасывается в файл (см. flush)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+        self._requests_since_flush = 0
+
+    def add(self, view_name, total_ms, sql_count=None, sql_ms=None):
+        with self._lock:
+            stats = self._views.get(view_name)
+            if stats is None:
+                stats = self._views[view_name] = {
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0, "buckets": [0] * (len(HISTOGRAM_BUCKETS_MS) + 1),
+                    "sampled": 0, "sql_count": 0, "sql_ms": 0.0,
+                }
+            stats["count"] += 1
+            stats["total_ms"] += total_ms
+            stats["max_ms"] = max(stats["max_ms"], total_ms)
+            stats["buckets"][bisect_left(HISTOGRAM_BUCKETS_MS, total_ms)] += 1
+            if sql_count is not None:
+                stats["sampled"] += 1
+                stats["sql_count"] += sql_count
+                stats["sql_ms"] += sql_ms
+            self._requests_since_flush += 1
+            return self._requests_since_flush
+
+    def snapshot(self):
+        with self._lock:
+            self._requests_since_flush = 0
+            return {
+                "pid": os.getpid(),
+                "buckets_ms": list(HISTOGRAM_BUCKETS_MS),
+                "views": json.loads(json.dumps(self._views)),
+            }
+
+    def flush(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"request_metrics.{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as dump_file:
+            json.dump(self.snapshot(), dump_file)
+        os.replace(tmp_path, path)
+
+
+histogram = RequestHistogram()
+
+
+class QueryCollector:
+    """execute_wrapper: считает SQL-запросы, их время и повторы одинаковых запросов (по тексту с плейсхолдерами)."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[sql] = self.fingerprints.get(sql, 0) + 1
+
+    def duplicates(self, limit=5):
+        repeated = sorted(
+            ((count, sql) for sql, count in self.fingerprints.items() if count > 1), reverse=True
+        )[:limit]
+        return [
+            {"fingerprint": hashlib.md5(sql.encode()).hexdigest()[:12], "count": count, "sql": sql[:200]}
+            for count, sql in repeated
+        ]
+
+
+# Сборщик SQL текущего запроса, если запрос попал в выборку метрик. execute_wrapper привязан к соединению,
+# то есть к потоку, поэтому view, выполняемые в другом потоке (пул ORM, main.async_views), подключают
+# сборщик у себя через collect_queries
+_query_collector = ContextVar("request_metrics_query_collector", default=None)
+
+
+@contextmanager
+def collect_queries():
+    """Подключает сборщик SQL текущего запроса (если он есть) к соединениям текущего потока."""
+    collector = _query_collector.get()
+    with ExitStack() as stack:
+        if collector is not None:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(collector))
+        yield
+
+
+class RequestMetricsMiddleware:
+    """
+    Метрики запроса: имя view, общее время, число и время SQL-запросов, повторяющиеся запросы.
+    Включается настройкой REQUEST_METRICS_ENABLED, иначе Django убирает middleware из цепочки.
+    SQL инструментируется только у доли запросов REQUEST_METRICS_SAMPLE_RATE: для них отдается заголовок
+    Server-Timing и пишется JSON-строка в лог main.request_metrics. Остальные запросы стоят два вызова
+    perf_counter и запись в гистограмму, которую команда request_metrics читает из REQUEST_METRICS_DUMP_DIR.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "REQUEST_METRICS_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "REQUEST_METRICS_SAMPLE_RATE", 0.0)
+        self.dump_dir = getattr(settings, "REQUEST_METRICS_DUMP_DIR", None)
+        self.flush_every = getattr(settings, "REQUEST_METRICS_FLUSH_EVERY", 100)
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Так Django распознает async middleware
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        sampled = self._is_sampled()
+        started = time.perf_counter()
+        if not sampled:
+            response = self.get_response(request)
+            self._record(request, (time.perf_counter() - started) * 1000)
+            return response
+
+        collector = QueryCollector()
+        token = _query_collector.set(collector)
+        try:
+            with collect_queries():
+                response = self.get_response(request)
+        finally:
+            _query_collector.reset(token)
+        return self._finish(request, response, started, collector)
+
+    async def __acall__(self, request):
+        sampled = self._is_sampled()
+        started = time.perf_counter()
+        if not sampled:
+            response = await self.get_response(request)
+            self._record(request, (time.perf_counter() - started) * 1000)
+            return response
+
+        # SQL выполняется в потоках пула ORM: там сборщик подключает main.async_views._call_view
+        collector = QueryCollector()
+        token = _query_collector.set(collector)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _query_collector.reset(token)
+        return self._finish(request, response, started, collector)
+
+    def _is_sampled(self):
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _finish(self, request, response, started, collector):
+        total_ms = (time.perf_counter() - started) * 1000
+        sql_ms = collector.duration * 1000
+        view_name = self._record(request, total_ms, collector.count, sql_ms)
+
+        response["Server-Timing"] = (
+            f'total;dur={total_ms:.1f}, sql;dur={sql_ms:.1f};desc="{collector.count} queries"'
+        )
+        logger.info(json.dumps({
+            "view": view_name,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": round(total_ms, 2),
+            "sql_count": collector.count,
+            "sql_ms": round(sql_ms, 2),
+            "duplicates": collector.duplicates(),
+        }, ensure_ascii=False))
+        return response
+
+    def _record(self, request, total_ms, sql_count=None, sql_ms=None):
+        resolver_match = getattr(request, "resolver_match", None)
+        view_name = resolver_match.view_name if resolver_match else "<unresolved>"
+        requests_since_flush = histogram.add(view_name, total_ms, sql_count, sql_ms)
+        if self.dump_dir and requests_since_flush >= self.flush_every:
+            try:
+                histogram.flush(self.dump_dir)
+            except OSError:
+                logger.exception("Не удалось сохранить гистограмму запросов")
+        return view_name
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Включает чтение каталога с реплики на время запроса и закрепляет посетителя за default после записи
+    (см. main.routers). Без реплики в settings.DATABASES Django убирает middleware из цепочки.
+    Поддерживает и sync, и async цепочку: под ASGI не переводит обработку запросов в один поток.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if getattr(settings, "READ_REPLICA_ALIAS", "replica") not in settings.DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.pin_cookie = getattr(settings, "REPLICA_PIN_COOKIE", "db_primary")
+        self.pin_seconds = getattr(settings, "REPLICA_PIN_SECONDS", 15)
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Так Django распознает async middleware
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = routers.begin_request(self._is_pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            state = routers.end_request(token)
+        return self._finish(state, response)
+
+    async def __acall__(self, request):
+        token = routers.begin_request(self._is_pinned(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            state = routers.end_request(token)
+        return self._finish(state, response)
+
+    def _is_pinned(self, request):
+        return (
+            self.pin_cookie in request.COOKIES
+            or request.method not in ("GET", "HEAD", "OPTIONS")
+            or request.path.startswith(reverse("admin:index"))
+            or bumped_within(CATALOG_NAMESPACE, self.pin_seconds)
+        )
+
+    def _finish(self, state, response):
+        if state.wrote:
+            response.set_cookie(self.pin_cookie, "1", max_age=self.pin_seconds, httponly=True, samesite="Lax")
+        return response
@@ -0,0 +1,169 @@
+# Generated by Django 3.2.25 on 2026-10-17 17:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChristmasTree',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255, verbose_name='Наименование')),
+                ('slug', models.SlugField(unique=True)),
+                ('description', models.TextField(blank=True, null=True, verbose_name='Описание')),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=9, null=True, verbose_name='Цена, руб')),
+                ('product_type', models.CharField(blank=True, max_length=255, null=True, verbose_name='Тип дерева')),
+                ('from_place', models.CharField(blank=True, max_length=512, null=True, verbose_name='Откуда привезена')),
+                ('image', models.ImageField(blank=True, null=True, upload_to='products/tree', verbose_name='Изображение')),
+            ],
+            options={
+                'verbose_name': 'Елка',
+                'verbose_name_plural': 'Елки',
+            },
+        ),
+        migrations.CreateModel(
+            name='ChristmasTreeChoices',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChristmasTreeHeight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tree_height', models.CharField(blank=True, max_length=255, null=True, verbose_name='Рост елки, м')),
+                ('tree_price', models.DecimalField(decimal_places=2, max_digits=9, verbose_name='Цена, руб')),
+            ],
+            options={
+                'verbose_name': 'Размеры Ёлок',
+                'verbose_name_plural': 'Размеры Ёлок',
+            },
+        ),
+        migrations.RemoveField(
+            model_name='smartphone',
+            name='category',
+        ),
+        migrations.AlterModelOptions(
+            name='cart',
+            options={'verbose_name': 'Корзина  пользователя', 'verbose_name_plural': 'Корзины пользователя'},
+        ),
+        migrations.AlterModelOptions(
+            name='cartproduct',
+            options={'verbose_name': 'Продукт в корзине', 'verbose_name_plural': 'Продукты в корзине'},
+        ),
+        migrations.AlterModelOptions(
+            name='category',
+            options={'verbose_name': 'Категория товара', 'verbose_name_plural': 'Категории товаров'},
+        ),
+        migrations.AlterModelOptions(
+            name='customer',
+            options={'verbose_name': 'Покупатель', 'verbose_name_plural': 'Покупатели'},
+        ),
+        migrations.AlterModelOptions(
+            name='order',
+            options={'verbose_name': 'Заказ', 'verbose_name_plural': 'Заказы'},
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='order_content_description',
+            field=models.TextField(blank=True, null=True, verbose_name='Описания составляющих заказа'),
+        ),
+        migrations.AlterField(
+            model_name='cart',
+            name='final_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=9, verbose_name='Общая цена, руб'),
+        ),
+        migrations.AlterField(
+            model_name='cart',
+            name='for_anonymous_user',
+            field=models.BooleanField(default=False, verbose_name='Зарегистрован ли пользователь?'),
+        ),
+        migrations.AlterField(
+            model_name='cart',
+            name='in_order',
+            field=models.BooleanField(default=False, verbose_name='Оформлен ли заказ?'),
+        ),
+        migrations.AlterField(
+            model_name='cart',
+            name='products',
+            field=models.ManyToManyField(blank=True, related_name='related_cart', to='main.CartProduct', verbose_name='Товары в корзине'),
+        ),
+        migrations.AlterField(
+            model_name='cart',
+            name='total_products',
+            field=models.PositiveIntegerField(default=0, verbose_name='Всего товара, шт'),
+        ),
+        migrations.AlterField(
+            model_name='cartproduct',
+            name='cart',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='related_products', to='main.cart', verbose_name='Корзина'),
+        ),
+        migrations.AlterField(
+            model_name='cartproduct',
+            name='final_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=9, null=True, verbose_name='Общая цена'),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='orders',
+            field=models.ManyToManyField(blank=True, null=True, related_name='related_order', to='main.Order', verbose_name='Заказы покупателя'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='cart',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.cart', verbose_name='Корзина'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='first_name',
+            field=models.CharField(blank=True, max_length=255, null=True, verbose_name='Имя'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='last_name',
+            field=models.CharField(blank=True, max_length=255, null=True, verbose_name='Фамилия'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='phone',
+            field=models.CharField(blank=True, default=None, max_length=20, null=True, verbose_name='Телефон'),
+        ),
+        migrations.DeleteModel(
+            name='Notebook',
+        ),
+        migrations.DeleteModel(
+            name='Smartphone',
+        ),
+        migrations.AddField(
+            model_name='christmastreechoices',
+            name='cart_product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tree_in_cart', to='main.cartproduct', verbose_name='Елка в корзине'),
+        ),
+        migrations.AddField(
+            model_name='christmastreechoices',
+            name='tree',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.christmastree', verbose_name='Елка'),
+        ),
+        migrations.AddField(
+            model_name='christmastreechoices',
+            name='tree_height',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.christmastreeheight', verbose_name='Рост Елки'),
+        ),
+        migrations.AddField(
+            model_name='christmastree',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.category', verbose_name='Категория'),
+        ),
+        migrations.AddField(
+            model_name='christmastree',
+            name='choose_height',
+            field=models.ManyToManyField(blank=True, max_length=255, null=True, to='main.ChristmasTreeHeight', verbose_name='Рост елки, м'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-17 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_sync_with_models'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['owner', 'in_order'], name='cart_owner_in_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cartproduct',
+            index=models.Index(fields=['cart', 'content_type', 'object_id', 'user'], name='cartproduct_lookup_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='christmastree',
+            index=models.Index(fields=['category', 'product_type'], name='tree_category_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'created_at'], name='order_customer_created_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.25 on 2026-10-17 17:18
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+from PIL import Image
+
+
+def fill_image_dimensions(apps, schema_editor):
+    ChristmasTree = apps.get_model('main', 'ChristmasTree')
+    for pk, name in ChristmasTree.objects.exclude(image='').exclude(image=None).values_list('pk', 'image'):
+        try:
+            with default_storage.open(name) as image_file:
+                width, height = Image.open(image_file).size
+        except (OSError, ValueError):
+            continue
+        ChristmasTree.objects.filter(pk=pk).update(image_width=width, image_height=height)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='christmastree',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота изображения'),
+        ),
+        migrations.AddField(
+            model_name='christmastree',
+            name='image_renditions_ready',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Превью изображения готовы'),
+        ),
+        migrations.AddField(
+            model_name='christmastree',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина изображения'),
+        ),
+        migrations.RunPython(fill_image_dimensions, migrations.RunPython.noop),
+    ]
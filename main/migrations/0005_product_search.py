@@ -0,0 +1,63 @@
+from django.db import migrations
+
+# регистр FTS5 приводит сам, "ё" заменяем так же, как main.search._normalize;
+# rowid = (id ContentType << 32) | id товара, см. main.search.SQLiteSearchBackend
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE main_product_search USING fts5("
+    "ct_model UNINDEXED, title, description, product_type, from_place, "
+    "tokenize = 'unicode61 remove_diacritics 2')",
+]
+
+SQLITE_FILL = (
+    "INSERT INTO main_product_search (rowid, ct_model, title, description, product_type, from_place) "
+    "SELECT (%s << 32) | id, 'christmastree', "
+    "replace(replace(title, 'ё', 'е'), 'Ё', 'Е'), "
+    "replace(replace(coalesce(description, ''), 'ё', 'е'), 'Ё', 'Е'), "
+    "replace(replace(coalesce(product_type, ''), 'ё', 'е'), 'Ё', 'Е'), "
+    "replace(replace(coalesce(from_place, ''), 'ё', 'е'), 'Ё', 'Е') "
+    "FROM main_christmastree"
+)
+
+POSTGRESQL_FORWARD = [
+    "CREATE TABLE main_product_search ("
+    "ct_model varchar(100) NOT NULL, object_id integer NOT NULL, document tsvector NOT NULL, "
+    "PRIMARY KEY (ct_model, object_id))",
+    "CREATE INDEX main_product_search_document_idx ON main_product_search USING gin (document)",
+    "INSERT INTO main_product_search "
+    "SELECT 'christmastree', id, "
+    "setweight(to_tsvector('russian', replace(lower(title), 'ё', 'е')), 'A') || "
+    "setweight(to_tsvector('russian', replace(lower(coalesce(description, '')), 'ё', 'е')), 'C') || "
+    "setweight(to_tsvector('russian', replace(lower(coalesce(product_type, '')), 'ё', 'е')), 'B') || "
+    "setweight(to_tsvector('russian', replace(lower(coalesce(from_place, '')), 'ё', 'е')), 'D') "
+    "FROM main_christmastree",
+]
+
+
+def create_search_table(apps, schema_editor):
+    statements = {
+        "sqlite": SQLITE_FORWARD,
+        "postgresql": POSTGRESQL_FORWARD,
+    }.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+    if schema_editor.connection.vendor == "sqlite":
+        ContentType = apps.get_model('contenttypes', 'ContentType')
+        content_type, _ = ContentType.objects.get_or_create(app_label='main', model='christmastree')
+        schema_editor.execute(SQLITE_FILL, [content_type.id])
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor in ("sqlite", "postgresql"):
+        schema_editor.execute("DROP TABLE IF EXISTS main_product_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('main', '0004_product_image_dimensions'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.25 on 2026-10-17 17:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_price_range(apps, schema_editor):
+    ChristmasTree = apps.get_model('main', 'ChristmasTree')
+    ChristmasTreeHeight = apps.get_model('main', 'ChristmasTreeHeight')
+    heights = ChristmasTreeHeight.objects.filter(christmastree=models.OuterRef('pk'))
+    cheapest = heights.order_by('tree_price', 'pk')
+    ChristmasTree.objects.update(
+        min_price=models.Subquery(cheapest.values('tree_price')[:1]),
+        max_price=models.Subquery(heights.order_by('-tree_price').values('tree_price')[:1]),
+        cheapest_height=models.Subquery(cheapest.values('pk')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_product_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='christmastree',
+            name='cheapest_height',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main.christmastreeheight', verbose_name='Самый дешевый размер'),
+        ),
+        migrations.AddField(
+            model_name='christmastree',
+            name='max_price',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, editable=False, max_digits=9, null=True, verbose_name='Цена до, руб'),
+        ),
+        migrations.AddField(
+            model_name='christmastree',
+            name='min_price',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, editable=False, max_digits=9, null=True, verbose_name='Цена от, руб'),
+        ),
+        migrations.AddIndex(
+            model_name='christmastree',
+            index=models.Index(fields=['category', 'min_price'], name='tree_category_min_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='christmastree',
+            index=models.Index(fields=['category', 'max_price'], name='tree_category_max_price_idx'),
+        ),
+        migrations.RunPython(fill_price_range, migrations.RunPython.noop),
+    ]
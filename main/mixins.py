@@ -1,32 +1,133 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.http import Http404
+from django.utils.functional import SimpleLazyObject, cached_property
 from django.views.generic.detail import SingleObjectMixin
 from django.views.generic import View
 
-from .models import Category, Cart, Customer, ChristmasTree
+from .cache import CATALOG_NAMESPACE, PAGE_CACHE_TIMEOUT, make_key
+from .cart import CART_SESSION_KEY, SessionCart
+from .models import Category, Cart, Customer, product_registry
+from .sqlite import retry_on_lock
 
 
-class CategoryDetailMixin(SingleObjectMixin):
-    CATEGORY_SLUG2PRODUCT_MODEL = {
-        'christmas_tree': ChristmasTree,
-    }
+def get_product_model_or_404(ct_model):
+    try:
+        return product_registry.get_model(ct_model)
+    except KeyError:
+        raise Http404(f"Неизвестный тип товара: {ct_model}")
+
 
+class CategoryDetailMixin(SingleObjectMixin):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["categories"] = Category.objects.get_categories_for_left_sidebar()
         return context
 
 
-class CartMixin(View):
+class AnonymousPageCacheMixin:
+    """
+    Кэш целой страницы для анонимных посетителей. Ключ - имя view и md5 от параметров ссылки и GET-параметров
+    из page_cache_params: остальные GET-параметры view не читает, в ключ они не попадают и новых записей
+    не создают, а хэш держит ключ коротким и из допустимых для memcached символов. Ключ включает версию каталога,
+    так что изменение товара, категории или размера елки (main.signals) сбрасывает все такие страницы.
+    Корзина в кэшированную страницу не попадает (lazy_cart = None): шаблон подгружает ее фрагментом
+    из CartWidgetView по адресу {% url 'cart_widget' %}.
+    """
+
+    page_cache_timeout = PAGE_CACHE_TIMEOUT
+    page_cache_params = ()
+    is_page_cached = False
+
     def dispatch(self, request, *args, **kwargs):
-        if request.user.is_authenticated:
-            customer = Customer.objects.filter(user=request.user).first()
-            if not customer:
-                customer = Customer.objects.create(user=request.user)
-            cart = Cart.objects.filter(owner=customer, in_order=False).first()
-            if not cart:
-                cart = Cart.objects.create(owner=customer)
+        if not self._can_cache_page(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        self.is_page_cached = True
+        cache_key = make_key(
+            CATALOG_NAMESPACE, "page", self.__class__.__name__, self._page_cache_digest(request, kwargs))
+        response = cache.get(cache_key)
+        if response is not None:
+            return response
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200:
+            if hasattr(response, "render") and callable(response.render):
+                response.add_post_render_callback(
+                    lambda rendered: cache.set(cache_key, rendered, self.page_cache_timeout))
+            else:
+                cache.set(cache_key, response, self.page_cache_timeout)
+        return response
+
+    def _page_cache_digest(self, request, kwargs):
+        # Порядок значений одного параметра сохраняем: view может читать последнее (QueryDict.get)
+        params = {
+            name: request.GET.getlist(name) for name in sorted(self.page_cache_params) if any(request.GET.getlist(name))
+        }
+        normalized = json.dumps([sorted(kwargs.items()), params], ensure_ascii=False, default=str)
+        return hashlib.md5(normalized.encode()).hexdigest()
+
+    @staticmethod
+    def _can_cache_page(request):
+        if request.method not in ("GET", "HEAD") or request.user.is_authenticated:
+            return False
+        # Страницу с непоказанными сообщениями (messages) кэшировать нельзя
+        return "messages" not in request.COOKIES and "_messages" not in request.session
+
+
+class LockRetryMixin:
+    """
+    Повтор всего запроса при блокировке SQLite (main.sqlite.retry_on_lock). Каждая попытка получает новый
+    экземпляр view, поэтому корзина, созданная в откатившейся транзакции, не переживает повтор.
+    Изменяющий метод view должен сам открывать транзакцию (main.sqlite.immediate_atomic).
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return retry_on_lock(super().as_view(**initkwargs))
+
+
+class CartMixin(View):
+    """
+    Корзина текущего пользователя разрешается лениво: запрос в БД выполняется при первом обращении к self.cart,
+    id найденной корзины запоминается в сессии. Покупатель и корзина создаются только при первой записи
+    (get_or_create_cart), поэтому просмотр каталога не трогает таблицы корзин.
+    Анонимный пользователь получает SessionCart, которая живет в сессии до входа на сайт.
+    """
+
+    @cached_property
+    def cart(self):
+        return self.get_cart()
+
+    @property
+    def lazy_cart(self):
+        # Для контекста шаблонов: корзина загрузится, только если шаблон к ней обратится
+        if getattr(self, "is_page_cached", False):
+            return None
+        return SimpleLazyObject(lambda: self.cart)
+
+    def get_cart(self):
+        if not self.request.user.is_authenticated:
+            return SessionCart(self.request.session)
+        carts = Cart.objects.select_related("owner").filter(owner__user=self.request.user, in_order=False)
+        cart_id = self.request.session.get(CART_SESSION_KEY)
+        cart = carts.filter(pk=cart_id).first() if cart_id else None
+        if cart is None:
+            cart = carts.first()
+            self._remember_cart(cart)
+        return cart
+
+    def get_or_create_cart(self):
+        if self.cart is None:
+            customer, _ = Customer.objects.get_or_create(user=self.request.user)
+            self.cart = Cart.objects.create(owner=customer)
+            self._remember_cart(self.cart)
+        return self.cart
+
+    def _remember_cart(self, cart):
+        if cart is None:
+            self.request.session.pop(CART_SESSION_KEY, None)
         else:
-            cart = Cart.objects.filter(for_anonymous_user=True).first()
-            if not cart:
-                cart = Cart.objects.create(for_anonymous_user=True)
-        self.cart = cart
-        return super().dispatch(request, *args, **kwargs)
+            self.request.session[CART_SESSION_KEY] = cart.pk
@@ -1,4 +1,7 @@
-from django.db import models
+import logging
+
+from django.core.cache import cache
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
@@ -7,6 +10,11 @@ from django.urls import reverse
 from django.utils import timezone
 from django.utils.safestring import mark_safe
 
+from .cache import CATALOG_NAMESPACE, HOMEPAGE_FEED_TIMEOUT, SIDEBAR_CACHE_TIMEOUT, make_key
+from .images import get_image_url, read_image_size, schedule_renditions
+
+logger = logging.getLogger(__name__)
+
 User = get_user_model()
 
 
@@ -19,70 +27,148 @@ def get_product_url(obj, viewname):
     return reverse(viewname, kwargs={"ct_model": ct_model, "slug": obj.slug})
 
 
+class ProductRegistry:
+    """
+    Реестр моделей товаров: ct_model -> класс модели и ContentType.
+    ContentType берутся из кэша ContentTypeManager, т.е. в БД за ними ходим один раз на процесс.
+    """
+
+    def __init__(self):
+        self._models = {}
+
+    def register(self, model):
+        self._models[model._meta.model_name] = model
+        return model
+
+    def __contains__(self, ct_model):
+        return ct_model in self._models
+
+    def items(self):
+        return self._models.items()
+
+    def get_model(self, ct_model):
+        return self._models[ct_model]
+
+    def get_content_type(self, ct_model):
+        return ContentType.objects.get_for_model(self.get_model(ct_model))
+
+    def get_content_type_id(self, ct_model):
+        return self.get_content_type(ct_model).id
+
+
+product_registry = ProductRegistry()
+
+
 class LatestProductsManager:
-    @staticmethod
-    def get_products_for_main_page(*args, **kwargs):
+    """
+    Лента товаров для главной страницы. Отдает сериализованные словари (а не модели) и кэширует их на
+    HOMEPAGE_FEED_TIMEOUT; при изменении каталога кэш сбрасывается сменой версии (см. main.signals).
+    """
+
+    FIELDS = ("id", "title", "slug", "image", "image_renditions_ready", "price")
+
+    def get_products_for_main_page(self, *args, **kwargs):
         with_respect_to = kwargs.get("with_respect_to")
-        products = []
-        ct_models = ContentType.objects.filter(model__in=args)
+        cache_key = make_key(CATALOG_NAMESPACE, "main_page", *args, with_respect_to)
+        products = cache.get(cache_key)
+        if products is None:
+            products = self._build_products(args, with_respect_to)
+            cache.set(cache_key, products, HOMEPAGE_FEED_TIMEOUT)
+        return products
+
+    def _build_products(self, ct_models, with_respect_to=None):
+        ct_models = [ct_model for ct_model in ct_models if ct_model in product_registry]
+        if not ct_models:
+            return []
+        # Последние 5 товаров каждой модели одним UNION-запросом
+        querysets = []
         for ct_model in ct_models:
-            model_products = (
-                ct_model.model_class()._base_manager.all().order_by("-id")[:5]
+            manager = product_registry.get_model(ct_model)._base_manager
+            querysets.append(
+                manager.filter(pk__in=manager.order_by("-id").values("pk")[:5])
+                .annotate(ct_model=models.Value(ct_model, output_field=models.CharField()))
+                .values(*self.FIELDS, "ct_model")
             )
-            products.extend(model_products)
-        if with_respect_to:
-            ct_model = ContentType.objects.filter(model=with_respect_to)
-            if ct_model.exists():
-                if with_respect_to in args:
-                    return sorted(
-                        products,
-                        key=lambda x: x.__class__._meta.model_name.startswith(
-                            with_respect_to
-                        ),
-                        reverse=True,
-                    )
+        rows = querysets[0].union(*querysets[1:], all=True) if len(querysets) > 1 else querysets[0]
+
+        products = []
+        for row in rows:
+            products.append({
+                "id": row["id"],
+                "ct_model": row["ct_model"],
+                "title": row["title"],
+                "slug": row["slug"],
+                "url": reverse("product_detail", kwargs={"ct_model": row["ct_model"], "slug": row["slug"]}),
+                "image_url": get_image_url(row["image"], row["image_renditions_ready"]),
+                "image_webp_url": get_image_url(row["image"], row["image_renditions_ready"], webp=True),
+                "price": str(row["price"]) if row["price"] is not None else None,
+                "heights": [],
+            })
+        self._attach_heights(products)
+
+        ct_order = {ct_model: index for index, ct_model in enumerate(ct_models)}
+        products.sort(key=lambda x: (ct_order[x["ct_model"]], -x["id"]))
+        if with_respect_to and with_respect_to in ct_models:
+            products.sort(key=lambda x: x["ct_model"].startswith(with_respect_to), reverse=True)
         return products
 
+    @staticmethod
+    def _attach_heights(products):
+        by_key = {(product["ct_model"], product["id"]): product for product in products}
+        for ct_model in {product["ct_model"] for product in products}:
+            model = product_registry.get_model(ct_model)
+            if not hasattr(model, "choose_height"):
+                continue
+            ids = [product["id"] for product in products if product["ct_model"] == ct_model]
+            heights = model.choose_height.field.related_model.objects.filter(
+                **{f"{ct_model}__in": ids}
+            ).values("tree_height", "tree_price", product_id=models.F(ct_model)).order_by("tree_price")
+            for height in heights:
+                by_key[(ct_model, height["product_id"])]["heights"].append({
+                    "tree_height": height["tree_height"],
+                    "tree_price": str(height["tree_price"]),
+                })
+
 
 class LatestProducts:
     objects = LatestProductsManager()
 
 
 class CategoryManager(models.Manager):
-    CATEGORY_NAME_COUNT_NAME = {
-        'Елки': 'christmastree__count',
-    }
-    PRODUCT_NAMES = {
-        'Елки': 'christmastree',
-
-    }
-
     def get_queryset(self):
         return super().get_queryset()
 
     def get_categories_for_left_sidebar(self):
+        cache_key = make_key(CATALOG_NAMESPACE, "sidebar")
+        data = cache.get(cache_key)
+        if data is None:
+            data = self._build_left_sidebar()
+            cache.set(cache_key, data, SIDEBAR_CACHE_TIMEOUT)
+        return data
 
+    def _build_left_sidebar(self):
         data = []
-        for product_key, product_value in self.PRODUCT_NAMES.items():
-            category_dict = {"category_name": product_key, "category_slug": product_value, "subcategories": []}
-
-            content_type = ContentType.objects.get(model=product_value)
-            subcategories = content_type.model_class().objects.values("category").annotate(dcount=Count('category'))
-
-            for subcategory in subcategories:
-                subcategory_object = Category.objects.get(pk=subcategory["category"])
-                subcategory_dict = {"subcategory_name": subcategory_object.name,
-                                    "subcategory_slug": subcategory_object.slug,
-                                    "subcategory_url": category_dict["category_slug"] + "/" + subcategory_object.slug,
-                                    "types": []}
-
-                types = content_type.model_class().objects.values("product_type").filter(
-                    category_id=subcategory["category"]).annotate(
-                    dcount=Count('product_type'))
-                for type_product in types:
-                    subcategory_dict["types"].append(
-                        {"product_type_name": type_product["product_type"], })
-                category_dict["subcategories"].append(subcategory_dict)
+        for ct_model, model in product_registry.items():
+            category_dict = {"category_name": str(model._meta.verbose_name_plural), "category_slug": ct_model,
+                             "subcategories": []}
+
+            # Одна сгруппированная выборка: подкатегория + тип товара
+            rows = model.objects.values(
+                "category_id", "category__name", "category__slug", "product_type"
+            ).annotate(dcount=Count("id")).order_by("category_id", "product_type")
+
+            subcategories = {}
+            for row in rows:
+                subcategory_dict = subcategories.get(row["category_id"])
+                if subcategory_dict is None:
+                    subcategory_dict = {"subcategory_name": row["category__name"],
+                                        "subcategory_slug": row["category__slug"],
+                                        "subcategory_url": category_dict["category_slug"] + "/" + row["category__slug"],
+                                        "types": []}
+                    subcategories[row["category_id"]] = subcategory_dict
+                    category_dict["subcategories"].append(subcategory_dict)
+                subcategory_dict["types"].append(
+                    {"product_type_name": row["product_type"], })
             data.append(category_dict)
 
         return data
@@ -116,18 +202,53 @@ class Product(models.Model):
     # Надо заменить дефолт=нулл на плейсхолдер для товаров без изображения
 
     image = models.ImageField(verbose_name='Изображение', upload_to="products", null=True, blank=True, default=None)
+    # Размеры сохраняются при загрузке (save, main.images), чтобы не открывать файл ради width/height.
+    # width_field/height_field не используются: с ними Django открывает файл при создании каждого экземпляра
+    # с пустыми размерами, и товар с потерянным файлом ронял бы любую страницу каталога
+    image_width = models.PositiveIntegerField(verbose_name='Ширина изображения', null=True, blank=True,
+                                              editable=False)
+    image_height = models.PositiveIntegerField(verbose_name='Высота изображения', null=True, blank=True,
+                                               editable=False)
+    image_renditions_ready = models.BooleanField(verbose_name='Превью изображения готовы', default=False,
+                                                 editable=False)
     description = models.TextField(verbose_name='Описание', null=True, blank=True)
     price = models.DecimalField(max_digits=9, decimal_places=2, verbose_name='Цена, руб')
     product_type = models.CharField(max_length=255, verbose_name='Тип продукта', null=True, blank=True)
 
-    def image_tag(self):
-        resize_img = 1
-        if self.image.height > self.image.width:
-            resize_img = self.image.height / 400
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if "image" in instance.__dict__:
+            instance._loaded_image_name = instance.__dict__["image"] or None
         else:
-            resize_img = self.image.width / 400
+            # Изображение не загружено (only/defer): исходное имя неизвестно, и save() его не сравнивает
+            instance._loaded_image_name = models.DEFERRED
+        return instance
+
+    def get_image_url(self, rendition="medium", webp=False):
+        """URL превью (см. main.images.RENDITIONS): thumb или medium, JPEG/PNG или WebP."""
+        return get_image_url(self.image.name, self.image_renditions_ready, rendition, webp, self.image.storage)
+
+    def save(self, *args, **kwargs):
+        # Новое изображение: превью строятся заново в фоне после коммита
+        loaded_image_name = getattr(self, "_loaded_image_name", None)
+        image_changed = loaded_image_name is not models.DEFERRED and (self.image.name or None) != loaded_image_name
+        if image_changed:
+            self.image_renditions_ready = False
+            self.image_width, self.image_height = read_image_size(self.image) if self.image else (None, None)
+        super().save(*args, **kwargs)
+        if loaded_image_name is not models.DEFERRED:
+            self._loaded_image_name = self.image.name or None
+        if image_changed and self.image:
+            schedule_renditions(self)
+
+    def image_tag(self):
+        if not self.image or not self.image_width or not self.image_height:
+            return None
+        resize_img = max(self.image_width, self.image_height) / 400
         return mark_safe(
-            f'<img src={self.image.url} width="{self.image.width / resize_img}" height="{self.image.height / resize_img}" />'
+            f'<img src={self.get_image_url()} width="{self.image_width / resize_img}" '
+            f'height="{self.image_height / resize_img}" />'
         )
 
     image_tag.short_description = "Изображение товара"
@@ -151,15 +272,40 @@ class ChristmasTreeHeight(models.Model):
         verbose_name_plural = 'Размеры Ёлок'
 
 
+class ChristmasTreeQuerySet(models.QuerySet):
+    def refresh_price_range(self):
+        """
+        Пересчитывает min_price, max_price и cheapest_height по размерам (choose_height) одним UPDATE.
+        Вызывается из сигналов (main.signals) и после массовых операций, которые сигналы обходят.
+        """
+        heights = ChristmasTreeHeight.objects.filter(christmastree=models.OuterRef("pk"))
+        cheapest = heights.order_by("tree_price", "pk")
+        return self.update(
+            min_price=models.Subquery(cheapest.values("tree_price")[:1]),
+            max_price=models.Subquery(heights.order_by("-tree_price").values("tree_price")[:1]),
+            cheapest_height=models.Subquery(cheapest.values("pk")[:1]),
+        )
+
+
 class ChristmasTree(Product):
     choose_height = models.ManyToManyField(ChristmasTreeHeight, max_length=255, verbose_name='Рост елки, м', null=True,
                                            blank=True)
     price = models.DecimalField(max_digits=9, decimal_places=2, verbose_name='Цена, руб', null=True, blank=True)
+    # Диапазон цен по размерам елки - для сортировки и фильтра каталога без join и агрегата на каждый запрос.
+    # Поддерживается ChristmasTreeQuerySet.refresh_price_range, вручную не редактируется
+    min_price = models.DecimalField(max_digits=9, decimal_places=2, verbose_name='Цена от, руб', null=True,
+                                    blank=True, editable=False, db_index=True)
+    max_price = models.DecimalField(max_digits=9, decimal_places=2, verbose_name='Цена до, руб', null=True,
+                                    blank=True, editable=False, db_index=True)
+    cheapest_height = models.ForeignKey(ChristmasTreeHeight, verbose_name='Самый дешевый размер', null=True,
+                                        blank=True, editable=False, on_delete=models.SET_NULL, related_name='+')
     product_type = models.CharField(max_length=255, verbose_name='Тип дерева', null=True, blank=True)
     # weight = models.IntegerField(verbose_name='Вес, кг', null=True, blank=True)
     from_place = models.CharField(max_length=512, verbose_name='Откуда привезена', null=True, blank=True)
     image = models.ImageField(verbose_name='Изображение', upload_to="products/tree", null=True, blank=True)
 
+    objects = ChristmasTreeQuerySet.as_manager()
+
     def __str__(self):
         return "{} : {}".format(self.category.name, self.title)
 
@@ -172,6 +318,16 @@ class ChristmasTree(Product):
     class Meta:
         verbose_name = 'Елка'
         verbose_name_plural = 'Елки'
+        indexes = [
+            # Левое меню и фильтр категории по типу дерева
+            models.Index(fields=["category", "product_type"], name="tree_category_type_idx"),
+            # Сортировка подкатегории по цене
+            models.Index(fields=["category", "min_price"], name="tree_category_min_price_idx"),
+            models.Index(fields=["category", "max_price"], name="tree_category_max_price_idx"),
+        ]
+
+
+product_registry.register(ChristmasTree)
 
 
 """
@@ -198,6 +354,15 @@ class Smartphone(Product):
 """
 
 
+class CartProductQuerySet(models.QuerySet):
+    def with_details(self):
+        """Строки корзины вместе с товарами (prefetch по GenericForeignKey) и выбранными размерами елок."""
+        return self.select_related("content_type").prefetch_related(
+            "content_object__category",
+            models.Prefetch("tree_in_cart", queryset=ChristmasTreeChoices.objects.select_related("tree_height")),
+        )
+
+
 class CartProduct(models.Model):
     user = models.ForeignKey(
         "Customer", verbose_name="Покупатель", on_delete=models.CASCADE
@@ -218,23 +383,33 @@ class CartProduct(models.Model):
         max_digits=9, decimal_places=2, verbose_name="Общая цена", null=True, blank=True
     )
 
+    objects = CartProductQuerySet.as_manager()
+
     def get_tree_height_object(self):
         try:
             return ChristmasTreeChoices.objects.get(cart_product=self)
         except ChristmasTreeChoices.DoesNotExist:
             return None
 
+    def get_tree_unit_price(self):
+        return ChristmasTreeChoices.objects.filter(cart_product=self).values_list(
+            "tree_height__tree_price", flat=True).first()
+
     def __str__(self):
         return f"{self.content_object.category}: {self.content_object.title} (id: {self.object_id}, кол-во: {self.qty})"
 
     def save(self, *args, **kwargs):
-        if not self.content_type == ContentType.objects.get(model="christmastree"):
+        if self.content_type_id != product_registry.get_content_type_id("christmastree"):
             self.final_price = self.qty * self.content_object.price
         super().save(*args, **kwargs)
 
     class Meta:
         verbose_name = "Продукт в корзине"
         verbose_name_plural = "Продукты в корзине"
+        indexes = [
+            # Поиск строки корзины при добавлении, удалении и смене количества
+            models.Index(fields=["cart", "content_type", "object_id", "user"], name="cartproduct_lookup_idx"),
+        ]
 
 
 class ChristmasTreeChoices(models.Model):
@@ -244,8 +419,15 @@ class ChristmasTreeChoices(models.Model):
     tree_height = models.ForeignKey(ChristmasTreeHeight, verbose_name="Рост Елки", on_delete=models.CASCADE, )
 
     def save(self, *args, **kwargs):
-        self.cart_product.final_price = self.cart_product.qty * self.tree_height.tree_price
-        self.cart_product.save()
+        # Цена строки корзины обычно уже посчитана в Cart.add_product - пишем ее, только если она изменилась
+        final_price = self.cart_product.qty * self.tree_height.tree_price
+        if self.cart_product.final_price != final_price:
+            price_delta = final_price - (self.cart_product.final_price or 0)
+            self.cart_product.final_price = final_price
+            self.cart_product.save(update_fields=["final_price"])
+            if self.cart_product.cart_id:
+                Cart.objects.filter(pk=self.cart_product.cart_id).update(
+                    final_price=models.F("final_price") + price_delta)
         super().save(*args, **kwargs)
 
 
@@ -273,9 +455,70 @@ class Cart(models.Model):
     def __str__(self):
         return str(self.id)
 
+    def _get_cart_product(self, product):
+        return CartProduct.objects.get(
+            user=self.owner,
+            cart=self,
+            content_type_id=product_registry.get_content_type_id(product.get_model_name()),
+            object_id=product.id,
+        )
+
+    def apply_totals_delta(self, price_delta, count_delta=0):
+        """
+        Атомарно сдвигает итоги корзины на дельту (F-выражения), без пересчета по всем товарам.
+        Полная сверка итогов - main.utils.recalc_cart (действие в админке и команда recalc_carts).
+        """
+        Cart.objects.filter(pk=self.pk).update(
+            final_price=models.F("final_price") + price_delta,
+            total_products=models.F("total_products") + count_delta,
+        )
+        self.final_price += price_delta
+        self.total_products += count_delta
+
+    def add_product(self, product, tree_height_id=None, qty=1):
+        content_type_id = product_registry.get_content_type_id(product.get_model_name())
+        cart_product = CartProduct.objects.filter(
+            user=self.owner, cart=self, content_type_id=content_type_id, object_id=product.id
+        ).first()
+        if cart_product is not None:
+            return cart_product, False
+
+        cart_product = CartProduct(user=self.owner, cart=self, content_object=product, qty=qty)
+        tree_height = None
+        if tree_height_id is not None:
+            tree_height = ChristmasTreeHeight.objects.get(pk=tree_height_id)
+            cart_product.final_price = qty * tree_height.tree_price
+        cart_product.save()
+        if tree_height is not None:
+            ChristmasTreeChoices.objects.create(tree=product, cart_product=cart_product, tree_height=tree_height)
+        self.products.add(cart_product)
+        self.apply_totals_delta(cart_product.final_price or 0, 1)
+        return cart_product, True
+
+    def remove_product(self, product):
+        cart_product = self._get_cart_product(product)
+        # Удаление строки каскадно убирает и связь M2M, и выбранный размер елки
+        cart_product.delete()
+        self.apply_totals_delta(-(cart_product.final_price or 0), -1)
+
+    def change_qty(self, product, qty):
+        cart_product = self._get_cart_product(product)
+        old_price = cart_product.final_price or 0
+        cart_product.content_object = product
+        cart_product.qty = qty
+        tree_price = cart_product.get_tree_unit_price()
+        if tree_price is not None:
+            cart_product.final_price = qty * tree_price
+        cart_product.save(update_fields=["qty", "final_price"])
+        self.apply_totals_delta(cart_product.final_price - old_price)
+
     class Meta:
         verbose_name = "Корзина  пользователя"
         verbose_name_plural = "Корзины пользователя"
+        indexes = [
+            # Открытая корзина покупателя (CartMixin)
+            models.Index(fields=["owner", "in_order"], name="cart_owner_in_order_idx"),
+        ]
 
 
 class Customer(models.Model):
@@ -357,34 +600,66 @@ class Order(models.Model):
     order_content_description = models.TextField(
         verbose_name="Описания составляющих заказа", null=True, blank=True
     )
+    # Токен формы оформления заказа: повторная отправка той же формы не создает второй заказ
+    idempotency_key = models.UUIDField(
+        verbose_name="Ключ идемпотентности", null=True, blank=True, unique=True, editable=False
+    )
 
     def __str__(self):
         return (
             f"Заказ номер: {self.id}, дата: {self.created_at.date()},  {self.customer} "
         )
 
-    def save(self, *args, **kwargs):
-        # Составляем описание заказа
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_cart_id = instance.__dict__.get("cart_id")
+        return instance
+
+    def build_content_description(self):
+        # Все строки корзины, товары и размеры елок - фиксированным числом запросов
         description_string = (
             f"Заказ №{self.pk}\nОбщая сумма заказа: {self.cart.final_price} руб., "
             f"общее число товаров: {self.cart.total_products} шт.\n\n"
             f"Товары:\n"
         )
 
-        for product in self.cart.products.all():
+        for product in self.cart.products.with_details():
             description_string += (
                 f"Наименование: {product.content_object.title}. Количество: {product.qty} шт., ")
-            if product.content_type.model == "christmastree":
-                tree_height_obj = ChristmasTreeChoices.objects.get(cart_product_id=product.pk)
-                description_string += (f"размер елки: {tree_height_obj.tree_height.tree_height} м.,"
+            tree_choices = product.tree_in_cart.all()
+            if tree_choices:
+                description_string += (f"размер елки: {tree_choices[0].tree_height.tree_height} м.,"
                                        )
 
             description_string += (f"суммарная стоимость: {product.final_price} руб.\n"
                                    )
+        return description_string
 
-        self.order_content_description = description_string
-        super().save(*args, **kwargs)
+    def update_content_description(self):
+        try:
+            self.order_content_description = self.build_content_description()
+            Order.objects.filter(pk=self.pk).update(order_content_description=self.order_content_description)
+        except Exception:
+            logger.exception("Не удалось составить описание заказа %s", self.pk)
+
+    def save(self, *args, **kwargs):
+        # Описание заказа составляется один раз при создании (и заново, только если сменилась корзина),
+        # поэтому смена статуса в админке не перебирает товары корзины. Новому заказу описание
+        # составляется после коммита: оформление заказа не держит блокировки, пока перебирает товары
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            transaction.on_commit(self.update_content_description)
+        else:
+            if self.cart_id != getattr(self, "_loaded_cart_id", None):
+                self.order_content_description = self.build_content_description()
+            super().save(*args, **kwargs)
+        self._loaded_cart_id = self.cart_id
 
     class Meta:
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
+        indexes = [
+            # Список заказов покупателя
+            models.Index(fields=["customer", "created_at"], name="order_customer_created_idx"),
+        ]
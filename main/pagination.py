@@ -0,0 +1,141 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def get_catalog_page_size(request):
+    """Размер страницы каталога из GET-параметра page_size в пределах settings.CATALOG_MAX_PAGE_SIZE."""
+    try:
+        page_size = int(request.GET.get('page_size', settings.CATALOG_PAGE_SIZE))
+    except ValueError:
+        page_size = settings.CATALOG_PAGE_SIZE
+    return max(1, min(page_size, settings.CATALOG_MAX_PAGE_SIZE))
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, prev_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Пагинация по ключу (keyset/cursor): следующая страница выбирается условием "после последней строки",
+    а не OFFSET, поэтому стоимость запроса не растет с номером страницы, а курсоры не сбиваются,
+    когда товары добавляются или удаляются.
+    ordering - поле сортировки ("-id", "price", ...), при равенстве значений порядок добирается по id.
+    Поле сортировки не должно содержать NULL.
+    """
+
+    def __init__(self, queryset, ordering="-id", page_size=24):
+        self.queryset = queryset
+        self.descending = ordering.startswith("-")
+        self.field = ordering.lstrip("-")
+        self.page_size = page_size
+
+    def _order_by(self, reverse=False):
+        descending = self.descending != reverse
+        prefix = "-" if descending else ""
+        if self.field in ("id", "pk"):
+            return (f"{prefix}id",)
+        return (f"{prefix}{self.field}", f"{prefix}id")
+
+    def _after(self, value, pk, reverse=False):
+        lookup = "lt" if self.descending != reverse else "gt"
+        if self.field in ("id", "pk"):
+            return Q(**{f"id__{lookup}": pk})
+        return Q(**{f"{self.field}__{lookup}": value}) | Q(**{self.field: value, f"id__{lookup}": pk})
+
+    def _make_cursor(self, obj, direction):
+        value = getattr(obj, self.field)
+        payload = {"v": str(value) if value is not None else None, "id": obj.pk, "d": direction}
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+    def _parse_cursor(self, cursor):
+        """Значение, id и направление из курсора. Курсор приходит от клиента, поэтому проверяется целиком."""
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            pk, direction = int(payload["id"]), payload["d"]
+            if direction not in ("n", "p"):
+                raise ValueError(direction)
+            value = None if self.field in ("id", "pk") else self._to_python(payload["v"])
+            return value, pk, direction
+        except (binascii.Error, ValueError, KeyError, TypeError, ValidationError):
+            raise InvalidCursor(cursor)
+
+    def _to_python(self, value):
+        if value is None:
+            # Поле сортировки без NULL: такого курсора _make_cursor не выдает
+            raise ValueError(value)
+        try:
+            field = self.queryset.model._meta.get_field(self.field)
+        except FieldDoesNotExist:
+            return value
+        return field.to_python(value)
+
+    def get_page(self, cursor=None):
+        if not cursor:
+            rows = list(self.queryset.order_by(*self._order_by())[:self.page_size + 1])
+            has_more = len(rows) > self.page_size
+            rows = rows[:self.page_size]
+            return KeysetPage(rows, self._make_cursor(rows[-1], "n") if has_more else None, None)
+
+        value, pk, direction = self._parse_cursor(cursor)
+        reverse = direction == "p"
+        rows = list(
+            self.queryset.filter(self._after(value, pk, reverse)).order_by(*self._order_by(reverse))[
+                :self.page_size + 1]
+        )
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+        if not rows:
+            return KeysetPage(rows)
+        has_next = has_more if not reverse else True
+        has_prev = has_more if reverse else True
+        return KeysetPage(
+            rows,
+            self._make_cursor(rows[-1], "n") if has_next else None,
+            self._make_cursor(rows[0], "p") if has_prev else None,
+        )
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator для больших таблиц в админке. На PostgreSQL для списка без фильтров число строк берется
+    из статистики планировщика (pg_class.reltuples) вместо COUNT(*) по всей таблице.
+    В остальных случаях (фильтры, поиск, маленькая таблица, другая СУБД) считается точно.
+    """
+
+    ESTIMATE_THRESHOLD = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql" and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s", [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] >= self.ESTIMATE_THRESHOLD:
+                return int(row[0])
+        return super().count
@@ -0,0 +1,83 @@
+"""
+Чтение каталога с реплики БД (settings.READ_REPLICA_ALIAS, см. DATABASE_REPLICA_NAME в settings).
+
+На реплику уходят только чтения моделей каталога (товары из product_registry, категории, размеры елок
+и связи между ними) и только во время обработки HTTP-запроса (ReplicaRoutingMiddleware). Все остальное -
+корзины, заказы, пользователи, сессии, записи, команды manage.py - работает с default.
+
+Read-your-writes: после записи в БД запрос до конца читает с default, а ответ ставит cookie
+REPLICA_PIN_COOKIE на REPLICA_PIN_SECONDS (с запасом на отставание реплики) - пока она есть, запросы
+этого посетителя тоже читают с default. POST и другие изменяющие запросы, а также админка читают с default
+с самого начала: формы и select_for_update не должны видеть устаревшие данные.
+
+После смены версии кэша каталога (main.cache.bump_version) все запросы REPLICA_PIN_SECONDS читают
+с default: иначе отстающая реплика вернула бы старые строки, и они легли бы в кэш (боковое меню, фасеты,
+лента главной, кэш страниц, ETag API) уже под новой версией и жили бы там до следующей смены.
+"""
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .models import product_registry
+
+CATALOG_MODELS = {"main.category", "main.christmastreeheight"}
+# Сохранение сессии - служебная запись, чтение каталога из-за нее на default не переключаем
+UNPINNED_WRITE_MODELS = {"sessions.session"}
+
+
+class RoutingState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+# Состояние текущего HTTP-запроса; вне запроса None. Объект изменяемый, поэтому запись, сделанная
+# в потоке пула ORM (main.async_views), видна middleware в event loop
+_state = ContextVar("replica_routing_state", default=None)
+
+
+def begin_request(pinned):
+    return _state.set(RoutingState(pinned))
+
+
+def end_request(token):
+    state = _state.get()
+    _state.reset(token)
+    return state
+
+
+def is_catalog_model(model):
+    opts = model._meta
+    if opts.auto_created:
+        # Промежуточная таблица ManyToMany: каталог, если обе стороны - каталог
+        return all(is_catalog_model(field.related_model) for field in opts.fields if field.is_relation)
+    return opts.label_lower in CATALOG_MODELS or (opts.app_label == "main" and opts.model_name in product_registry)
+
+
+class ReplicaRouter:
+    def __init__(self):
+        alias = getattr(settings, "READ_REPLICA_ALIAS", "replica")
+        self.replica = alias if alias in settings.DATABASES else None
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if self.replica is None or state is None or state.pinned or not is_catalog_model(model):
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return self.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None and model._meta.label_lower not in UNPINNED_WRITE_MODELS:
+            state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика - копия default, объекты с обеих баз можно связывать
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема на реплику приходит репликацией (локально - командой sync_replica)
+        return db != self.replica
@@ -0,0 +1,216 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import product_registry
+
+SEARCH_TABLE = "main_product_search"
+# Поля товара, попадающие в индекс, с весами для ранжирования
+SEARCH_FIELDS = (
+    ("title", 10.0),
+    ("description", 1.0),
+    ("product_type", 5.0),
+    ("from_place", 2.0),
+)
+
+
+def _normalize(text):
+    # токенизатор FTS5 не приравнивает "ё" к "е"
+    return text.lower().replace("ё", "е")
+
+
+def _tokens(query):
+    return re.findall(r"\w+", _normalize(query))
+
+
+def _document(instance):
+    return [_normalize(getattr(instance, field, None) or "") for field, _ in SEARCH_FIELDS]
+
+
+class SQLiteSearchBackend:
+    """
+    Индекс на виртуальной таблице SQLite FTS5 (создается миграцией 0005_product_search).
+    Поиск по UNINDEXED-колонкам FTS5 - это перебор всей таблицы, поэтому запись индекса адресуется
+    через rowid: (id ContentType << 32) | id товара.
+    """
+
+    @staticmethod
+    def _rowid(ct_model, object_id):
+        return (product_registry.get_content_type_id(ct_model) << 32) | object_id
+
+    def update(self, ct_model, instances):
+        rows = [(self._rowid(ct_model, instance.pk), ct_model, *_document(instance)) for instance in instances]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [row[:1] for row in rows])
+            placeholders = ", ".join(["%s"] * (2 + len(SEARCH_FIELDS)))
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, ct_model, {', '.join(field for field, _ in SEARCH_FIELDS)}) "
+                f"VALUES ({placeholders})",
+                rows,
+            )
+
+    def delete(self, ct_model, object_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s",
+                               [(self._rowid(ct_model, object_id),) for object_id in object_ids])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+
+    def search(self, query, ct_model=None, limit=20, offset=0):
+        tokens = _tokens(query)
+        if not tokens:
+            return []
+        match = " ".join('"{}"*'.format(token) for token in tokens)
+        weights = ", ".join(["0"] + [str(weight) for _, weight in SEARCH_FIELDS])
+        sql = f"SELECT ct_model, rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s"
+        params = [match]
+        if ct_model:
+            sql += " AND ct_model = %s"
+            params.append(ct_model)
+        sql += f" ORDER BY bm25({SEARCH_TABLE}, {weights}) LIMIT %s OFFSET %s"
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [limit, offset])
+            return [(row[0], row[1] & 0xFFFFFFFF) for row in cursor.fetchall()]
+
+
+class PostgreSQLSearchBackend:
+    """Индекс в таблице с tsvector и GIN-индексом (создается миграцией 0005_product_search)."""
+
+    WEIGHTS = ("A", "C", "B", "D")
+
+    def update(self, ct_model, instances):
+        document_sql = " || ".join(
+            f"setweight(to_tsvector('russian', %s), '{weight}')" for weight in self.WEIGHTS
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (ct_model, object_id, document) VALUES (%s, %s, {document_sql}) "
+                f"ON CONFLICT (ct_model, object_id) DO UPDATE SET document = EXCLUDED.document",
+                [(ct_model, instance.pk, *_document(instance)) for instance in instances],
+            )
+
+    def delete(self, ct_model, object_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE ct_model = %s AND object_id = ANY(%s)",
+                           [ct_model, list(object_ids)])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {SEARCH_TABLE}")
+
+    def search(self, query, ct_model=None, limit=20, offset=0):
+        tokens = _tokens(query)
+        if not tokens:
+            return []
+        sql = (f"SELECT ct_model, object_id FROM {SEARCH_TABLE}, to_tsquery('russian', %s) query "
+               f"WHERE document @@ query")
+        params = [" & ".join(f"{token}:*" for token in tokens)]
+        if ct_model:
+            sql += " AND ct_model = %s"
+            params.append(ct_model)
+        sql += " ORDER BY ts_rank(document, query) DESC, object_id DESC LIMIT %s OFFSET %s"
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [limit, offset])
+            return [(row[0], int(row[1])) for row in cursor.fetchall()]
+
+
+class FallbackSearchBackend:
+    """Для прочих СУБД: поиск icontains по полям товара, без отдельного индекса."""
+
+    def update(self, ct_model, instances):
+        pass
+
+    def delete(self, ct_model, object_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def search(self, query, ct_model=None, limit=20, offset=0):
+        tokens = _tokens(query)
+        if not tokens:
+            return []
+        results = []
+        for model_name, model in product_registry.items():
+            if ct_model and model_name != ct_model:
+                continue
+            condition = Q()
+            for token in tokens:
+                token_condition = Q()
+                for field, _ in SEARCH_FIELDS:
+                    if hasattr(model, field):
+                        token_condition |= Q(**{f"{field}__icontains": token})
+                condition &= token_condition
+            ids = model.objects.filter(condition).order_by("-id").values_list("id", flat=True)[:offset + limit]
+            results.extend((model_name, object_id) for object_id in ids)
+        return results[offset:offset + limit]
+
+
+class SearchIndex:
+    """
+    Полнотекстовый индекс товаров: title, description, product_type, from_place.
+    Реализация выбирается по СУБД: SQLite - FTS5, PostgreSQL - tsvector, иначе icontains.
+    Обновляется сигналами сохранения/удаления товаров (main.signals).
+    """
+
+    BACKENDS = {
+        "sqlite": SQLiteSearchBackend,
+        "postgresql": PostgreSQLSearchBackend,
+    }
+
+    @property
+    def backend(self):
+        return self.BACKENDS.get(connection.vendor, FallbackSearchBackend)()
+
+    def update(self, instances):
+        instances = list(instances)
+        if instances:
+            self.backend.update(instances[0].get_model_name(), instances)
+
+    def delete(self, instance):
+        self.backend.delete(instance.get_model_name(), [instance.pk])
+
+    def rebuild(self, batch_size=1000):
+        backend = self.backend
+        backend.clear()
+        count = 0
+        for ct_model, model in product_registry.items():
+            batch = []
+            for instance in model.objects.only("id", *(field for field, _ in SEARCH_FIELDS)).iterator(batch_size):
+                batch.append(instance)
+                if len(batch) >= batch_size:
+                    backend.update(ct_model, batch)
+                    count += len(batch)
+                    batch = []
+            backend.update(ct_model, batch)
+            count += len(batch)
+        return count
+
+    def search(self, query, ct_model=None, limit=20, offset=0):
+        """Список (ct_model, object_id) по убыванию релевантности."""
+        return self.backend.search(query, ct_model, limit, offset)
+
+    def search_objects(self, query, ct_model=None, limit=20, offset=0):
+        """Товары в порядке релевантности; по одному запросу на каждую модель в выдаче."""
+        hits = self.search(query, ct_model, limit, offset)
+        ids_by_model = {}
+        for model_name, object_id in hits:
+            ids_by_model.setdefault(model_name, []).append(object_id)
+        objects = {
+            model_name: product_registry.get_model(model_name).objects.select_related("category").in_bulk(ids)
+            for model_name, ids in ids_by_model.items()
+            if model_name in product_registry
+        }
+        return [
+            objects[model_name][object_id]
+            for model_name, object_id in hits
+            if object_id in objects.get(model_name, {})
+        ]
+
+
+search_index = SearchIndex()
@@ -1,7 +1,80 @@
-from django.db.models.signals import post_save, m2m_changed
+from django.contrib.auth.signals import user_logged_in
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
 
-from main.models import Cart
+from main.cache import CATALOG_NAMESPACE, bump_version_on_commit
+from main.cart import merge_session_cart
+from main.models import Cart, Category, ChristmasTree, ChristmasTreeHeight
+from main.search import SEARCH_FIELDS, search_index
+from main.sqlite import configure_connection
+
+
+@receiver(post_save, sender=ChristmasTree)
+@receiver(post_delete, sender=ChristmasTree)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=ChristmasTreeHeight)
+@receiver(post_delete, sender=ChristmasTreeHeight)
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_version_on_commit(CATALOG_NAMESPACE)
+
+
+@receiver(m2m_changed, sender=ChristmasTree.choose_height.through)
+def invalidate_catalog_cache_on_heights_change(sender, action, **kwargs):
+    # m2m_changed приходит дважды (pre_* и post_*): версию меняем один раз, когда связи уже записаны
+    if action.startswith("post_"):
+        bump_version_on_commit(CATALOG_NAMESPACE)
+
+
+@receiver(m2m_changed, sender=ChristmasTree.choose_height.through)
+def refresh_tree_price_range(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == "pre_clear":
+        # После clear() со стороны размера уже не узнать, к каким елкам он был привязан
+        instance._cleared_tree_ids = list(instance.christmastree_set.values_list("pk", flat=True))
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        tree_ids = [instance.pk]
+    elif action == "post_clear":
+        tree_ids = getattr(instance, "_cleared_tree_ids", [])
+    else:
+        tree_ids = pk_set
+    ChristmasTree.objects.filter(pk__in=tree_ids).refresh_price_range()
+
+
+@receiver(post_save, sender=ChristmasTreeHeight)
+def refresh_price_range_on_height_change(sender, instance, created, **kwargs):
+    if not created:
+        ChristmasTree.objects.filter(choose_height=instance).refresh_price_range()
+
+
+@receiver(pre_delete, sender=ChristmasTreeHeight)
+def remember_height_trees(sender, instance, **kwargs):
+    instance._tree_ids = list(instance.christmastree_set.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=ChristmasTreeHeight)
+def refresh_price_range_on_height_delete(sender, instance, **kwargs):
+    ChristmasTree.objects.filter(pk__in=getattr(instance, "_tree_ids", [])).refresh_price_range()
+
+
+@receiver(post_save, sender=ChristmasTree)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & {field for field, _ in SEARCH_FIELDS}:
+        return
+    search_index.update([instance])
+
+
+@receiver(post_delete, sender=ChristmasTree)
+def delete_from_search_index(sender, instance, **kwargs):
+    search_index.delete(instance)
+
+
+@receiver(user_logged_in)
+def move_session_cart_to_db(sender, request, user, **kwargs):
+    if request is not None and hasattr(request, "session"):
+        merge_session_cart(request, user)
 
 
 """@receiver(m2m_changed , sender=Cart.products.through)
@@ -12,4 +85,9 @@ def save_post(sender, instance, **kwargs):
     instance.final_price = sum(product.final_price for product in cart_products)
     instance.total_products = sum(product.qty for product in cart_products)
     instance.save()
-"""
\ No newline at end of file
+"""
+
+
+@receiver(connection_created)
+def apply_sqlite_profile(sender, connection, **kwargs):
+    configure_connection(connection)
@@ -0,0 +1,84 @@
+"""
+Профиль SQLite для продакшена (settings.SQLITE_PROFILE) и повтор транзакций при блокировке БД.
+
+PRAGMA из settings.SQLITE_PRAGMAS выполняются на каждом новом соединении (сигнал connection_created,
+main.signals). WAL позволяет читать во время записи, busy_timeout - ждать освобождения блокировки
+вместо мгновенной ошибки, synchronous=NORMAL в режиме WAL не теряет целостность и убирает fsync
+на каждом коммите.
+
+Ожидание по busy_timeout не спасает транзакцию, которая сначала читала, а потом пишет: если за это время
+другая транзакция успела записать, SQLite сразу отвечает "database is locked". Пишущие транзакции корзины
+и оформления заказа поэтому открываются через immediate_atomic (BEGIN IMMEDIATE), а если блокировка
+все же не дождалась своей очереди, запрос начинается заново - это делает retry_on_lock.
+Остальные транзакции, в том числе только читающие, остаются DEFERRED и блокировку на запись не берут.
+"""
+import functools
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+LOCK_MESSAGES = ("database is locked", "database table is locked")
+
+
+def configure_connection(connection):
+    if connection.vendor != "sqlite" or not getattr(settings, "SQLITE_PROFILE", False):
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, "SQLITE_PRAGMAS", {}).items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+class ImmediateAtomic(transaction.Atomic):
+    def __enter__(self):
+        connection = transaction.get_connection(self.using)
+        if (connection.vendor != "sqlite" or connection.in_atomic_block
+                or not getattr(settings, "SQLITE_PROFILE", False) or not hasattr(connection, "transaction_mode")):
+            return super().__enter__()
+        # Соединение открываем заранее: при подключении transaction_mode заново читается из OPTIONS
+        connection.ensure_connection()
+        previous, connection.transaction_mode = connection.transaction_mode, "IMMEDIATE"
+        try:
+            return super().__enter__()
+        finally:
+            connection.transaction_mode = previous
+
+
+def immediate_atomic(using=None, savepoint=True, durable=False):
+    """
+    transaction.atomic, который с профилем SQLite открывает внешнюю транзакцию через BEGIN IMMEDIATE
+    (main.backends.sqlite3): блокировка на запись берется сразу и ждется по busy_timeout.
+    Для транзакций, которые читают и затем пишут; вложенный блок и другие СУБД - обычный atomic.
+    """
+    if callable(using):
+        return ImmediateAtomic(DEFAULT_DB_ALIAS, savepoint, durable)(using)
+    return ImmediateAtomic(using, savepoint, durable)
+
+
+def is_lock_error(error):
+    return isinstance(error, OperationalError) and any(message in str(error) for message in LOCK_MESSAGES)
+
+
+def retry_on_lock(func):
+    """
+    Повторяет func, если она упала с блокировкой SQLite: до SQLITE_LOCK_RETRIES раз с экспоненциальной
+    паузой от SQLITE_LOCK_RETRY_DELAY секунд. func должна сама открывать транзакцию: внутри чужой
+    транзакции повтор невозможен, и ошибка пробрасывается сразу.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        retries = getattr(settings, "SQLITE_LOCK_RETRIES", 0) if getattr(settings, "SQLITE_PROFILE", False) else 0
+        delay = getattr(settings, "SQLITE_LOCK_RETRY_DELAY", 0.05)
+        for attempt in range(retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as error:
+                if attempt == retries or not is_lock_error(error) or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+                    raise
+                logger.warning("БД заблокирована, повтор %s из %s: %s", attempt + 1, retries, func.__qualname__)
+                time.sleep(delay * 2 ** attempt * random.uniform(0.5, 1.5))
+    return wrapper
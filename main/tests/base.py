@@ -0,0 +1,66 @@
+"""
+Базовые классы и общие настройки тестов. Кэш в тестах - в памяти процесса (TEST_CACHES), независимо
+от способа запуска (manage.py test, pytest, другой runner): файловый кэш из settings общий с локальным
+сервером, и тесты видели бы его страницы и версии каталога.
+"""
+from django.conf import settings
+from django.test import SimpleTestCase as DjangoSimpleTestCase
+from django.test import TestCase as DjangoTestCase
+from django.test import TransactionTestCase as DjangoTransactionTestCase
+from django.test import override_settings
+
+TEST_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "elkisamara-tests"}}
+
+# Шаблоны-заглушки для view, чьи шаблоны еще не сверстаны. Обращаются к данным так, как описано в docstring view.
+PLACEHOLDER_TEMPLATES = {
+    "PLACEHOLDER_DETAIL.html": (
+        "{{ product.title }}{% for height in tree_choices %}{{ height.tree_price }}{% endfor %}"
+        "{% for category in categories %}{{ category.category_name }}{% endfor %}"
+    ),
+    "PLACEHOLDER_CATEGORY.html": (
+        "{% for product in products %}<a href=\"{{ product.get_absolute_url }}\">{{ product.title }}</a>{% endfor %}"
+        "{{ next_cursor }}{% for category in categories %}{{ category.category_name }}{% endfor %}"
+    ),
+    "PLACEHOLDER_SEARCH.html": (
+        "{% for product in products %}<a href=\"{{ product.get_absolute_url }}\">{{ product.title }}</a>"
+        "{{ product.category.name }}{% endfor %}{{ next_page }}"
+        "{% for category in categories %}{{ category.category_name }}{% endfor %}"
+    ),
+    "PLACEHOLDER_CART.html": (
+        "{{ cart.final_price }}{% for line in cart_lines %}"
+        "<a href=\"{{ line.url }}\">{{ line.title }}</a>{{ line.height.tree_height }}{{ line.line_total }}"
+        "{% endfor %}"
+    ),
+    "ORDER_LIST_PLACEHOLDER.html": (
+        "{% for order in orders_list %}{{ order.id }} {{ order.status }} {{ order.created_at }}{% endfor %}"
+    ),
+    "ORDER_PLACEHOLDER.html": "{{ order.id }} {{ order.order_content_description }}",
+}
+
+BUDGET_TEMPLATES = [{
+    "BACKEND": "django.template.backends.django.DjangoTemplates",
+    "DIRS": settings.TEMPLATES[0]["DIRS"],
+    "OPTIONS": {
+        "loaders": [
+            ("django.template.loaders.locmem.Loader", PLACEHOLDER_TEMPLATES),
+            "django.template.loaders.filesystem.Loader",
+            "django.template.loaders.app_directories.Loader",
+        ],
+        "context_processors": settings.TEMPLATES[0]["OPTIONS"]["context_processors"],
+    },
+}]
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SimpleTestCase(DjangoSimpleTestCase):
+    pass
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TestCase(DjangoTestCase):
+    pass
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TransactionTestCase(DjangoTransactionTestCase):
+    pass
@@ -0,0 +1,108 @@
+"""
+Бюджеты числа SQL-запросов для адресов из Elkisamara/urls.py на заполненном каталоге (ViewBudgetTestCase).
+Время ответа только записывается в отчет: на общих машинах CI оно слишком нестабильно для проверки.
+Отчет (JSON) пишется, если задан путь в переменной окружения VIEW_BUDGET_REPORT.
+"""
+import json
+import os
+import time
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from main.models import Cart, Category, ChristmasTree, ChristmasTreeHeight, Customer, Order, User
+from main.search import search_index
+
+from .base import BUDGET_TEMPLATES, TestCase
+
+REPORT_PATH = os.environ.get("VIEW_BUDGET_REPORT")
+
+TREES_COUNT = 2000
+HEIGHTS_COUNT = 10
+CUSTOMERS_COUNT = 30
+LINES_PER_CART = 15
+
+# Замеры всех модулей с бюджетами за прогон
+_report = []
+
+
+@override_settings(TEMPLATES=BUDGET_TEMPLATES)
+class ViewBudgetTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        categories = [Category.objects.create(name=f"Категория {i}", slug=f"category-{i}") for i in range(8)]
+        ChristmasTreeHeight.objects.bulk_create(
+            ChristmasTreeHeight(tree_height=f"{1 + i * 0.5}", tree_price=1000 + i * 500)
+            for i in range(HEIGHTS_COUNT)
+        )
+        heights = list(ChristmasTreeHeight.objects.order_by("id"))
+        ChristmasTree.objects.bulk_create(
+            ChristmasTree(category=categories[i % len(categories)], title=f"Елка {i}", slug=f"tree-{i}",
+                          product_type=f"Тип {i % 6}", from_place="Самара", description="Пушистая елка")
+            for i in range(TREES_COUNT)
+        )
+        trees = list(ChristmasTree.objects.order_by("id"))
+        search_index.rebuild()
+        through = ChristmasTree.choose_height.through
+        through.objects.bulk_create(
+            through(christmastree_id=tree.id, christmastreeheight_id=heights[(tree.id + k) % HEIGHTS_COUNT].id)
+            for tree in trees
+            for k in range(3)
+        )
+        ChristmasTree.objects.refresh_price_range()
+        cls.tree = trees[0]
+        cls.height = heights[0]
+        cls.category = categories[0]
+
+        for i in range(CUSTOMERS_COUNT):
+            user = User.objects.create_user(f"user{i}", password="password")
+            customer = Customer.objects.create(user=user)
+            cart = Cart.objects.create(owner=customer)
+            for tree in trees[i + 1:i + 1 + LINES_PER_CART]:
+                cart.add_product(tree, heights[tree.id % HEIGHTS_COUNT].id)
+            if i == 0:
+                cls.user = user
+                for _ in range(5):
+                    cart.in_order = True
+                    cart.save()
+                    cls.order = Order.objects.create(customer=customer, cart=cart, first_name="Иван")
+                    cart = Cart.objects.create(owner=customer)
+                    for tree in trees[1:1 + LINES_PER_CART]:
+                        cart.add_product(tree, heights[tree.id % HEIGHTS_COUNT].id)
+        cls.superuser = User.objects.create_superuser("admin", password="password")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if not REPORT_PATH:
+            return
+        with open(REPORT_PATH, "w", encoding="utf-8") as report_file:
+            json.dump({"seed": {"trees": TREES_COUNT, "heights": HEIGHTS_COUNT, "customers": CUSTOMERS_COUNT,
+                                "lines_per_cart": LINES_PER_CART},
+                       "results": _report}, report_file, ensure_ascii=False, indent=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def measure(self, name, url, max_queries, method="get", data=None, user=None, warm=False, status=200):
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        if warm:
+            getattr(client, method)(url, data)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, method)(url, data)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        _report.append({
+            "test": self.id(), "name": name, "url": url, "method": method.upper(), "authenticated": user is not None,
+            "warm": warm, "status": response.status_code, "queries": len(queries), "max_queries": max_queries,
+            "ms": round(elapsed_ms, 2),
+        })
+        with self.subTest(name):
+            self.assertEqual(response.status_code, status)
+            self.assertLessEqual(len(queries), max_queries,
+                                 "\n".join(query["sql"] for query in queries.captured_queries))
+        return response
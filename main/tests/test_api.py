@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from .budgets import ViewBudgetTestCase
+
+
+class CatalogApiTests(ViewBudgetTestCase):
+    def test_api_views(self):
+        self.measure("api sidebar", "/api/sidebar/", 1)
+        self.measure("api categories", "/api/categories/", 1)
+        response = self.measure("api products", "/api/products/christmastree/", 2)
+        self.assertEqual(len(response.json()["results"]), settings.CATALOG_PAGE_SIZE)
+        self.assertEqual(len(response.json()["results"][0]["heights"]), 3)
+        self.measure("api products next page", "/api/products/christmastree/", 2,
+                     data={"cursor": response.json()["next_cursor"], "category": self.category.slug})
+        response = self.measure("api products sparse", "/api/products/christmastree/", 1,
+                                data={"fields": "id,title,min_price"})
+        self.assertEqual(set(response.json()["results"][0]), {"id", "title", "min_price"})
+        response = self.measure("api products batch", "/api/products/christmastree/", 2,
+                                data={"slugs": "tree-5,tree-3,missing"})
+        self.assertEqual([product["slug"] for product in response.json()["results"]], ["tree-5", "tree-3"])
+        self.assertEqual(response.json()["missing"], ["missing"])
+        self.measure("api product", f"/api/products/christmastree/{self.tree.slug}/", 2)
+        self.measure("api unknown field", "/api/products/christmastree/", 0, data={"fields": "password"}, status=400)
+
+    def test_etag(self):
+        # Неизменный каталог: 304 без запросов в БД, после изменения - новый ETag
+        url = f"/api/products/christmastree/{self.tree.slug}/"
+        etag = Client().get(url)["ETag"]
+        client = Client(HTTP_IF_NONE_MATCH=etag)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(client.get(url).status_code, 304)
+        self.assertEqual(len(queries), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tree.save()
+        self.assertEqual(client.get(url).status_code, 200)
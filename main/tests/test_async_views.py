@@ -0,0 +1,80 @@
+from urllib.parse import urlencode
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.test import AsyncClient, override_settings
+from django.utils.module_loading import import_string
+
+from main.models import Cart, Category, ChristmasTree, ChristmasTreeHeight, User
+
+from .base import BUDGET_TEMPLATES, SimpleTestCase, TransactionTestCase
+
+
+class AsyncMiddlewareTests(SimpleTestCase):
+    def test_middleware_chain_is_async_capable(self):
+        # Sync middleware под ASGI переводит всю цепочку в один поток, и пул ORM теряет смысл
+        for path in settings.MIDDLEWARE:
+            with self.subTest(middleware=path):
+                self.assertTrue(getattr(import_string(path), "async_capable", False))
+
+
+@override_settings(ROOT_URLCONF="Elkisamara.async_urls", TEMPLATES=BUDGET_TEMPLATES)
+class AsyncViewTests(TransactionTestCase):
+    """
+    Адреса из Elkisamara/async_urls.py (запуск под ASGI). View выполняются в пуле ORM, то есть в других
+    потоках и соединениях с БД, поэтому нужен TransactionTestCase: данные должны быть закоммичены.
+    """
+
+    def setUp(self):
+        category = Category.objects.create(name="Елки", slug="trees")
+        self.height = ChristmasTreeHeight.objects.create(tree_height="1.5", tree_price=2500)
+        self.tree = ChristmasTree.objects.create(category=category, title="Елка", slug="elka")
+        self.tree.choose_height.add(self.height)
+        self.client = AsyncClient()
+
+    def request(self, method, url, data=None, **headers):
+        return async_to_sync(self._request)(method, url, data or {}, headers)
+
+    async def _request(self, method, url, data, headers):
+        # AsyncClient в Django 3.2 не переносит GET-параметры в query_string, extra кладет в заголовки как есть,
+        # а multipart-тело POST читает с ошибкой - поэтому параметры кодируем сами
+        if method == "get":
+            return await self.client.get(f"{url}?{urlencode(data)}" if data else url, **headers)
+        return await self.client.post(
+            url, urlencode(data), content_type="application/x-www-form-urlencoded", **headers)
+
+    def test_session_cart(self):
+        response = self.request("get", "/add-to-cart/christmastree/elka/", {"tree_height_id": self.height.pk})
+        self.assertRedirects(response, "/cart/", fetch_redirect_response=False)
+        response = self.request("get", "/cart/widget/")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "2500")
+
+    def test_db_cart(self):
+        user = User.objects.create_user("user", password="password")
+        self.client.force_login(user)
+        self.request("get", "/add-to-cart/christmastree/elka/", {"tree_height_id": self.height.pk})
+        self.request("post", "/change-qty/christmastree/elka/", {"qty": 3})
+        cart = Cart.objects.get(owner__user=user)
+        self.assertEqual(cart.final_price, 7500)
+        self.request("get", "/remove-from-cart/christmastree/elka/")
+        cart.refresh_from_db()
+        self.assertEqual(cart.final_price, 0)
+
+    def test_catalog_api(self):
+        response = self.request("get", "/api/products/christmastree/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([product["slug"] for product in response.json()["results"]], ["elka"])
+        response = self.request("get", "/api/products/christmastree/", **{"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.request("get", "/category/christmastree/").status_code, 200)
+
+    @override_settings(REQUEST_METRICS_ENABLED=True, REQUEST_METRICS_SAMPLE_RATE=1.0, REQUEST_METRICS_DUMP_DIR=None)
+    def test_request_metrics_count_pool_queries(self):
+        # Middleware подключается при первом запросе клиента, поэтому клиент создаем с включенными метриками
+        self.client = AsyncClient()
+        with self.assertLogs("main.request_metrics") as logs:
+            response = self.request("get", "/category/christmastree/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('desc="0 queries"', response["Server-Timing"])
+        self.assertIn('"view": "category_detail"', logs.output[0])
@@ -0,0 +1,118 @@
+import warnings
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.db import transaction
+from django.test import override_settings
+
+from main.cache import CATALOG_NAMESPACE, bump_version, get_or_build, get_version
+from main.checks import check_shared_cache
+from main.models import Category, ChristmasTree, ChristmasTreeHeight
+
+from .base import BUDGET_TEMPLATES, SimpleTestCase, TestCase, TransactionTestCase
+
+
+class CatalogCacheVersionTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_lost_version_does_not_restart_from_one(self):
+        version = get_version(CATALOG_NAMESPACE)
+        bump_version(CATALOG_NAMESPACE)
+        self.assertEqual(get_version(CATALOG_NAMESPACE), version + 1)
+        cache.clear()
+        self.assertGreater(get_version(CATALOG_NAMESPACE), version + 1)
+
+    def test_process_local_cache_warning(self):
+        self.assertEqual([error.id for error in check_shared_cache(None)], ["main.W001"])
+        shared = {"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                              "LOCATION": "/tmp/elkisamara-cache"}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class GetOrBuildTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_builds_once_and_releases_lock(self):
+        build = mock.Mock(return_value="table")
+        self.assertEqual(get_or_build("key", build, 60), "table")
+        self.assertEqual(get_or_build("key", build, 60), "table")
+        build.assert_called_once_with()
+        self.assertIsNone(cache.get("key:lock"))
+
+    def test_waits_for_process_holding_lock(self):
+        cache.add("key:lock", True)
+        build = mock.Mock(return_value="own table")
+        # Пока этот процесс ждет, другой достраивает таблицу
+        with mock.patch("main.cache.time.sleep", side_effect=lambda _: cache.set("key", "table", 60)):
+            self.assertEqual(get_or_build("key", build, 60), "table")
+        build.assert_not_called()
+        self.assertTrue(cache.get("key:lock"))
+
+    @mock.patch("main.cache.REBUILD_WAIT", 0.1)
+    def test_builds_itself_when_lock_holder_is_slow(self):
+        cache.add("key:lock", True)
+        self.assertEqual(get_or_build("key", lambda: "table", 60), "table")
+        self.assertEqual(cache.get("key"), "table")
+        # Чужую блокировку не снимаем
+        self.assertTrue(cache.get("key:lock"))
+
+
+class CatalogCacheInvalidationTests(TestCase):
+    def test_heights_change_bumps_version_once(self):
+        category = Category.objects.create(name="Елки", slug="trees")
+        tree = ChristmasTree.objects.create(category=category, title="Пихта", slug="pihta")
+        height = ChristmasTreeHeight.objects.create(tree_height="1.5", tree_price=2500)
+        for change in (lambda: tree.choose_height.add(height), lambda: tree.choose_height.remove(height),
+                       lambda: tree.choose_height.clear()):
+            version = get_version(CATALOG_NAMESPACE)
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            self.assertEqual(get_version(CATALOG_NAMESPACE), version + 1)
+
+
+class CatalogCacheCommitTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_version_changes_after_commit(self):
+        # Пока транзакция не закоммичена, другие запросы видят старые данные: сохранить их под новой
+        # версией нельзя, поэтому версия меняется только после коммита
+        version = get_version(CATALOG_NAMESPACE)
+        with transaction.atomic():
+            Category.objects.create(name="Елки", slug="trees")
+            self.assertEqual(get_version(CATALOG_NAMESPACE), version)
+        self.assertEqual(get_version(CATALOG_NAMESPACE), version + 1)
+
+    def test_rollback_keeps_version(self):
+        version = get_version(CATALOG_NAMESPACE)
+        with self.assertRaises(ZeroDivisionError), transaction.atomic():
+            Category.objects.create(name="Елки", slug="trees")
+            1 / 0
+        self.assertEqual(get_version(CATALOG_NAMESPACE), version)
+
+
+@override_settings(TEMPLATES=BUDGET_TEMPLATES)
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Елки", slug="trees")
+        ChristmasTree.objects.create(
+            category=category, title="Ель прикольная", slug="el", product_type="Ель прикольная")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_key_is_memcached_safe_and_ignores_unknown_params(self):
+        url = "/category/christmastree/trees/"
+        with warnings.catch_warnings():
+            # Кириллица и пробелы в параметрах: memcached отверг бы такой ключ (InvalidCacheKey)
+            warnings.simplefilter("error", CacheKeyWarning)
+            self.assertEqual(self.client.get(url, {"tree_type": "Ель прикольная"}).status_code, 200)
+            with self.assertNumQueries(0):
+                self.client.get(url, {"tree_type": "Ель прикольная", "utm_source": "ads"})
+            with self.assertNumQueries(0):
+                self.client.get(url, {"utm_source": "other", "tree_type": "Ель прикольная", "price_min": ""})
@@ -0,0 +1,154 @@
+from django.test import override_settings
+
+from main.cart import CART_SESSION_KEY, SessionCart, get_cart_lines
+from main.models import Cart, Category, ChristmasTree, ChristmasTreeHeight, Customer, User
+from main.utils import recalc_cart, reprice_heights
+
+from .base import BUDGET_TEMPLATES, TestCase
+
+
+@override_settings(TEMPLATES=BUDGET_TEMPLATES)
+class DeletedProductCartTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Елки", slug="trees")
+        height = ChristmasTreeHeight.objects.create(tree_height="1.5", tree_price=2500)
+        self.user = User.objects.create_user("buyer", password="password")
+        self.cart = Cart.objects.create(owner=Customer.objects.create(user=self.user))
+        self.trees = []
+        for slug in ("kept", "deleted"):
+            tree = ChristmasTree.objects.create(category=category, title=slug, slug=slug)
+            tree.choose_height.add(height)
+            self.cart.add_product(tree, height.pk)
+            self.trees.append(tree)
+
+    def test_deleted_product_is_skipped(self):
+        self.trees[1].delete()
+        self.assertEqual([line.title for line in get_cart_lines(self.cart)], ["kept"])
+
+        self.client.force_login(self.user)
+        response = self.client.get("/cart/")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "kept")
+
+
+@override_settings(TEMPLATES=BUDGET_TEMPLATES)
+class SessionCartTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Елки", slug="trees")
+        self.height = ChristmasTreeHeight.objects.create(tree_height="1.5", tree_price=2500)
+        self.tree = ChristmasTree.objects.create(category=category, title="Пихта", slug="pihta")
+        self.tree.choose_height.add(self.height)
+
+        self.large = ChristmasTreeHeight.objects.create(tree_height="2", tree_price=3000)
+        self.pine = ChristmasTree.objects.create(category=category, title="Сосна", slug="sosna")
+        self.pine.choose_height.add(self.large)
+
+    def session_cart(self):
+        return SessionCart(self.client.session)
+
+    def test_anonymous_add_change_remove(self):
+        self.client.get("/add-to-cart/christmastree/pihta/", {"tree_height_id": self.height.pk})
+        self.client.get("/add-to-cart/christmastree/sosna/", {"tree_height_id": self.large.pk})
+        self.client.post("/change-qty/christmastree/pihta/", {"qty": 3})
+        cart = self.session_cart()
+        self.assertEqual([(line.title, line.qty, line.line_total) for line in cart.get_lines()],
+                         [("Пихта", 3, 7500), ("Сосна", 1, 3000)])
+        self.assertEqual((cart.total_products, cart.final_price), (2, 10500))
+
+        self.client.get("/remove-from-cart/christmastree/sosna/")
+        cart = self.session_cart()
+        self.assertEqual([line.title for line in cart.get_lines()], ["Пихта"])
+        self.assertEqual((cart.total_products, cart.final_price), (1, 7500))
+        # Анонимная корзина не пишет в БД
+        self.assertFalse(Cart.objects.exists())
+
+    def test_login_merges_into_existing_cart(self):
+        user = User.objects.create_user("buyer", password="password")
+        db_cart = Cart.objects.create(owner=Customer.objects.create(user=user))
+        db_cart.add_product(self.tree, self.height.pk)
+
+        self.client.get("/add-to-cart/christmastree/pihta/", {"tree_height_id": self.height.pk})
+        self.client.post("/change-qty/christmastree/pihta/", {"qty": 2})
+        self.client.get("/add-to-cart/christmastree/sosna/", {"tree_height_id": self.large.pk})
+        response = self.client.post("/login/", {"username": "buyer", "password": "password"})
+        self.assertEqual(response.status_code, 302)
+
+        self.assertEqual(Cart.objects.count(), 1)
+        db_cart.refresh_from_db()
+        quantities = {line.title: (line.qty, line.line_total) for line in get_cart_lines(db_cart)}
+        self.assertEqual(quantities, {"Пихта": (3, 7500), "Сосна": (1, 3000)})
+        self.assertEqual((db_cart.total_products, db_cart.final_price), (2, 10500))
+        # Итоги, сдвинутые дельтами при слиянии, совпадают с полным пересчетом
+        recalc_cart(db_cart)
+        db_cart.refresh_from_db()
+        self.assertEqual((db_cart.total_products, db_cart.final_price), (2, 10500))
+        self.assertNotIn(SessionCart.SESSION_KEY, self.client.session)
+        self.assertEqual(self.client.session[CART_SESSION_KEY], db_cart.pk)
+
+    def test_prices_follow_reprice(self):
+        self.client.get("/add-to-cart/christmastree/pihta/", {"tree_height_id": self.height.pk})
+        self.client.post("/change-qty/christmastree/pihta/", {"qty": 2})
+        # В сессии нет цены: иначе цена строки и цена размера после смены цены разошлись бы
+        self.assertEqual(self.client.session[SessionCart.SESSION_KEY], [
+            {"ct_model": "christmastree", "object_id": self.tree.pk, "tree_height_id": self.height.pk, "qty": 2},
+        ])
+        reprice_heights({self.height.pk: 3000})
+        cart = self.session_cart()
+        [line] = cart.get_lines()
+        self.assertEqual((line.unit_price, line.line_total), (3000, 6000))
+        self.assertEqual(cart.final_price, 6000)
+        self.assertContains(self.client.get("/cart/widget/"), "6000")
+
+
+class CartWidgetTests(TestCase):
+    def test_cached_homepage_loads_widget(self):
+        response = self.client.get("/")
+        self.assertContains(response, 'data-url="/cart/widget/"')
+        self.assertEqual(self.client.get("/cart/widget/").status_code, 200)
+
+
+class CartTotalsTests(TestCase):
+    """Итоги корзины меняются дельтами (Cart.apply_totals_delta) и должны совпадать с полным пересчетом."""
+
+    def setUp(self):
+        category = Category.objects.create(name="Елки", slug="trees")
+        self.heights = [ChristmasTreeHeight.objects.create(tree_height=f"{1 + i}", tree_price=1000 * (i + 1))
+                        for i in range(2)]
+        self.trees = []
+        for i, height in enumerate(self.heights):
+            tree = ChristmasTree.objects.create(category=category, title=f"Елка {i}", slug=f"elka-{i}")
+            tree.choose_height.add(height)
+            self.trees.append(tree)
+        self.cart = Cart.objects.create(owner=Customer.objects.create(user=User.objects.create_user("buyer")))
+
+    def assert_totals_match_recalc(self, final_price, total_products):
+        self.cart.refresh_from_db()
+        incremental = (self.cart.final_price, self.cart.total_products)
+        self.assertEqual(incremental, (final_price, total_products))
+        recalculated = Cart.objects.get(pk=self.cart.pk)
+        recalc_cart(recalculated)
+        self.assertEqual((recalculated.final_price, recalculated.total_products), incremental)
+
+    def test_add(self):
+        self.cart.add_product(self.trees[0], self.heights[0].pk, qty=2)
+        self.cart.add_product(self.trees[1], self.heights[1].pk)
+        self.assert_totals_match_recalc(4000, 2)
+
+    def test_change_qty(self):
+        self.cart.add_product(self.trees[0], self.heights[0].pk)
+        self.cart.add_product(self.trees[1], self.heights[1].pk)
+        self.cart.change_qty(self.trees[1], 3)
+        self.assert_totals_match_recalc(7000, 2)
+        self.cart.change_qty(self.trees[1], 1)
+        self.assert_totals_match_recalc(3000, 2)
+
+    def test_remove(self):
+        self.cart.add_product(self.trees[0], self.heights[0].pk)
+        self.cart.add_product(self.trees[1], self.heights[1].pk, qty=2)
+        self.cart.remove_product(self.trees[0])
+        self.assert_totals_match_recalc(4000, 1)
+
+    def test_remove_last_line(self):
+        self.cart.add_product(self.trees[0], self.heights[0].pk, qty=2)
+        self.cart.remove_product(self.trees[0])
+        self.assert_totals_match_recalc(0, 0)
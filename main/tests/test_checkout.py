@@ -0,0 +1,51 @@
+import uuid
+from unittest import mock
+
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+
+from main.models import Cart, Category, ChristmasTree, ChristmasTreeHeight, Customer, Order, User
+
+from .base import TestCase
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Елки", slug="trees")
+        height = ChristmasTreeHeight.objects.create(tree_height="1.5", tree_price=2500)
+        tree = ChristmasTree.objects.create(category=category, title="Пихта", slug="pihta")
+        tree.choose_height.add(height)
+        self.user = User.objects.create_user("buyer", password="password")
+        self.cart = Cart.objects.create(owner=Customer.objects.create(user=self.user))
+        self.cart.add_product(tree, height.pk, qty=2)
+        self.client.force_login(self.user)
+        self.data = {
+            "first_name": "Иван", "last_name": "Иванов", "phone": "89270000000", "address": "Самара",
+            "buying_type": Order.BUYING_TYPE_SELF, "comment": "", "idempotency_key": uuid.uuid4(),
+        }
+
+    def test_content_description_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.post("/checkout/", self.data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(callbacks), 1)
+        order = Order.objects.get(idempotency_key=self.data["idempotency_key"])
+        self.assertIn("Наименование: Пихта. Количество: 2 шт., размер елки: 1.5 м.,", order.order_content_description)
+        self.assertIn("суммарная стоимость: 5000.00 руб.", order.order_content_description)
+
+    def test_resubmit_does_not_create_second_order(self):
+        self.client.post("/checkout/", self.data)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/checkout/", self.data)
+        self.assertRedirects(response, "/", fetch_redirect_response=False)
+        self.assertLessEqual(len(queries), 5)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_unrelated_integrity_error_is_raised(self):
+        # Нарушение ограничения, не связанное с повтором формы, не выдается за "Заказ уже оформлен"
+        with mock.patch.object(Customer.orders.through.objects, "create", side_effect=IntegrityError("fk")):
+            with self.assertRaises(IntegrityError):
+                self.client.post("/checkout/", self.data)
+        self.assertFalse(Order.objects.exists())
+        self.cart.refresh_from_db()
+        self.assertFalse(self.cart.in_order)
@@ -0,0 +1,76 @@
+from django.conf import settings
+
+from main.facets import build_facet_table, count_facets
+from main.models import Category, ChristmasTree, ChristmasTreeHeight
+
+from .base import TestCase
+from .budgets import ViewBudgetTestCase
+
+
+class FacetTableTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Елки", slug="trees")
+        Category.objects.create(name="Сосны", slug="pines")
+        self.heights = {
+            key: ChristmasTreeHeight.objects.create(tree_height=key[0], tree_price=key[1])
+            for key in (("1.5", 1500), ("1.5", 2500), ("2", 5000), ("2.5", -100), (None, 8000))
+        }
+
+    def make_tree(self, slug, product_type, heights, category=None, from_place="Самара"):
+        tree = ChristmasTree.objects.create(category=category or self.category, slug=slug, title=slug,
+                                            product_type=product_type, from_place=from_place)
+        tree.choose_height.add(*(self.heights[height] for height in heights))
+        return tree
+
+    def test_signatures_are_grouped(self):
+        self.make_tree("a", "Пихта", [("1.5", 1500), ("2", 5000)])
+        self.make_tree("b", "Пихта", [("1.5", 2500), ("1.5", 1500), ("2", 5000)])
+        self.make_tree("c", "Пихта", [("2", 5000), ("1.5", 1500)])
+        # Отрицательная цена вне диапазонов, размер без роста дает только диапазон
+        self.make_tree("d", "Сосна", [("2.5", -100), (None, 8000)])
+        self.make_tree("e", None, [], from_place=None)
+        self.make_tree("f", "Ель", [("2", 5000)], category=Category.objects.get(slug="pines"))
+
+        with self.assertNumQueries(2):
+            table = build_facet_table(ChristmasTree, "trees")
+        self.assertCountEqual(table, [
+            (("Пихта", "Самара", ("1.5", "2"), ("0-2000", "4000-7000")), 2),
+            (("Пихта", "Самара", ("1.5", "2"), ("0-2000", "2000-4000", "4000-7000")), 1),
+            (("Сосна", "Самара", ("2.5",), ("7000-",)), 1),
+            ((None, None, (), ()), 1),
+        ])
+        counts, total = count_facets(table, {"price": {"0-2000"}})
+        self.assertEqual(total, 3)
+        self.assertEqual(counts["price"], {"0-2000": 3, "2000-4000": 1, "4000-7000": 3, "7000-": 1})
+        self.assertEqual(counts["height"], {"1.5": 3, "2": 3})
+        self.assertEqual(len(build_facet_table(ChristmasTree)), 5)
+
+    def test_many_heights(self):
+        heights = [ChristmasTreeHeight.objects.create(tree_height=str(index), tree_price=1000) for index in range(70)]
+        tree = ChristmasTree.objects.create(category=self.category, slug="a", title="a")
+        tree.choose_height.add(*heights[::3])
+        ((signature, _),) = build_facet_table(ChristmasTree, "trees")
+        self.assertEqual(signature[2], tuple(sorted(str(index) for index in range(0, 70, 3))))
+
+
+class CategoryFacetBudgetTests(ViewBudgetTestCase):
+    def test_category_facets(self):
+        category_url = f"/category/christmastree/{self.category.slug}/"
+        filters = {"product_type": ["Тип 0", "Тип 2"], "height": [self.height.tree_height], "price": "0-2000"}
+        response = self.measure("category_detail facets", category_url, 4, data=filters)
+        self.measure("category_detail facets (warm facet table)", category_url, 3, user=self.user,
+                     data={"height": self.height.tree_height}, warm=True)
+        expected = ChristmasTree.objects.filter(
+            category=self.category, product_type__in=filters["product_type"],
+            choose_height__tree_height=self.height.tree_height, choose_height__tree_price__lt=2000,
+        ).distinct()
+        self.assertEqual(response.context["facets_total"], expected.count())
+        self.assertEqual({product.pk for product in response.context["products"]},
+                         set(expected.order_by("-id").values_list("pk", flat=True)[:settings.CATALOG_PAGE_SIZE]))
+        # Счетчик значения фасета не зависит от выбора внутри этого же фасета
+        type_counts = {value["value"]: value["count"] for facet in response.context["facets"]
+                       if facet["name"] == "product_type" for value in facet["values"]}
+        self.assertEqual(type_counts["Тип 4"], ChristmasTree.objects.filter(
+            category=self.category, product_type="Тип 4", choose_height__tree_height=self.height.tree_height,
+            choose_height__tree_price__lt=2000,
+        ).distinct().count())
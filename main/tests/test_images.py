@@ -0,0 +1,64 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, override_settings
+from PIL import Image
+
+from main.models import Category, ChristmasTree, ChristmasTreeHeight
+
+from .base import BUDGET_TEMPLATES, TestCase
+
+
+@override_settings(TEMPLATES=BUDGET_TEMPLATES)
+class ProductImageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.category = Category.objects.create(name="Елки", slug="trees")
+
+    def test_missing_image_file(self):
+        # Файл пропал с диска, размеры не известны: каталог должен открываться
+        with self.assertLogs("main.images", "WARNING"):
+            tree = ChristmasTree.objects.create(category=self.category, title="Елка", slug="elka",
+                                                image="products/tree/missing.jpg")
+        tree.choose_height.add(ChristmasTreeHeight.objects.create(tree_height="1.5", tree_price=2500))
+        self.assertEqual((tree.image_width, tree.image_height), (None, None))
+        self.assertEqual(len(list(ChristmasTree.objects.all())), 1)
+        client = Client()
+        for url in ("/", "/category/christmastree/", tree.get_absolute_url(), "/api/products/christmastree/"):
+            with self.subTest(url):
+                self.assertEqual(client.get(url).status_code, 200)
+
+    def test_dimensions_saved_on_upload(self):
+        buffer = BytesIO()
+        Image.new("RGB", (30, 20)).save(buffer, "JPEG")
+        tree = ChristmasTree.objects.create(
+            category=self.category, title="Елка", slug="elka",
+            image=SimpleUploadedFile("elka.jpg", buffer.getvalue(), content_type="image/jpeg"),
+        )
+        tree.refresh_from_db()
+        self.assertEqual((tree.image_width, tree.image_height), (30, 20))
+
+    def test_deferred_image_is_not_treated_as_changed(self):
+        buffer = BytesIO()
+        Image.new("RGB", (30, 20)).save(buffer, "JPEG")
+        tree = ChristmasTree.objects.create(
+            category=self.category, title="Елка", slug="elka",
+            image=SimpleUploadedFile("elka.jpg", buffer.getvalue(), content_type="image/jpeg"),
+        )
+        ChristmasTree.objects.filter(pk=tree.pk).update(image_renditions_ready=True)
+        for queryset in (ChristmasTree.objects.only("id", "title"), ChristmasTree.objects.defer("image")):
+            with self.subTest(str(queryset.query)), mock.patch("main.models.schedule_renditions") as schedule:
+                deferred = queryset.get(pk=tree.pk)
+                deferred.title = "Пихта"
+                deferred.save()
+                schedule.assert_not_called()
+                tree.refresh_from_db()
+                self.assertTrue(tree.image_renditions_ready)
+                self.assertEqual((tree.image_width, tree.image_height), (30, 20))
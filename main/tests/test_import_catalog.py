@@ -0,0 +1,95 @@
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+
+from main.cache import CATALOG_NAMESPACE, get_version
+from main.management.commands.import_catalog import Command
+from main.models import Category, ChristmasTree, ChristmasTreeHeight
+
+from .base import TestCase
+
+
+class ImportCatalogTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Елки", slug="trees")
+        ChristmasTree.objects.create(category=category, title="Старое название", slug="old")
+
+    def run_import(self, name, content):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, name)
+            with open(path, "w", encoding="utf-8") as source:
+                source.write(content)
+            stderr = io.StringIO()
+            call_command("import_catalog", path, stdout=io.StringIO(), stderr=stderr)
+        return stderr.getvalue()
+
+    def assert_imported(self):
+        old = ChristmasTree.objects.get(slug="old")
+        self.assertEqual(old.title, "Пихта")
+        self.assertEqual(old.min_price, 2500)
+        new = ChristmasTree.objects.get(slug="new")
+        self.assertEqual(new.category.slug, "pines")
+        self.assertEqual(sorted(new.choose_height.values_list("tree_price", flat=True)), [3000, 4000])
+        self.assertFalse(ChristmasTree.objects.filter(slug="bad").exists())
+        # Отклоненная строка не оставила ни категории, ни размера
+        self.assertFalse(Category.objects.filter(slug="orphan").exists())
+        self.assertEqual(ChristmasTreeHeight.objects.count(), 3)
+
+    def test_csv(self):
+        stderr = self.run_import("catalog.csv", (
+            "slug,title,category,heights\n"
+            "old,Пихта,trees,1.5=2500\n"
+            "new,Сосна,pines,2=3000;2.5=4000\n"
+            "bad,Ель,orphan,3=5000;4\n"
+        ))
+        self.assertIn("Строка 4", stderr)
+        self.assert_imported()
+
+    def test_jsonl(self):
+        rows = [
+            {"slug": "old", "title": "Пихта", "category": "trees", "heights": [{"tree_height": "1.5", "tree_price": 2500}]},
+            {"slug": "new", "title": "Сосна", "category": "pines",
+             "heights": [{"tree_height": "2", "tree_price": 3000}, {"tree_height": "2.5", "tree_price": 4000}]},
+            {"slug": "bad", "title": "Ель", "category": "orphan", "heights": [{"tree_height": "3", "tree_price": 5000}, 4]},
+            {"slug": "bad", "title": "Ель", "category": "orphan", "heights": [{"tree_height": "3"}]},
+            ["not", "an", "object"],
+        ]
+        stderr = self.run_import("catalog.jsonl", "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows))
+        for line_num in (3, 4, 5):
+            self.assertIn(f"Строка {line_num}", stderr)
+        self.assert_imported()
+
+    def test_stdin_keeps_newlines_in_quoted_fields(self):
+        content = 'slug,title,category,description\r\nold,Пихта,trees,"Первая строка\r\nвторая"\r\n'
+        stdin = io.TextIOWrapper(io.BytesIO(content.encode("utf-8-sig")))
+        with mock.patch("sys.stdin", stdin):
+            call_command("import_catalog", "-", stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(ChristmasTree.objects.get(slug="old").description, "Первая строка\r\nвторая")
+
+    def test_failure_mid_import_bumps_catalog_version(self):
+        import_batch = Command._import_batch
+        calls = []
+
+        def failing_import_batch(command, batch):
+            calls.append(batch)
+            if len(calls) == 2:
+                raise RuntimeError("обрыв соединения")
+            import_batch(command, batch)
+
+        version = get_version(CATALOG_NAMESPACE)
+        with self.captureOnCommitCallbacks(execute=True), \
+                mock.patch.object(Command, "_import_batch", failing_import_batch), \
+                self.assertRaises(RuntimeError):
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "catalog.csv")
+                with open(path, "w", encoding="utf-8") as source:
+                    source.write("slug,title,category\nold,Пихта,trees\nnew,Сосна,trees\n")
+                call_command("import_catalog", path, "--batch-size", "1", stdout=io.StringIO())
+        # Первая пачка загружена, и кэш каталога об этом знает
+        self.assertEqual(ChristmasTree.objects.get(slug="old").title, "Пихта")
+        self.assertFalse(ChristmasTree.objects.filter(slug="new").exists())
+        self.assertEqual(get_version(CATALOG_NAMESPACE), version + 1)
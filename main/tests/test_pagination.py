@@ -0,0 +1,48 @@
+import base64
+import json
+
+from django.test import override_settings
+
+from main.models import Category, ChristmasTree, ChristmasTreeHeight
+from main.pagination import InvalidCursor, KeysetPaginator
+
+from .base import BUDGET_TEMPLATES, TestCase
+
+
+def encode_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+@override_settings(TEMPLATES=BUDGET_TEMPLATES)
+class KeysetCursorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Елки", slug="trees")
+        for i in range(5):
+            height = ChristmasTreeHeight.objects.create(tree_height=f"{1 + i}", tree_price=1000 + i * 100)
+            tree = ChristmasTree.objects.create(category=category, title=f"Елка {i}", slug=f"elka-{i}")
+            tree.choose_height.add(height)
+        ChristmasTree.objects.all().refresh_price_range()
+
+    def test_cursor_round_trip(self):
+        paginator = KeysetPaginator(ChristmasTree.objects.all(), "min_price", page_size=2)
+        first = paginator.get_page()
+        second = paginator.get_page(first.next_cursor)
+        self.assertEqual([tree.slug for tree in second], ["elka-2", "elka-3"])
+        self.assertEqual([tree.slug for tree in paginator.get_page(second.prev_cursor)], ["elka-0", "elka-1"])
+
+    def test_crafted_cursor(self):
+        paginator = KeysetPaginator(ChristmasTree.objects.all(), "min_price", page_size=2)
+        for payload in (
+            {"v": "abc", "id": 1, "d": 1},
+            {"v": "abc", "id": 1, "d": "n"},
+            {"v": "1000", "id": 1, "d": 1},
+            {"v": None, "id": 1, "d": "n"},
+            {"v": "1000", "id": "x", "d": "n"},
+        ):
+            with self.subTest(payload=payload), self.assertRaises(InvalidCursor):
+                paginator.get_page(encode_cursor(payload))
+
+        response = self.client.get(
+            "/category/christmastree/", {"sort": "cheap", "cursor": encode_cursor({"v": "abc", "id": 1, "d": 1})})
+        self.assertEqual(response.status_code, 404)
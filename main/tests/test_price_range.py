@@ -0,0 +1,69 @@
+from main.models import Category, ChristmasTree, ChristmasTreeHeight
+
+from .base import TestCase
+from .budgets import ViewBudgetTestCase
+
+
+class PriceRangeSignalTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Елки", slug="trees")
+        self.small = ChristmasTreeHeight.objects.create(tree_height="1.5", tree_price=1000)
+        self.medium = ChristmasTreeHeight.objects.create(tree_height="2", tree_price=2000)
+        self.large = ChristmasTreeHeight.objects.create(tree_height="2.5", tree_price=3000)
+        self.tree = ChristmasTree.objects.create(category=category, title="Пихта", slug="pihta")
+        self.other = ChristmasTree.objects.create(category=category, title="Сосна", slug="sosna")
+
+    def assert_range(self, tree, min_price, max_price, cheapest_height):
+        tree.refresh_from_db()
+        self.assertEqual((tree.min_price, tree.max_price, tree.cheapest_height),
+                         (min_price, max_price, cheapest_height))
+
+    def test_forward_add_remove_clear(self):
+        self.assert_range(self.tree, None, None, None)
+        self.tree.choose_height.add(self.medium, self.large)
+        self.assert_range(self.tree, 2000, 3000, self.medium)
+        self.tree.choose_height.add(self.small)
+        self.assert_range(self.tree, 1000, 3000, self.small)
+        self.tree.choose_height.remove(self.small, self.large)
+        self.assert_range(self.tree, 2000, 2000, self.medium)
+        self.tree.choose_height.clear()
+        self.assert_range(self.tree, None, None, None)
+
+    def test_reverse_add_remove_clear(self):
+        self.tree.choose_height.add(self.medium)
+        self.other.choose_height.add(self.large)
+        self.small.christmastree_set.add(self.tree, self.other)
+        self.assert_range(self.tree, 1000, 2000, self.small)
+        self.assert_range(self.other, 1000, 3000, self.small)
+        self.small.christmastree_set.remove(self.other)
+        self.assert_range(self.other, 3000, 3000, self.large)
+        self.medium.christmastree_set.add(self.other)
+        self.small.christmastree_set.clear()
+        self.assert_range(self.tree, 2000, 2000, self.medium)
+        self.assert_range(self.other, 2000, 3000, self.medium)
+
+    def test_height_price_edit(self):
+        self.tree.choose_height.add(self.small, self.large)
+        self.other.choose_height.add(self.medium)
+        self.small.tree_price = 5000
+        self.small.save()
+        self.assert_range(self.tree, 3000, 5000, self.large)
+        self.assert_range(self.other, 2000, 2000, self.medium)
+
+    def test_height_delete(self):
+        self.tree.choose_height.add(self.small, self.large)
+        self.other.choose_height.add(self.small)
+        self.small.delete()
+        self.assert_range(self.tree, 3000, 3000, self.large)
+        self.assert_range(self.other, None, None, None)
+
+
+class PriceSortBudgetTests(ViewBudgetTestCase):
+    def test_category_by_price(self):
+        category_url = f"/category/christmastree/{self.category.slug}/"
+        # 4: счетчики категорий, роста и сигнатуры для таблицы фасетов (холодный кэш), страница товаров
+        response = self.measure("category_detail by price", category_url, 4, data={"sort": "cheap", "price_max": 3000})
+        prices = [product.min_price for product in response.context["products"]]
+        self.assertTrue(prices)
+        self.assertEqual(prices, sorted(prices))
+        self.assertLessEqual(prices[-1], 3000)
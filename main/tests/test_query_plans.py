@@ -0,0 +1,81 @@
+import re
+
+from django.db import connection
+
+from main.models import (
+    Cart, CartProduct, Category, ChristmasTree, Customer, Order, User, product_registry,
+)
+
+from .base import TestCase
+
+# "SCAN main_cart" без "USING INDEX" - полный проход по таблице (формат EXPLAIN QUERY PLAN в SQLite)
+FULL_SCAN_RE = re.compile(r"\bSCAN (TABLE )?(?P<table>\w+)(?! USING)(?:\s|$)")
+
+
+class HotQueryPlanTests(TestCase):
+    """Горячие запросы корзины, каталога и заказов должны идти по индексам, а не полным проходом таблиц."""
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = [Category.objects.create(name=f"Категория {i}", slug=f"category-{i}") for i in range(5)]
+        ChristmasTree.objects.bulk_create(
+            ChristmasTree(category=categories[i % 5], title=f"Елка {i}", slug=f"tree-{i}",
+                          product_type=f"Тип {i % 7}")
+            for i in range(500)
+        )
+        cls.category = categories[0]
+        cls.customers = []
+        for i in range(20):
+            user = User.objects.create_user(f"user{i}", password="pw")
+            customer = Customer.objects.create(user=user)
+            cls.customers.append(customer)
+            cart = Cart.objects.create(owner=customer, in_order=i % 2 == 0)
+            Order.objects.create(customer=customer, cart=cart)
+        cls.customer = cls.customers[1]
+        cls.cart = Cart.objects.filter(owner=cls.customer).first()
+        cls.tree = ChristmasTree.objects.first()
+        cls.content_type_id = product_registry.get_content_type_id("christmastree")
+        CartProduct.objects.bulk_create(
+            CartProduct(user=customer, cart=Cart.objects.filter(owner=customer).first(),
+                        content_type_id=cls.content_type_id, object_id=tree_id, final_price=100)
+            for customer in cls.customers
+            for tree_id in ChristmasTree.objects.values_list("id", flat=True)[:20]
+        )
+
+    def assertNoFullScan(self, queryset, *tables):
+        if connection.vendor != "sqlite":
+            self.skipTest("Разбор плана запроса написан для EXPLAIN QUERY PLAN SQLite")
+        plan = queryset.explain()
+        scanned = {match.group("table") for match in FULL_SCAN_RE.finditer(plan)}
+        self.assertFalse(scanned & set(tables), f"Полный проход по {scanned & set(tables)}:\n{plan}")
+
+    def test_cart_product_lookup(self):
+        queryset = CartProduct.objects.filter(
+            user=self.customer, cart=self.cart, content_type_id=self.content_type_id, object_id=self.tree.id,
+        )
+        self.assertNoFullScan(queryset, "main_cartproduct")
+
+    def test_open_cart_by_owner(self):
+        queryset = Cart.objects.filter(owner=self.customer, in_order=False)
+        self.assertNoFullScan(queryset, "main_cart")
+
+    def test_open_cart_by_user(self):
+        queryset = Cart.objects.select_related("owner").filter(owner__user=self.customer.user_id, in_order=False)
+        self.assertNoFullScan(queryset, "main_cart", "main_customer")
+
+    def test_trees_by_category_and_type(self):
+        queryset = ChristmasTree.objects.filter(category=self.category, product_type="Тип 0")
+        self.assertNoFullScan(queryset, "main_christmastree")
+
+    def test_trees_by_category_sorted_by_price(self):
+        queryset = ChristmasTree.objects.filter(category=self.category, min_price__isnull=False).order_by(
+            "min_price", "id")[:24]
+        self.assertNoFullScan(queryset, "main_christmastree")
+
+    def test_orders_by_customer(self):
+        queryset = Order.objects.filter(customer=self.customer).order_by("created_at")
+        self.assertNoFullScan(queryset, "main_order")
+
+    def test_orders_by_user(self):
+        queryset = Order.objects.filter(customer__user=self.customer.user_id).order_by("created_at")
+        self.assertNoFullScan(queryset, "main_order", "main_customer")
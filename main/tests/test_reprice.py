@@ -0,0 +1,62 @@
+from main.models import Cart, CartProduct, Category, ChristmasTree, ChristmasTreeHeight, Customer, User
+from main.utils import reprice_heights
+
+from .base import TestCase
+
+
+class RepriceHeightsTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Елки", slug="trees")
+        self.small = ChristmasTreeHeight.objects.create(tree_height="1.5", tree_price=1000)
+        self.large = ChristmasTreeHeight.objects.create(tree_height="2", tree_price=2000)
+        self.tree = ChristmasTree.objects.create(category=category, title="Пихта", slug="pihta")
+        self.tree.choose_height.add(self.small, self.large)
+        other = ChristmasTree.objects.create(category=category, title="Сосна", slug="sosna")
+        other.choose_height.add(self.large)
+        ChristmasTree.objects.all().refresh_price_range()
+
+        self.open_cart = self.make_cart("open")
+        self.open_cart.add_product(self.tree, self.small.pk, qty=2)
+        self.open_cart.add_product(other, self.large.pk)
+        self.ordered_cart = self.make_cart("ordered")
+        self.ordered_cart.add_product(self.tree, self.small.pk)
+        Cart.objects.filter(pk=self.ordered_cart.pk).update(in_order=True)
+
+    @staticmethod
+    def make_cart(username):
+        customer = Customer.objects.create(user=User.objects.create_user(username))
+        return Cart.objects.create(owner=customer)
+
+    def assert_prices(self, small_price):
+        line = CartProduct.objects.get(cart=self.open_cart, object_id=self.tree.pk)
+        self.assertEqual(line.final_price, 2 * small_price)
+        self.open_cart.refresh_from_db()
+        self.assertEqual(self.open_cart.final_price, 2 * small_price + 2000)
+        # Оформленная корзина не меняется
+        line = CartProduct.objects.get(cart=self.ordered_cart)
+        self.assertEqual(line.final_price, 1000)
+        self.ordered_cart.refresh_from_db()
+        self.assertEqual(self.ordered_cart.final_price, 1000)
+
+        self.tree.refresh_from_db()
+        self.assertEqual((self.tree.min_price, self.tree.max_price), (min(small_price, 2000), max(small_price, 2000)))
+
+    def test_reprice_heights(self):
+        self.assertEqual(reprice_heights({self.small.pk: 3000}), (1, 1))
+        self.assert_prices(3000)
+
+    def test_admin_save_model(self):
+        self.client.force_login(User.objects.create_superuser("admin", password="password"))
+        response = self.client.post(f"/admin/main/christmastreeheight/{self.small.pk}/change/", {
+            "tree_height": "1.5", "tree_price": "2500",
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assert_prices(2500)
+
+    def test_admin_action(self):
+        self.client.force_login(User.objects.create_superuser("admin", password="password"))
+        response = self.client.post("/admin/main/christmastreeheight/", {
+            "action": "reprice", "_selected_action": [self.small.pk], "percent": "50",
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assert_prices(1500)
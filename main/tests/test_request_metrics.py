@@ -0,0 +1,102 @@
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from main import middleware
+from main.middleware import RequestHistogram, RequestMetricsMiddleware
+from main.models import Category
+
+from .base import TestCase
+
+
+def catalog_view(request):
+    # Один и тот же запрос дважды - повтор, который должен попасть в duplicates
+    Category.objects.count()
+    Category.objects.count()
+    list(Category.objects.all())
+    return HttpResponse()
+
+
+@override_settings(REQUEST_METRICS_ENABLED=True, REQUEST_METRICS_DUMP_DIR=None)
+class RequestMetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(middleware, "histogram", RequestHistogram())
+        self.histogram = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self):
+        return RequestFactory().get("/category/christmastree/")
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0.0)
+    def test_unsampled(self):
+        response = RequestMetricsMiddleware(catalog_view)(self.request())
+        self.assertNotIn("Server-Timing", response)
+        stats = self.histogram.snapshot()["views"]["<unresolved>"]
+        self.assertEqual((stats["count"], stats["sampled"], stats["sql_count"]), (1, 0, 0))
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=1.0)
+    def test_sampled(self):
+        with self.assertLogs("main.request_metrics") as logs:
+            response = RequestMetricsMiddleware(catalog_view)(self.request())
+        self.assertIn('desc="3 queries"', response["Server-Timing"])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record["path"], record["status"], record["sql_count"]), ("/category/christmastree/", 200, 3))
+        [duplicate] = record["duplicates"]
+        self.assertEqual(duplicate["count"], 2)
+        self.assertIn("COUNT(*)", duplicate["sql"])
+        self.assertEqual(len(duplicate["fingerprint"]), 12)
+        stats = self.histogram.snapshot()["views"]["<unresolved>"]
+        self.assertEqual((stats["count"], stats["sampled"], stats["sql_count"]), (1, 1, 3))
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0.0, REQUEST_METRICS_FLUSH_EVERY=2)
+    def test_flush_every(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(REQUEST_METRICS_DUMP_DIR=directory):
+            metrics = RequestMetricsMiddleware(catalog_view)
+            path = os.path.join(directory, f"request_metrics.{os.getpid()}.json")
+            metrics(self.request())
+            self.assertFalse(os.path.exists(path))
+            metrics(self.request())
+            with open(path, encoding="utf-8") as dump_file:
+                self.assertEqual(json.load(dump_file)["views"]["<unresolved>"]["count"], 2)
+            # Счетчик сбрасывается после сохранения: следующий файл - еще через два запроса
+            os.remove(path)
+            metrics(self.request())
+            self.assertFalse(os.path.exists(path))
+
+
+class RequestMetricsCommandTests(TestCase):
+    def test_merges_process_dumps(self):
+        buckets_ms = [5, 10]
+        dumps = {
+            101: {"catalog": {"count": 2, "total_ms": 10.0, "max_ms": 8.0, "buckets": [1, 1, 0],
+                              "sampled": 1, "sql_count": 3, "sql_ms": 1.5}},
+            102: {"catalog": {"count": 3, "total_ms": 60.0, "max_ms": 40.0, "buckets": [0, 1, 2],
+                              "sampled": 2, "sql_count": 4, "sql_ms": 2.0},
+                  "cart": {"count": 1, "total_ms": 3.0, "max_ms": 3.0, "buckets": [1, 0, 0],
+                           "sampled": 0, "sql_count": 0, "sql_ms": 0.0}},
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            for pid, views in dumps.items():
+                with open(os.path.join(directory, f"request_metrics.{pid}.json"), "w", encoding="utf-8") as dump:
+                    json.dump({"pid": pid, "buckets_ms": buckets_ms, "views": views}, dump)
+            stdout = io.StringIO()
+            call_command("request_metrics", dir=directory, json=True, stdout=stdout)
+            summary = json.loads(stdout.getvalue())
+
+            table = io.StringIO()
+            call_command("request_metrics", dir=directory, stdout=table)
+
+        catalog = summary["views"]["catalog"]
+        self.assertEqual((catalog["count"], catalog["total_ms"], catalog["max_ms"]), (5, 70.0, 40.0))
+        self.assertEqual(catalog["buckets"], [1, 2, 2])
+        self.assertEqual((catalog["sampled"], catalog["sql_count"]), (3, 7))
+        self.assertEqual(summary["views"]["cart"]["count"], 1)
+        # Таблица отсортирована по суммарному времени: catalog первым
+        rows = table.getvalue().splitlines()[1:]
+        self.assertEqual([row.split()[0] for row in rows], ["catalog", "cart"])
@@ -0,0 +1,85 @@
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from main import routers
+from main.cache import CATALOG_NAMESPACE, bump_version
+from main.middleware import ReplicaRoutingMiddleware
+from main.models import Cart, Category, ChristmasTree, Customer, Order
+from main.routers import ReplicaRouter
+
+from .base import SimpleTestCase
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    """Маршрутизация без запросов в БД: SimpleTestCase, чтобы не было открытой транзакции тестов."""
+
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.router.replica = "replica"
+
+    def test_catalog_models(self):
+        self.assertTrue(routers.is_catalog_model(ChristmasTree))
+        self.assertTrue(routers.is_catalog_model(Category))
+        self.assertTrue(routers.is_catalog_model(ChristmasTree.choose_height.through))
+        self.assertFalse(routers.is_catalog_model(Cart))
+        self.assertFalse(routers.is_catalog_model(Customer.orders.through))
+
+    def test_reads_outside_request_use_default(self):
+        self.assertIsNone(self.router.db_for_read(ChristmasTree))
+
+    def test_pinned_after_write(self):
+        token = routers.begin_request(pinned=False)
+        try:
+            self.assertEqual(self.router.db_for_read(ChristmasTree), "replica")
+            self.assertIsNone(self.router.db_for_read(Order))
+            self.router.db_for_write(Cart)
+            self.assertIsNone(self.router.db_for_read(ChristmasTree))
+        finally:
+            state = routers.end_request(token)
+        self.assertTrue(state.wrote)
+
+    @override_settings(READ_REPLICA_ALIAS="default")
+    def test_middleware_pin_cookie(self):
+        router = self.router
+        seen = []
+
+        def view(request):
+            seen.append(router.db_for_read(ChristmasTree))
+            if request.GET.get("write"):
+                router.db_for_write(Cart)
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(view)
+        factory = RequestFactory()
+        response = middleware(factory.get("/"))
+        self.assertNotIn("db_primary", response.cookies)
+        response = middleware(factory.get("/", {"write": 1}))
+        self.assertIn("db_primary", response.cookies)
+
+        request = factory.get("/")
+        request.COOKIES["db_primary"] = "1"
+        middleware(request)
+        middleware(factory.post("/"))
+        middleware(factory.get("/admin/"))
+        self.assertEqual(seen, ["replica", "replica", None, None, None])
+
+    @override_settings(READ_REPLICA_ALIAS="default", REPLICA_PIN_SECONDS=15)
+    def test_reads_after_version_bump_use_default(self):
+        # Пока реплика может отставать от смены каталога, заполнять кэш под новой версией с нее нельзя
+        router = self.router
+        seen = []
+
+        def view(request):
+            seen.append(router.db_for_read(ChristmasTree))
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(view)
+        factory = RequestFactory()
+        middleware(factory.get("/"))
+        bump_version(CATALOG_NAMESPACE)
+        middleware(factory.get("/"))
+        with override_settings(REPLICA_PIN_SECONDS=0):
+            ReplicaRoutingMiddleware(view)(factory.get("/"))
+        self.assertEqual(seen, ["replica", None, "replica"])
@@ -0,0 +1,71 @@
+from main.models import Category, ChristmasTree
+from main.search import FallbackSearchBackend, search_index
+
+from .base import TestCase
+from .budgets import ViewBudgetTestCase
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Елки", slug="trees")
+
+    def make_tree(self, slug, title, description=""):
+        return ChristmasTree.objects.create(category=self.category, slug=slug, title=title, description=description)
+
+    def ids(self, query, backend=None):
+        return [object_id for _, object_id in (backend or search_index).search(query)]
+
+    def test_title_hit_ranks_above_description_hit(self):
+        in_description = self.make_tree("a", "Сосна", "Пушистая, как пихта")
+        in_title = self.make_tree("b", "Пихта", "Хвоя не осыпается")
+        self.assertEqual(self.ids("пихта"), [in_title.pk, in_description.pk])
+
+    def test_prefix_and_yo_normalization(self):
+        tree = self.make_tree("a", "Ёлка пушистая")
+        self.assertEqual(self.ids("елк"), [tree.pk])
+        self.assertEqual(self.ids("ЁЛКА"), [tree.pk])
+
+    def test_index_follows_save(self):
+        tree = self.make_tree("a", "Пихта")
+        tree.title = "Сосна"
+        tree.save()
+        self.assertEqual(self.ids("пихта"), [])
+        self.assertEqual(self.ids("сосна"), [tree.pk])
+
+    def test_save_without_search_fields_keeps_index(self):
+        tree = self.make_tree("a", "Пихта")
+        with self.assertNumQueries(1):
+            tree.save(update_fields=["slug"])
+        self.assertEqual(self.ids("пихта"), [tree.pk])
+
+    def test_index_follows_delete(self):
+        tree = self.make_tree("a", "Пихта")
+        kept = self.make_tree("b", "Пихта колючая")
+        tree.delete()
+        self.assertEqual(self.ids("пихта"), [kept.pk])
+
+    def test_rebuild(self):
+        tree = self.make_tree("a", "Пихта")
+        ChristmasTree.objects.filter(pk=tree.pk).update(title="Сосна")
+        self.assertEqual(self.ids("сосна"), [])
+        self.assertEqual(search_index.rebuild(), 1)
+        self.assertEqual(self.ids("сосна"), [tree.pk])
+        self.assertEqual(self.ids("пихта"), [])
+
+    def test_fallback_backend(self):
+        # LIKE в SQLite без учета регистра только для ASCII, поэтому данные в нижнем регистре
+        first = self.make_tree("a", "пихта", "пушистая")
+        second = self.make_tree("b", "сосна", "пушистая пихта")
+        self.make_tree("c", "ель")
+        backend = FallbackSearchBackend()
+        self.assertEqual(self.ids("пихта", backend), [second.pk, first.pk])
+        self.assertEqual(self.ids("пушистая сосна", backend), [second.pk])
+        self.assertEqual([object_id for _, object_id in backend.search("пихта", limit=1, offset=1)], [first.pk])
+        self.assertEqual(backend.search("пихта", ct_model="other"), [])
+        self.assertEqual(backend.search("  "), [])
+
+
+class SearchBudgetTests(ViewBudgetTestCase):
+    def test_search_views(self):
+        self.measure("search", "/search/", 4, data={"q": "пушистая елка"})
+        self.measure("search last page", "/search/", 4, data={"q": "елка", "page": 80})
@@ -0,0 +1,82 @@
+from unittest import skipUnless
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from main.models import Category
+from main.sqlite import immediate_atomic, retry_on_lock
+
+from .base import SimpleTestCase, TestCase, TransactionTestCase
+
+
+@override_settings(SQLITE_PROFILE=True, SQLITE_LOCK_RETRIES=2, SQLITE_LOCK_RETRY_DELAY=0)
+class RetryOnLockTests(SimpleTestCase):
+    def make_func(self, *errors):
+        calls = []
+
+        @retry_on_lock
+        def func():
+            calls.append(1)
+            if len(calls) <= len(errors):
+                raise errors[len(calls) - 1]
+            return len(calls)
+        return func, calls
+
+    def test_retries_lock_errors(self):
+        func, _ = self.make_func(OperationalError("database is locked"), OperationalError("database is locked"))
+        with self.assertLogs("main.sqlite", "WARNING"):
+            self.assertEqual(func(), 3)
+
+    def test_gives_up_after_retries(self):
+        func, calls = self.make_func(*[OperationalError("database is locked")] * 3)
+        with self.assertLogs("main.sqlite", "WARNING"), self.assertRaises(OperationalError):
+            func()
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_not_retried(self):
+        func, calls = self.make_func(OperationalError("no such table: main_cart"))
+        with self.assertRaises(OperationalError):
+            func()
+        self.assertEqual(len(calls), 1)
+
+    @override_settings(SQLITE_PROFILE=False)
+    def test_disabled_without_profile(self):
+        func, calls = self.make_func(OperationalError("database is locked"))
+        with self.assertRaises(OperationalError):
+            func()
+        self.assertEqual(len(calls), 1)
+
+
+@skipUnless(connection.vendor == "sqlite" and settings.SQLITE_PROFILE, "профиль SQLite выключен")
+class SQLiteProfileTests(TestCase):
+    def test_pragmas_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute("PRAGMA synchronous")
+            # 1 - NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+@skipUnless(connection.vendor == "sqlite", "BEGIN IMMEDIATE есть только в SQLite")
+@override_settings(SQLITE_PROFILE=True)
+class ImmediateAtomicTests(TransactionTestCase):
+    def begin_statements(self, atomic):
+        with CaptureQueriesContext(connection) as queries:
+            with atomic():
+                with immediate_atomic():
+                    Category.objects.create(name="Елки", slug="trees")
+        return [query["sql"] for query in queries if query["sql"].startswith("BEGIN")]
+
+    def test_outer_block_begins_immediate(self):
+        self.assertEqual(self.begin_statements(immediate_atomic), ["BEGIN IMMEDIATE"])
+        self.assertIsNone(connection.transaction_mode)
+
+    def test_other_transactions_stay_deferred(self):
+        self.assertEqual(self.begin_statements(transaction.atomic), ["BEGIN"])
+
+    @override_settings(SQLITE_PROFILE=False)
+    def test_disabled_without_profile(self):
+        self.assertEqual(self.begin_statements(immediate_atomic), ["BEGIN"])
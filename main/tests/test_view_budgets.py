@@ -0,0 +1,58 @@
+import uuid
+
+from main.models import Cart, CartProduct, ChristmasTree, Order
+
+from .budgets import ViewBudgetTestCase
+
+
+class ViewBudgetTests(ViewBudgetTestCase):
+    """Бюджеты числа SQL-запросов страниц каталога, корзины, заказов, входа и админки."""
+
+    def test_catalog_views(self):
+        tree_url = f"/products/christmastree/{self.tree.slug}/"
+        category_url = f"/category/christmastree/{self.category.slug}/"
+        self.measure("base", "/", 4)
+        self.measure("base (warm cache)", "/", 0, warm=True)
+        self.measure("product_detail", tree_url, 6)
+        self.measure("product_detail (warm cache)", tree_url, 0, warm=True)
+        self.measure("category_detail", "/category/christmastree/", 3)
+        self.measure("category_detail subcategory", category_url, 3, data={"tree_type": "Тип 0"})
+        self.measure("category_detail (warm cache)", category_url, 0, warm=True)
+        self.measure("category_detail authenticated", category_url, 5, user=self.user)
+
+    def test_cart_views(self):
+        tree = ChristmasTree.objects.get(slug="tree-1")
+        self.measure("cart", "/cart/", 11, user=self.user)
+        self.measure("cart anonymous", "/cart/", 2)
+        self.measure("cart_widget", "/cart/widget/", 6, user=self.user)
+        self.measure("add_to_cart", f"/add-to-cart/christmastree/{self.tree.slug}/", 15,
+                     data={"tree_height_id": self.height.id}, user=self.user, status=302)
+        self.measure("change_qty", f"/change-qty/christmastree/{tree.slug}/", 13,
+                     method="post", data={"qty": 3}, user=self.user, status=302)
+        self.measure("delete_from_cart", f"/remove-from-cart/christmastree/{tree.slug}/", 14,
+                     user=self.user, status=302)
+        self.measure("add_to_cart anonymous", f"/add-to-cart/christmastree/{self.tree.slug}/", 8,
+                     data={"tree_height_id": self.height.id}, status=302)
+
+    def test_checkout_and_order_views(self):
+        self.measure("checkout form", "/checkout/", 4, user=self.user)
+        data = {
+            "first_name": "Иван", "last_name": "Иванов", "phone": "89270000000", "address": "Самара",
+            "buying_type": Order.BUYING_TYPE_SELF, "comment": "", "idempotency_key": uuid.uuid4(),
+        }
+        self.measure("checkout", "/checkout/", 20, method="post", user=self.user, status=302, data=data)
+        self.measure("list_orders", "/orders/", 4, user=self.user)
+        self.measure("order detail", f"/order/{self.order.pk}", 4, user=self.user)
+
+    def test_auth_and_admin_views(self):
+        self.measure("login", "/login/", 0)
+        self.measure("register", "/register/", 0)
+        self.measure("admin index", "/admin/", 6, user=self.superuser)
+        self.measure("admin carts", "/admin/main/cart/", 10, user=self.superuser)
+        self.measure("admin cart products", "/admin/main/cartproduct/", 10, user=self.superuser)
+        self.measure("admin cart product", f"/admin/main/cartproduct/{CartProduct.objects.first().pk}/change/", 14,
+                     user=self.superuser)
+        self.measure("admin cart", f"/admin/main/cart/{Cart.objects.first().pk}/change/", 12, user=self.superuser)
+        self.measure("admin product search", "/admin/main/christmastree/", 8, data={"q": "Елка 5"},
+                     user=self.superuser)
+        self.measure("admin orders", "/admin/main/order/", 10, user=self.superuser)
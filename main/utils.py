@@ -1,11 +1,60 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+
+from main.cache import CATALOG_NAMESPACE, bump_version_on_commit
+from main.models import Cart, CartProduct, ChristmasTree, ChristmasTreeChoices, ChristmasTreeHeight
 
 
 def recalc_cart(cart):
+    """Полная сверка итогов корзины по ее товарам. В обычном потоке итоги меняются дельтами (Cart.apply_totals_delta)."""
     cart_data = cart.products.aggregate(models.Sum("final_price"), models.Count("id"))
     if cart_data.get("final_price__sum"):
         cart.final_price = cart_data["final_price__sum"]
     else:
         cart.final_price = 0
     cart.total_products = cart_data["id__count"]
-    cart.save()
+    cart.save(update_fields=["final_price", "total_products"])
+
+
+def apply_percent(price, percent):
+    return (price * (1 + Decimal(percent) / 100)).quantize(Decimal("0.01"))
+
+
+@transaction.atomic
+def reprice_heights(prices):
+    """
+    Новые цены размеров елок {id ChristmasTreeHeight: цена} с пересчетом диапазона цен елок и открытых корзин.
+    Строки корзин и итоги корзин обновляются set-based UPDATE'ами (без цикла по строкам), оформленные
+    корзины (in_order=True) и заказы не меняются. Возвращает (число строк корзин, число корзин).
+    """
+    if not prices:
+        return 0, 0
+    height_ids = list(prices)
+    ChristmasTreeHeight.objects.filter(pk__in=height_ids).update(tree_price=models.Case(
+        *(models.When(pk=pk, then=models.Value(price)) for pk, price in prices.items()),
+        output_field=models.DecimalField(max_digits=9, decimal_places=2),
+    ))
+    ChristmasTree.objects.filter(choose_height__in=height_ids).refresh_price_range()
+
+    open_carts = Cart.objects.filter(in_order=False, products__tree_in_cart__tree_height_id__in=height_ids)
+    # Корзины блокируются до пересчета, чтобы оформление заказа не прошло между двумя UPDATE
+    # (на SQLite запись и так сериализована, select_for_update там игнорируется)
+    list(open_carts.select_for_update(of=("self",)).values_list("pk", flat=True))
+
+    unit_price = ChristmasTreeChoices.objects.filter(cart_product=models.OuterRef("pk")).values(
+        "tree_height__tree_price")[:1]
+    lines = CartProduct.objects.filter(
+        cart__in=open_carts.values("pk"), tree_in_cart__tree_height_id__in=height_ids
+    ).update(final_price=models.F("qty") * models.Subquery(unit_price))
+
+    cart_total = Cart.products.through.objects.filter(cart_id=models.OuterRef("pk")).values("cart_id").annotate(
+        total=models.Sum("cartproduct__final_price")).values("total")
+    carts = Cart.objects.filter(pk__in=open_carts.values("pk")).update(final_price=Coalesce(
+        models.Subquery(cart_total, output_field=models.DecimalField(max_digits=9, decimal_places=2)),
+        models.Value(Decimal(0)),
+    ))
+    # update() не вызывает сигналы сохранения, кэш каталога сбрасываем сами (после коммита)
+    bump_version_on_commit(CATALOG_NAMESPACE)
+    return lines, carts
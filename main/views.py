@@ -1,23 +1,32 @@
+import uuid
+from decimal import Decimal, InvalidOperation
+
 from django.contrib.auth.forms import AuthenticationForm
+from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import LoginView
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.shortcuts import render
-from django.contrib.contenttypes.models import ContentType
 from django.contrib import messages
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponseRedirect
 from django.urls import reverse_lazy
 from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
 from django.views.generic import DetailView, View, CreateView, FormView, ListView
 
+from .cart import get_cart_lines
+from .facets import FACETS, filter_by_facets, get_facets, get_selected_facets
+from .pagination import InvalidCursor, KeysetPaginator, get_catalog_page_size
 from .forms import LoginUserForm, RegisterUserForm, OrderForm
-from .models import Category, LatestProducts, Customer, Cart, CartProduct, ChristmasTree, ChristmasTreeChoices, Order
-from .mixins import CategoryDetailMixin, CartMixin
+from .models import Cart, Category, Customer, LatestProducts, Order
+from .mixins import (
+    AnonymousPageCacheMixin, CategoryDetailMixin, CartMixin, LockRetryMixin, get_product_model_or_404,
+)
+from .search import search_index
+from .sqlite import immediate_atomic
 
 # from .forms import OrderForm
-from .utils import recalc_cart
 
 
-class BaseView(CartMixin, View):
+class BaseView(AnonymousPageCacheMixin, CartMixin, View):
     def get(self, request, *args, **kwargs):
         categories = Category.objects.get_categories_for_left_sidebar()
         products = LatestProducts.objects.get_products_for_main_page(
@@ -27,7 +36,7 @@ class BaseView(CartMixin, View):
         context = {
             'categories': categories,
             'products': products,
-            'cart': self.cart
+            'cart': self.lazy_cart
         }
 
         return render(request, 'html/test.html', context)
@@ -44,13 +53,9 @@ class RegisterUserView(CreateView):
     success_url = reverse_lazy('login')
 
 
-class ProductDetailView(CartMixin, CategoryDetailMixin, DetailView):
-    CT_MODEL_MODEL_CLASS = {
-        'christmastree': ChristmasTree,
-    }
-
+class ProductDetailView(AnonymousPageCacheMixin, CartMixin, CategoryDetailMixin, DetailView):
     def dispatch(self, request, *args, **kwargs):
-        self.model = self.CT_MODEL_MODEL_CLASS[kwargs["ct_model"]]
+        self.model = get_product_model_or_404(kwargs["ct_model"])
         self.queryset = self.model._base_manager.all()
         return super().dispatch(request, *args, **kwargs)
 
@@ -61,14 +66,14 @@ class ProductDetailView(CartMixin, CategoryDetailMixin, DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['ct_model'] = self.model._meta.model_name
-        context['cart'] = self.cart
+        context['cart'] = self.lazy_cart
         if context['ct_model'] == "christmastree":
             context['tree_choices'] = list(context['product'].choose_height.all())
 
         return context
 
 
-class CategoryDetailView(CartMixin, View):
+class CategoryDetailView(AnonymousPageCacheMixin, CartMixin, View):
     """
     Фильтрация товаров по категориям.
     Парметры ссылки:
@@ -76,39 +81,140 @@ class CategoryDetailView(CartMixin, View):
     slug - второй уровень, подкатегория. Создается в БД и привязывается к продукту
 
     GET-параметры:
-    tree_type - тип дерева (поле product_type в таблице продукты)
+    product_type, height, price, from_place - фасеты (main.facets.FACETS), параметр можно повторять:
+           значения одного фасета объединяются через ИЛИ, разные фасеты - через И
+    tree_type - тип дерева, старое имя фасета product_type
+    price_min, price_max - есть размер дороже price_min / дешевле price_max (поля max_price / min_price)
+    sort - порядок товаров, ключ из SORT_ORDERINGS (по умолчанию new). При сортировке по цене
+           елки без размеров (min_price = NULL) не показываются
+    cursor - курсор страницы из next_cursor / prev_cursor контекста
+    page_size - размер страницы (по умолчанию settings.CATALOG_PAGE_SIZE, не больше CATALOG_MAX_PAGE_SIZE)
 
     Примеры:
     /category/christmastree/eli/?tree_type=Ель прикольная
     /category/christmastree
     /category/christmastree/pychta
+    /category/christmastree/pychta/?sort=old&cursor=eyJ2Ij...
+    /category/christmastree/pychta/?sort=cheap&price_max=3000
+    /category/christmastree/pychta/?height=1.5&height=2&price=2000-4000
+
+    Контекст фасетов: facets - [{name, title, values: [{value, label, count, selected}]}], счетчики
+    посчитаны с учетом остальных выбранных фасетов (без price_min/price_max); facets_total - число товаров под всеми фильтрами;
+    selected_facets - {фасет: множество значений}.
     """
 
+    SORT_ORDERINGS = {
+        'new': '-id',
+        'old': 'id',
+        'cheap': 'min_price',
+        'expensive': '-max_price',
+    }
+    page_cache_params = ('tree_type', *(name for name, _ in FACETS), 'price_min', 'price_max', 'sort', 'cursor',
+                         'page_size')
+
+    def filter_by_price(self, products, model):
+        if not hasattr(model, 'min_price'):
+            return products
+        for param, lookup in (('price_min', 'max_price__gte'), ('price_max', 'min_price__lte')):
+            try:
+                value = Decimal(self.request.GET[param])
+            except (KeyError, InvalidOperation):
+                continue
+            if value.is_finite():
+                products = products.filter(**{lookup: value})
+        return products
+
+    def get_page_size(self):
+        return get_catalog_page_size(self.request)
+
     def get(self, request, *args, **kwargs):
         context = {}
         ct_model, subcategory_slug = kwargs.get('ct_model'), kwargs.get('slug')
         categories = Category.objects.get_categories_for_left_sidebar()
-        content_type = ContentType.objects.get(model=ct_model)
+        model = get_product_model_or_404(ct_model)
         if subcategory_slug:
-            products = content_type.model_class().objects.filter(category__slug=subcategory_slug)
-            try:
-                tree_type = request.GET["tree_type"]
-                products = products.filter(product_type=tree_type)
-                context['tree_type'] = tree_type
-            except KeyError:
-                pass
+            products = model.objects.filter(category__slug=subcategory_slug)
         else:
-            products = content_type.model_class().objects.all()
+            products = model.objects.all()
+        if request.GET.get('tree_type'):
+            context['tree_type'] = request.GET['tree_type']
+        selected_facets = get_selected_facets(request.GET)
+        products = filter_by_facets(products, selected_facets)
+        context['facets'], context['facets_total'] = get_facets(ct_model, model, subcategory_slug, selected_facets)
+        context['selected_facets'] = selected_facets
         context['categories'] = categories
-        context['cart'] = self.cart
+        context['cart'] = self.lazy_cart
 
         context['ct_model'] = ct_model
         context['slug'] = subcategory_slug
-        context['products'] = list(products)
+
+        products = self.filter_by_price(products, model)
+
+        sort = request.GET.get('sort', 'new')
+        ordering = self.SORT_ORDERINGS.get(sort)
+        if ordering is None or not hasattr(model, ordering.lstrip('-')):
+            sort, ordering = 'new', self.SORT_ORDERINGS['new']
+        if ordering.lstrip('-') != 'id':
+            # KeysetPaginator не умеет NULL в поле сортировки
+            products = products.filter(**{f"{ordering.lstrip('-')}__isnull": False})
+        paginator = KeysetPaginator(products, ordering, self.get_page_size())
+        try:
+            page = paginator.get_page(request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404("Некорректный курсор страницы")
+        context['sort'] = sort
+        context['products'] = page.object_list
+        context['next_cursor'] = page.next_cursor
+        context['prev_cursor'] = page.prev_cursor
         return render(request, 'PLACEHOLDER_CATEGORY.html', context)
 
 
-class AddToCartView(CartMixin, View):
+class SearchView(CartMixin, View):
+    """
+    Поиск по товарам через полнотекстовый индекс (main.search): название, описание, тип, место.
+    Результаты отсортированы по релевантности. Страница кэшем не покрывается: запросы произвольные,
+    а выборка из индекса и так стоит один запрос плюс по одному на модель товара.
+
+    GET-параметры:
+    q - поисковая строка
+    ct_model - искать только среди товаров этой модели
+    page - номер страницы, с 1
+    page_size - размер страницы (по умолчанию settings.CATALOG_PAGE_SIZE, не больше CATALOG_MAX_PAGE_SIZE)
+
+    Пример:
+    /search/?q=пихта&page=2
+    """
+
+    def get_page_size(self):
+        return get_catalog_page_size(self.request)
+
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get('q', '').strip()
+        ct_model = request.GET.get('ct_model') or None
+        if ct_model:
+            get_product_model_or_404(ct_model)
+        try:
+            page = max(1, int(request.GET.get('page', 1)))
+        except ValueError:
+            page = 1
+        page_size = self.get_page_size()
+        # Берем на одну запись больше, чтобы узнать о следующей странице без COUNT
+        products = search_index.search_objects(query, ct_model, limit=page_size + 1,
+                                               offset=(page - 1) * page_size)
+        context = {
+            'query': query,
+            'ct_model': ct_model,
+            'products': products[:page_size],
+            'page': page,
+            'next_page': page + 1 if len(products) > page_size else None,
+            'prev_page': page - 1 if page > 1 else None,
+            'categories': Category.objects.get_categories_for_left_sidebar(),
+            'cart': self.lazy_cart,
+        }
+        return render(request, 'PLACEHOLDER_SEARCH.html', context)
+
+
+class AddToCartView(LockRetryMixin, CartMixin, View):
     """
     Добавление в корзину.
     Парметры ссылки:
@@ -121,63 +227,38 @@ class AddToCartView(CartMixin, View):
     /add-to-cart/christmastree/elka-from-web/?tree_height_id=2
     """
 
-    @transaction.atomic
+    @immediate_atomic
     def get(self, request, *args, **kwargs):
         ct_model, product_slug = kwargs.get("ct_model"), kwargs.get("slug")
-        content_type = ContentType.objects.get(model=ct_model)
-        product = content_type.model_class().objects.get(slug=product_slug)
-        cart_product, created = CartProduct.objects.get_or_create(
-            user=self.cart.owner,
-            cart=self.cart,
-            content_type=content_type,
-            object_id=product.id,
-        )
-        if created:
-            if ct_model == "christmastree":
-                tree_height_id = request.GET["tree_height_id"]
-                ChristmasTreeChoices.objects.create(tree=product, cart_product=cart_product,
-                                                    tree_height_id=tree_height_id)
-            self.cart.products.add(cart_product)
-        recalc_cart(self.cart)
-        print(self.cart)
+        product = get_product_model_or_404(ct_model).objects.get(slug=product_slug)
+        tree_height_id = request.GET["tree_height_id"] if ct_model == "christmastree" else None
+        self.get_or_create_cart().add_product(product, tree_height_id)
         messages.add_message(request, messages.INFO, "Товар успешно добавлен")
 
         return HttpResponseRedirect("/cart/")
 
 
-class DeleteFromCartView(CartMixin, View):
+class DeleteFromCartView(LockRetryMixin, CartMixin, View):
+    @immediate_atomic
     def get(self, request, *args, **kwargs):
+        if self.cart is None:
+            raise Http404("Корзина пуста")
         ct_model, product_slug = kwargs.get("ct_model"), kwargs.get("slug")
-        content_type = ContentType.objects.get(model=ct_model)
-        product = content_type.model_class().objects.get(slug=product_slug)
-        cart_product = CartProduct.objects.get(
-            user=self.cart.owner,
-            cart=self.cart,
-            content_type=content_type,
-            object_id=product.id,
-        )
-        self.cart.products.remove(cart_product)
-        cart_product.delete()
-        recalc_cart(self.cart)
+        product = get_product_model_or_404(ct_model).objects.get(slug=product_slug)
+        self.cart.remove_product(product)
         messages.add_message(request, messages.INFO, "Товар успешно удален")
         return HttpResponseRedirect("/cart/")
 
 
-class ChangeQTYView(CartMixin, View):
+class ChangeQTYView(LockRetryMixin, CartMixin, View):
+    @immediate_atomic
     def post(self, request, *args, **kwargs):
+        if self.cart is None:
+            raise Http404("Корзина пуста")
         ct_model, product_slug = kwargs.get("ct_model"), kwargs.get("slug")
-        content_type = ContentType.objects.get(model=ct_model)
-        product = content_type.model_class().objects.get(slug=product_slug)
-        cart_product = CartProduct.objects.get(
-            user=self.cart.owner,
-            cart=self.cart,
-            content_type=content_type,
-            object_id=product.id,
-        )
+        product = get_product_model_or_404(ct_model).objects.get(slug=product_slug)
         qty = int(request.POST.get("qty"))
-        cart_product.qty = qty
-        cart_product.save()
-        recalc_cart(self.cart)
+        self.cart.change_qty(product, qty)
         messages.add_message(request, messages.INFO, "Кол-во успешно изменено")
         # print(self.cart)
         return HttpResponseRedirect('/cart/')
@@ -185,50 +266,90 @@ class ChangeQTYView(CartMixin, View):
 
 class CartView(CartMixin, View):
     """
-    Для получения ct_model для продукта, надо обрпться к iter_elem.content_type.model при итерации по
-    Чтобы получить данные о выбранном размере елки надо вызвать get_tree_height_object при итерации по cart.products.all
+    Строки корзины передаются в шаблон готовыми в cart_lines (см. main.cart.CartLine):
+    title, url, ct_model, qty, height (ChristmasTreeHeight или None), unit_price, line_total.
+    Все строки загружаются фиксированным числом запросов, обращаться к cart.products.all в шаблоне не нужно.
     """
 
     def get(self, request, *args, **kwargs):
         categories = Category.objects.get_categories_for_left_sidebar()
         context = {
-            'cart': self.cart,
+            'cart': self.lazy_cart,
+            'cart_lines': get_cart_lines(self.cart),
             'categories': categories
         }
-        print(context)
         return render(request, 'PLACEHOLDER_CART.html', context)
 
 
-class CheckoutView(CartMixin, FormView):
+class CartWidgetView(CartMixin, View):
+    """
+    Фрагмент мини-корзины. Не кэшируется: кэшированные страницы (AnonymousPageCacheMixin) подгружают его
+    отдельным запросом, как главная страница (html/test.html).
+    """
+
+    def get(self, request, *args, **kwargs):
+        return render(request, 'html/cart_widget.html', {'cart': self.cart})
+
+
+class CheckoutView(LockRetryMixin, LoginRequiredMixin, CartMixin, FormView):
+    """
+    Оформление заказа доступно только вошедшим пользователям: при входе анонимная корзина
+    из сессии переносится в БД (см. main.cart.merge_session_cart).
+
+    Форма несет idempotency_key: повторная отправка той же формы (двойной клик, повтор после таймаута)
+    не создает второй заказ. Транзакция держит блокировку три запроса: UPDATE корзины с условием
+    in_order = false (блокирует строку корзины и заодно проверяет, что ее еще не оформили), INSERT заказа
+    и INSERT связи с покупателем. Описание заказа составляется после коммита (Order.save).
+    """
+
     template_name = 'html/checkout_test.html'
     form_class = OrderForm
     success_url = '/'
 
+    def get_initial(self):
+        return {**super().get_initial(), 'idempotency_key': uuid.uuid4()}
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['cart'] = self.cart
+        context['cart'] = self.lazy_cart
         return context
 
-    @transaction.atomic()
     def form_valid(self, form):
-        customer = Customer.objects.get(user=self.request.user)
+        key = form.cleaned_data['idempotency_key']
+        if self._is_duplicate(key):
+            return HttpResponseRedirect(self.get_success_url())
+        if self.cart is None:
+            return HttpResponseRedirect('/cart/')
+
         new_order = form.save(commit=False)
-        new_order.customer = customer
-        new_order.first_name = form.cleaned_data['first_name']
-        new_order.last_name = form.cleaned_data['last_name']
-        new_order.phone = form.cleaned_data['phone']
-        new_order.address = form.cleaned_data['address']
-        new_order.buying_type = form.cleaned_data['buying_type']
-        # new_order.order_date = form.cleaned_data['order_date']
-        new_order.comment = form.cleaned_data['comment']
-        self.cart.in_order = True
-        self.cart.save()
+        new_order.customer = self.cart.owner
         new_order.cart = self.cart
-        new_order.save()
-        customer.orders.add(new_order)
+        new_order.idempotency_key = key
+        try:
+            with immediate_atomic():
+                ordered = Cart.objects.filter(pk=self.cart.pk, in_order=False).update(in_order=True)
+                if ordered:
+                    new_order.save()
+                    Customer.orders.through.objects.create(customer=new_order.customer, order=new_order)
+        except IntegrityError:
+            # Заказ с этим ключом успел создать параллельный запрос (unique); остальные нарушения - ошибка
+            if self._is_duplicate(key):
+                return HttpResponseRedirect(self.get_success_url())
+            raise
+        if not ordered:
+            # Корзину уже оформили: той же формой - это повтор, иначе корзины больше нет
+            if self._is_duplicate(key):
+                return HttpResponseRedirect(self.get_success_url())
+            return HttpResponseRedirect('/cart/')
         messages.add_message(self.request, messages.INFO, 'Спасибо за заказ! Менеджер с Вами свяжется')
         return super().form_valid(form)
 
+    def _is_duplicate(self, key):
+        if not Order.objects.filter(idempotency_key=key, customer__user=self.request.user).exists():
+            return False
+        messages.add_message(self.request, messages.INFO, 'Заказ уже оформлен')
+        return True
+
 
 class OrderListView(CartMixin, ListView, ):
     model = Order
@@ -237,8 +358,7 @@ class OrderListView(CartMixin, ListView, ):
 
     def get_context_data(self, **kwargs):
         context = super(ListView, self).get_context_data(**kwargs)
-        context['cart'] = self.cart
-        print(context)
+        context['cart'] = self.lazy_cart
         return context
 
     def get_queryset(self):
@@ -252,8 +372,7 @@ class OrderDetailView(CartMixin, DetailView, ):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['cart'] = self.cart
-        print(context)
+        context['cart'] = self.lazy_cart
         return context
 
     def get_queryset(self):